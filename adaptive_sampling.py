@@ -0,0 +1,163 @@
+"""
+Frame-stride detection: run the detector on every `stride`-th frame and fill
+the frames in between from a constant-velocity model between the two
+surrounding keyframes.
+
+Dense detection is used instead of the model whenever it can't be trusted:
+  * the ball is missing at either keyframe (track lost): the interval up to
+    the newest keyframe is detected densely,
+  * the ball's velocity changes between consecutive keyframe intervals, i.e.
+    vertical direction flips (a likely hit or bounce) or the speed changes by
+    more than max_speed_change px/frame: both intervals, the ±stride window
+    around the keyframe the change shows up at, are detected densely,
+  * right after such a turn the vertical speed is still below
+    min_vertical_speed px/frame (a slow turn at the top of an arc or at the
+    far baseline, where the sign of delta_y that get_ball_shot_frames relies
+    on is fragile): the window keeps growing by one interval while it stays
+    slow. Slow flight away from a turn is left to the model.
+
+Tolerance against a dense run: hit frames within ±1 frame of the dense hits
+and hit coordinates within 3 px (tests/test_adaptive_sampling.py checks this
+at stride 4 on synthetic rallies). The window around a turn can't shrink much
+below ±stride: a hit is a sign change of delta_y over a 5-frame rolling
+mean, so about 5 frames on either side of it have to be exact. The saving
+therefore depends on how often the ball turns: with a shot every 30-60
+frames and a bounce in each, stride 4 runs the detector on 41-46% of the
+frames (25% keyframes plus ~6 frames per turn), at 60 fps footage with the
+same rallies proportionally less.
+
+Keyframes of batch_size consecutive intervals are detected in one call, and
+dense bursts are sent in batches of batch_size frames. A burst is detected
+after the keyframe that follows it, so a detect_fn that tracks state across
+frames (RoiDetector) must pass dense_detect_fn to see each burst whole.
+"""
+import numpy as np
+from detections import ball_box, iter_batches
+
+
+def _center(box):
+    return np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+
+
+class StrideDetector:
+    def __init__(self, detect_fn, stride=4, max_speed_change=20.0, min_vertical_speed=1.0, batch_size=1,
+                 dense_detect_fn=None):
+        self.detect_fn = detect_fn  # list of frames -> list of per-frame boxes
+        # All frames of one dense burst -> boxes, e.g. RoiDetector.detect_burst; default detect_fn in batches
+        self.dense_detect_fn = dense_detect_fn
+        self.stride = stride
+        # Keyframes of batch_size intervals go to the detector together, as do dense bursts
+        self.batch_size = batch_size
+        self.max_speed_change = max_speed_change
+        self.min_vertical_speed = min_vertical_speed
+        self.detected_frames = 0
+        self.total_frames = 0
+
+    def _detect(self, frames):
+        self.detected_frames += len(frames)
+        return [boxes for batch in iter_batches(frames, self.batch_size) for boxes in self.detect_fn(batch)]
+
+    def _new_intervals(self, chunks, start_key):
+        """Intervals of up to `stride` frames ending in a keyframe, the keyframes detected in one pass."""
+        intervals = []
+        for frames, key_boxes in zip(chunks, self._detect([frames[-1][1] for frames in chunks])):
+            intervals.append(self._new_interval(frames, key_boxes, start_key))
+            start_key = intervals[-1]["key"]
+        return intervals
+
+    def _new_interval(self, frames, key_boxes, start_key):
+        self.total_frames += len(frames)
+        return {
+            "frames": frames,
+            "boxes": [None] * (len(frames) - 1) + [key_boxes],
+            "start_key": start_key,
+            "key": (frames[-1][0], ball_box(key_boxes)),
+            "dense": len(frames) == 1,
+        }
+
+    def _densify(self, *intervals):
+        """Detect the frames between the keyframes of every given interval that isn't dense yet."""
+        pending = [interval for interval in intervals if not interval["dense"]]
+        frames = [frame for interval in pending for _, frame in interval["frames"][:-1]]
+        if self.dense_detect_fn is not None:
+            self.detected_frames += len(frames)
+            boxes = self.dense_detect_fn(frames)
+        else:
+            boxes = self._detect(frames)
+        for interval in pending:
+            inner = len(interval["frames"]) - 1
+            interval["boxes"][:-1], boxes = boxes[:inner], boxes[inner:]
+            interval["dense"] = True
+
+    def _velocity(self, start_key, end_key):
+        (start_index, start_box), (end_index, end_box) = start_key, end_key
+        return (_center(end_box) - _center(start_box)) / (end_index - start_index)
+
+    def _motion_changed(self, held, current):
+        if held["start_key"] is None or held["start_key"][1] is None:
+            return False
+        previous_velocity = self._velocity(held["start_key"], held["key"])
+        current_velocity = self._velocity(current["start_key"], current["key"])
+        direction_flip = previous_velocity[1] * current_velocity[1] < 0
+        speed_change = np.linalg.norm(current_velocity - previous_velocity) > self.max_speed_change
+        # Right after a turn the ball may still be too slow for the sign of delta_y to be reliable
+        still_turning = held.get("turn", False) and abs(current_velocity[1]) < self.min_vertical_speed
+        return direction_flip or speed_change or still_turning
+
+    def _emit(self, interval):
+        if not interval["dense"]:
+            (start_index, start_box), (end_index, end_box) = interval["start_key"], interval["key"]
+            start = np.array(start_box[:4])
+            end = np.array(end_box[:4])
+            conf = min(start_box[4], end_box[4])
+            for i, (frame_index, _) in enumerate(interval["frames"][:-1]):
+                t = (frame_index - start_index) / (end_index - start_index)
+                x1, y1, x2, y2 = (start + (end - start) * t).tolist()
+                interval["boxes"][i] = [(x1, y1, x2, y2, conf, end_box[5])]
+
+        for (frame_index, frame), boxes in zip(interval["frames"], interval["boxes"]):
+            yield frame_index, frame, boxes
+
+    def detect_stream(self, indexed_frames):
+        """
+        Consume (frame_index, frame) pairs and yield (frame_index, frame, boxes)
+        in order. At most (batch_size + 1) * stride frames are buffered.
+        """
+        iterator = iter(indexed_frames)
+
+        def read(count):
+            frames = []
+            for frame_index, frame in iterator:
+                frames.append((frame_index, frame))
+                if len(frames) == count:
+                    break
+            return frames
+
+        first = read(1)
+        if not first:
+            return
+        # The interval before the newest one is held back until we know whether it needs dense detection
+        held = self._new_intervals([first], start_key=None)[0]
+
+        while True:
+            chunks = []
+            for _ in range(self.batch_size):
+                frames = read(self.stride)
+                if not frames:
+                    break
+                chunks.append(frames)
+            if not chunks:
+                break
+            for current in self._new_intervals(chunks, start_key=held["key"]):
+                if current["key"][1] is None or held["key"][1] is None:
+                    self._densify(current)
+                elif self._motion_changed(held, current):
+                    self._densify(held, current)
+                    current["turn"] = True
+                yield from self._emit(held)
+                held = current
+
+        yield from self._emit(held)
+
+    def report(self):
+        return f"🔍 Detector ran on {self.detected_frames}/{self.total_frames} frames (stride {self.stride})"
@@ -0,0 +1,238 @@
+"""
+HTTP API for running the pipeline behind gunicorn, a plain WSGI app.
+
+    gunicorn -w 1 --threads 8 --timeout 0 api:app
+
+    POST   /matches?filename=match.mp4   raw video as the request body (curl --data-binary @match.mp4)
+    GET    /jobs/<job_id>                state, progress and, once done, hits and asset URLs
+    DELETE /jobs/<job_id>                cancel
+    GET    /results/<key>/<file>         processed video / heatmap / CSVs, supports Range requests
+    GET    /health
+
+Uploads are streamed to disk in chunks and hashed on the way; an upload
+that was processed before is answered from the ResultStore right away.
+Processing runs on the JobQueue's worker processes, so request threads only
+move bytes. Job state lives on disk, any gunicorn worker can answer a poll.
+"""
+import hashlib
+import json
+import os
+import re
+import uuid
+from urllib.parse import parse_qs
+import pandas as pd
+from detection_cache import remember_sha256
+from jobs import JobQueue, process_match, result_params, DONE
+from result_store import ResultStore, cleanup_stale_dirs
+
+MODEL_PATH = os.environ.get("SERVESIGHT_MODEL", os.path.join("models", "yolo5_last.pt"))
+CACHE_DIR = os.environ.get("SERVESIGHT_CACHE_DIR", "cache")
+MAX_UPLOAD_BYTES = int(os.environ.get("SERVESIGHT_MAX_UPLOAD_BYTES", 8 * 1024 ** 3))
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_AGE = 24 * 3600
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+RESULTS_DIR = os.path.join(CACHE_DIR, "results")
+UPLOAD_DIR = os.path.join(CACHE_DIR, "api_uploads")
+RESULTS = ResultStore(RESULTS_DIR)
+
+CONTENT_TYPES = {
+    ".mp4": "video/mp4",
+    ".jpg": "image/jpeg",
+    ".csv": "text/csv",
+    ".json": "application/json",
+    ".txt": "text/plain",
+}
+
+_job_queue = None
+
+
+def job_queue():
+    # Created on first use, so the gunicorn master never forks a live worker pool
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(os.path.join(CACHE_DIR, "jobs"), max_workers=int(os.environ.get("SERVESIGHT_WORKERS", "1")))
+    return _job_queue
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def json_response(start_response, status, data):
+    body = json.dumps(data).encode()
+    start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+def save_upload(environ, filename):
+    """Stream the request body to UPLOAD_DIR/<sha256>/<filename>, returns the path."""
+    try:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        raise HTTPError("400 Bad Request", "Invalid Content-Length")
+    if length <= 0:
+        raise HTTPError("411 Length Required", "Send the video as the request body with a Content-Length")
+    if length > MAX_UPLOAD_BYTES:
+        raise HTTPError("413 Payload Too Large", f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # A .part left behind by a worker killed mid-upload is as abandoned as an old upload dir
+    cleanup_stale_dirs(UPLOAD_DIR, UPLOAD_MAX_AGE, file_suffix=".part")
+    tmp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    stream = environ["wsgi.input"]
+    remaining = length
+    try:
+        with open(tmp_path, "wb") as f:
+            while remaining:
+                chunk = stream.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise HTTPError("400 Bad Request", "Upload ended before Content-Length bytes were received")
+                digest.update(chunk)
+                f.write(chunk)
+                remaining -= len(chunk)
+
+        upload_dir = os.path.join(UPLOAD_DIR, digest.hexdigest())
+        os.makedirs(upload_dir, exist_ok=True)
+        video_path = os.path.join(upload_dir, filename)
+        os.replace(tmp_path, video_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    remember_sha256(video_path, digest.hexdigest())
+    return video_path
+
+
+def result_payload(result_key, result):
+    """Hits and asset URLs of a finished ResultStore entry."""
+    payload = {"state": DONE, "result_key": result_key, "assets": {}}
+    for name, path in result.items():
+        payload["assets"][name] = f"/results/{result_key}/{os.path.basename(path)}"
+    for name, csv_name in (("hits", "ball_hits_csv"), ("court_hits", "transformed_csv")):
+        if csv_name in result:
+            payload[name] = pd.read_csv(result[csv_name]).to_dict(orient="records")
+    return payload
+
+
+def submit_match(environ, start_response):
+    query = parse_qs(environ.get("QUERY_STRING", ""))
+    filename = os.path.basename(query.get("filename", ["upload.mp4"])[0]) or "upload.mp4"
+    if not filename.lower().endswith(VIDEO_EXTENSIONS):
+        raise HTTPError("415 Unsupported Media Type", f"Expected one of {', '.join(VIDEO_EXTENSIONS)}")
+
+    video_path = save_upload(environ, filename)
+    result_key = RESULTS.make_key(video_path, MODEL_PATH, result_params())
+    result = RESULTS.lookup(result_key)
+    if result:
+        return json_response(start_response, "200 OK", result_payload(result_key, result))
+
+    try:
+        job_id = job_queue().submit(process_match, model_path=MODEL_PATH, input_video=video_path, cache_dir=CACHE_DIR,
+                                    results_dir=RESULTS_DIR, result_key=result_key)
+    except RuntimeError as e:
+        raise HTTPError("503 Service Unavailable", str(e))
+    return json_response(start_response, "202 Accepted", {
+        "job_id": job_id, "state": "queued", "status_url": f"/jobs/{job_id}",
+    })
+
+
+def job_status(job_id, start_response):
+    status = job_queue().status(job_id)
+    if status is None:
+        raise HTTPError("404 Not Found", "Unknown job")
+    payload = {key: status.get(key) for key in ("id", "state", "progress", "message", "error", "metrics")}
+    if status["state"] == DONE and status.get("result"):
+        result_key = os.path.basename(os.path.dirname(next(iter(status["result"].values()))))
+        payload.update(result_payload(result_key, status["result"]))
+    return json_response(start_response, "200 OK", payload)
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range, None if the header is absent."""
+    if not header:
+        return None
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        raise HTTPError("416 Range Not Satisfiable", "Only single byte ranges are supported")
+    start, end = match.groups()
+    if start == "":
+        # Suffix range, the last N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise HTTPError("416 Range Not Satisfiable", f"File is {size} bytes")
+    return start, end
+
+
+def iter_file(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_asset(environ, start_response, result_key, file_name):
+    result = RESULTS.lookup(result_key) if re.fullmatch(r"[0-9a-f]{64}", result_key) else None
+    paths = {os.path.basename(path): path for path in (result or {}).values()}
+    if file_name not in paths:
+        raise HTTPError("404 Not Found", "Unknown asset")
+    path = paths[file_name]
+    size = os.path.getsize(path)
+    headers = [
+        ("Content-Type", CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream")),
+        ("Accept-Ranges", "bytes"),
+    ]
+
+    byte_range = parse_range(environ.get("HTTP_RANGE"), size)
+    if byte_range is None:
+        start_response("200 OK", headers + [("Content-Length", str(size))])
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper:
+            return file_wrapper(open(path, "rb"), CHUNK_SIZE)
+        return iter_file(path, 0, size)
+
+    start, end = byte_range
+    start_response("206 Partial Content", headers + [
+        ("Content-Length", str(end - start + 1)),
+        ("Content-Range", f"bytes {start}-{end}/{size}"),
+    ])
+    if environ["REQUEST_METHOD"] == "HEAD":
+        return []
+    return iter_file(path, start, end - start + 1)
+
+
+def app(environ, start_response):
+    method = environ["REQUEST_METHOD"]
+    path = environ.get("PATH_INFO", "/").rstrip("/") or "/"
+    try:
+        if path == "/health" and method == "GET":
+            return json_response(start_response, "200 OK", {"status": "ok"})
+        if path == "/matches" and method == "POST":
+            return submit_match(environ, start_response)
+
+        match = re.fullmatch(r"/jobs/([0-9a-f]{32})", path)
+        if match and method == "GET":
+            return job_status(match.group(1), start_response)
+        if match and method == "DELETE":
+            if not job_queue().cancel(match.group(1)):
+                raise HTTPError("404 Not Found", "Unknown job")
+            return json_response(start_response, "202 Accepted", {"id": match.group(1), "cancel_requested": True})
+
+        match = re.fullmatch(r"/results/([^/]+)/([^/]+)", path)
+        if match and method in ("GET", "HEAD"):
+            return serve_asset(environ, start_response, *match.groups())
+
+        raise HTTPError("404 Not Found", "Not found")
+    except HTTPError as e:
+        return json_response(start_response, e.status, {"error": e.message})
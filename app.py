@@ -5,13 +5,17 @@ st.set_page_config(page_title="Tennis Analysis App")
 
 import os
 import time
-import tempfile
+import json
 import shutil
+import uuid
 import cv2
 import gdown  # Google Drive file downloader
-from dotline import DotLine
-from ball_hits import BallTracker
-from heatmap import TennisHeatmap
+from model_pool import verify_weights
+from jobs import JobQueue, process_match, result_params, QUEUED, RUNNING, DONE, FAILED, CANCELLED
+from result_store import ResultStore, cleanup_stale_dirs
+from instrumentation import metrics_rows
+from app_assets import asset_bytes, save_upload
+from video_utils import browser_playable
 
 # ✅ Fix OpenCV VideoWriter encoder issue
 os.environ["OPENCV_VIDEOIO_PRIORITY_MSMF"] = "0"
@@ -19,16 +23,33 @@ os.environ["OPENCV_VIDEOIO_PRIORITY_MSMF"] = "0"
 # Google Drive file IDs (Replace with actual IDs)
 GDRIVE_FILES = {
     "yolo5_last.pt": "1YegZe9_HXEVuXEA-dbjn70DbBv0vxbFR",
-    "ball_tracker.pkl": "1tjM6IVFVf-q5-fcWryC3H1ytlfNbcNeR"
 }
 
 # Directory to store models
 MODEL_DIR = "models"
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-# Persistent storage for processed files
-OUTPUT_DIR = "output"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Detection cache and cross-match hit index live here, shared by all job workers
+CACHE_DIR = "cache"
+
+# Finished outputs keyed on upload hash + model + parameters, shared read-only by all sessions
+RESULTS_DIR = os.path.join(CACHE_DIR, "results")
+RESULTS = ResultStore(RESULTS_DIR)
+
+# Each session keeps only its current upload here, abandoned sessions are swept after a day
+UPLOAD_DIR = os.path.join(CACHE_DIR, "uploads")
+UPLOAD_MAX_AGE = 24 * 3600
+
+# One pool of worker processes per server, shared by every session
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(os.path.join(CACHE_DIR, "jobs"), max_workers=int(os.environ.get("SERVESIGHT_WORKERS", "1")))
+
+def show_metrics(metrics, title):
+    # Per-stage breakdown written by the job's Instrumentation
+    st.sidebar.subheader(title)
+    st.sidebar.caption(f"⏱️ {metrics['wall_seconds']:.1f}s wall time, peak RSS {metrics['peak_rss_mb']} MB")
+    st.sidebar.dataframe(metrics_rows(metrics), hide_index=True, use_container_width=True)
 
 # Function to download files from Google Drive
 def download_file(file_name, file_id):
@@ -37,6 +58,14 @@ def download_file(file_name, file_id):
     try:
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
+        # ✅ Drop a truncated or mismatching file left by an interrupted download
+        if os.path.exists(file_path):
+            try:
+                verify_weights(file_path)
+            except ValueError as e:
+                print(f"⚠️ WARNING: {e}, downloading again")
+                os.remove(file_path)
+
         # Download only if missing
         if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
             with st.spinner(f"Downloading {file_name} from Google Drive..."):
@@ -46,6 +75,8 @@ def download_file(file_name, file_id):
             st.error(f"❌ ERROR: Failed to download {file_name}. Please check your Google Drive link.")
             return None
 
+        # ✅ Checked against model_pool.PUBLISHED_SHA256 / YOLO5_LAST_SHA256, or pinned on first download
+        verify_weights(file_path)
         return file_path
     except Exception as e:
         st.error(f"❌ ERROR: Could not download {file_name}. Exception: {e}")
@@ -53,12 +84,14 @@ def download_file(file_name, file_id):
 
 # ✅ Download required models from Google Drive
 MODEL_PATH = download_file("yolo5_last.pt", GDRIVE_FILES["yolo5_last.pt"])
-STUB_PATH = download_file("ball_tracker.pkl", GDRIVE_FILES["ball_tracker.pkl"])
 
-if not MODEL_PATH or not STUB_PATH:
+if not MODEL_PATH:
     st.error("❌ ERROR: Required model files are missing. Please check the logs for details.")
     st.stop()
 
+# ✅ The model is loaded by the job workers, once per worker process
+JOBS = get_job_queue()
+
 # Sidebar with instructions
 st.sidebar.title("📋 How to Use")
 st.sidebar.markdown(
@@ -69,6 +102,8 @@ st.sidebar.markdown(
     - **Generate & Download the Heatmap** 🔥  
     """
 )
+# Profiled runs always process afresh and stay out of the shared result store
+capture_profile = st.sidebar.checkbox("🔬 Capture cProfile", help="Save a cProfile capture of the next run")
 
 # Streamlit App Title
 st.title("🎾 Tennis Match Analysis App")
@@ -81,27 +116,33 @@ if "heatmap_image" not in st.session_state:
     st.session_state.heatmap_image = None
 if "processing_done" not in st.session_state:
     st.session_state.processing_done = False
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "metrics" not in st.session_state:
+    st.session_state.metrics = None
+if "profile_text" not in st.session_state:
+    st.session_state.profile_text = None
 
 # Upload video file
 uploaded_file = st.file_uploader("📂 Upload a Tennis Match Video", type=["mp4", "avi", "mov", "mkv"])
 
 if uploaded_file:
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
-
-    input_video_path = os.path.join(temp_dir, uploaded_file.name)
-    temp_output_video = os.path.join(temp_dir, "processed_video.mp4")
-    final_output_video = os.path.join(OUTPUT_DIR, "processed_video.mp4")
-
-    temp_heatmap_image = os.path.join(temp_dir, "heatmap.jpg")
-    final_heatmap_image = os.path.join(OUTPUT_DIR, "heatmap.jpg")
-
-    ball_hits_csv = os.path.join(OUTPUT_DIR, "ball_hits_coordinates.csv")
-    transformed_csv = os.path.join(OUTPUT_DIR, "transformed_ball_hits_coordinates.csv")
-
-    # Save uploaded file
-    with open(input_video_path, "wb") as f:
-        f.write(uploaded_file.read())
+    # Save each upload once, not again on every rerun while a job is polled
+    upload_key = f"{uploaded_file.name}:{uploaded_file.size}"
+    session_upload_dir = os.path.join(UPLOAD_DIR, st.session_state.session_id)
+    if st.session_state.get("upload_key") != upload_key:
+        cleanup_stale_dirs(UPLOAD_DIR, UPLOAD_MAX_AGE, keep={st.session_state.session_id})
+        # Replace the session's previous upload instead of piling up temp dirs
+        shutil.rmtree(session_upload_dir, ignore_errors=True)
+        os.makedirs(session_upload_dir)
+        st.session_state.input_video_path = os.path.join(session_upload_dir, os.path.basename(uploaded_file.name))
+        save_upload(uploaded_file, st.session_state.input_video_path)
+        st.session_state.upload_key = upload_key
+    input_video_path = st.session_state.input_video_path
+    if os.path.isdir(session_upload_dir):
+        os.utime(session_upload_dir)  # Still in use
 
     # ✅ Check if video file is valid before processing
     if not os.path.exists(input_video_path) or os.path.getsize(input_video_path) == 0:
@@ -111,39 +152,80 @@ if uploaded_file:
         st.subheader("🎥 Uploaded Video")
         st.video(input_video_path)
 
-        # Processing button
+        # Processing button, the work runs in a background worker process
         if st.button("⚡ Process Video & Generate Heatmap"):
-            st.write("⏳ Processing video, please wait...")
-
-            # Step 1: Process the video
-            with st.spinner("🔄 Processing video..."):
-                tracker = DotLine(MODEL_PATH, input_video_path, temp_output_video)
-                tracker.process_video()
-
-            # Step 2: Track ball hits and generate coordinates
-            with st.spinner("📌 Tracking ball hits..."):
-                hits = BallTracker(MODEL_PATH, input_video_path, STUB_PATH, ball_hits_csv)
-                hits.process_ball_hits()
-
-            # Step 3: Generate heatmap
-            with st.spinner("🌡️ Generating heatmap..."):
-                heatmap = TennisHeatmap(transformed_csv, temp_heatmap_image)
-                heatmap.generate_heatmap()
-
-            # ✅ Move processed files to persistent storage
-            shutil.move(temp_output_video, final_output_video)
-            shutil.move(temp_heatmap_image, final_heatmap_image)
-
-            # ✅ Assign paths to session state
-            st.session_state.processed_video = final_output_video
-            st.session_state.heatmap_image = final_heatmap_image
-            st.session_state.processing_done = True
+            result_key = RESULTS.make_key(input_video_path, MODEL_PATH, result_params())
+            cached_result = None if capture_profile else RESULTS.lookup(result_key)
+            if cached_result:
+                # Same match processed before, by any session
+                st.session_state.processed_video = cached_result["processed_video"]
+                st.session_state.heatmap_image = cached_result["heatmap_image"]
+                st.session_state.metrics = None
+                if "metrics_json" in cached_result:
+                    with open(cached_result["metrics_json"]) as f:
+                        st.session_state.metrics = json.load(f)
+                st.session_state.profile_text = None
+                st.session_state.processing_done = True
+                st.session_state.job_id = None
+                st.success("♻️ Loaded previously processed results for this video.")
+            else:
+                try:
+                    st.session_state.job_id = JOBS.submit(
+                        process_match, owner=st.session_state.session_id,
+                        model_path=MODEL_PATH, input_video=input_video_path, cache_dir=CACHE_DIR,
+                        results_dir=None if capture_profile else RESULTS_DIR,
+                        result_key=None if capture_profile else result_key, profile=capture_profile,
+                    )
+                    st.session_state.processing_done = False
+                except RuntimeError as e:
+                    st.error(f"❌ {e}")
+
+# Poll the running job, the page reruns itself until it finishes
+if st.session_state.job_id and not st.session_state.processing_done:
+    status = JOBS.status(st.session_state.job_id)
+    if status is None:
+        st.error("❌ Error: Processing job not found.")
+        st.session_state.job_id = None
+    elif status["state"] in (QUEUED, RUNNING):
+        if status["state"] == QUEUED:
+            st.progress(0.0, text="⏳ Waiting for a free worker...")
+        else:
+            st.progress(min(status.get("progress") or 0.0, 1.0), text=f"🔄 {status.get('message') or 'Processing'}...")
+        if status.get("metrics"):
+            show_metrics(status["metrics"], "📈 Live Stage Breakdown")
+        if st.button("✖ Cancel Processing"):
+            JOBS.cancel(st.session_state.job_id)
+        time.sleep(1)
+        st.rerun()
+    elif status["state"] == DONE:
+        # ✅ Assign paths to session state
+        st.session_state.processed_video = status["result"]["processed_video"]
+        st.session_state.heatmap_image = status["result"]["heatmap_image"]
+        st.session_state.metrics = status.get("metrics")
+        st.session_state.profile_text = status["result"].get("profile_text")
+        st.session_state.processing_done = True
+    elif status["state"] == FAILED:
+        st.error(f"❌ Processing failed: {status.get('error')}")
+        st.session_state.job_id = None
+    elif status["state"] == CANCELLED:
+        st.warning("⚠️ Processing was cancelled.")
+        st.session_state.job_id = None
+
+if st.session_state.processing_done and st.session_state.metrics:
+    show_metrics(st.session_state.metrics, "📈 Stage Breakdown")
+    if st.session_state.profile_text and os.path.exists(st.session_state.profile_text):
+        st.sidebar.download_button("⬇ Download cProfile Report", data=asset_bytes(st.session_state.profile_text),
+                                   file_name="profile.txt")
 
 # ✅ Fix for missing converted video issue
 if st.session_state.processing_done:
     st.subheader("🎬 Processed Video")
 
     if st.session_state.processed_video and os.path.exists(st.session_state.processed_video):
+        # Already encoded for the browser by the pipeline, no transcode here
+        if not browser_playable(st.session_state.processed_video):
+            st.warning("⚠️ This server's OpenCV has no H.264 / VP9 encoder, so the video was written as mp4v, "
+                       "which browsers can't play. Download it to watch it in a desktop player.")
         st.video(st.session_state.processed_video)
     else:
         st.error("❌ Error: Processed video could not be displayed.")
@@ -151,7 +233,7 @@ if st.session_state.processing_done:
     st.subheader("📊 Heatmap of Ball Hits")
 
     if st.session_state.heatmap_image and os.path.exists(st.session_state.heatmap_image):
-        st.image(st.session_state.heatmap_image, use_container_width=True)  # ✅ Fix for deprecated `use_column_width`
+        st.image(asset_bytes(st.session_state.heatmap_image), use_container_width=True)  # ✅ Fix for deprecated `use_column_width`
     else:
         st.error("❌ Heatmap file missing.")
 
@@ -164,9 +246,8 @@ if st.session_state.processing_done:
     st.write("📥 Download Processed Files:")
 
     if st.session_state.processed_video:
-        with open(st.session_state.processed_video, "rb") as file:
-            st.download_button("⬇ Download Processed Video", data=file, file_name="processed_video.mp4")
+        with open(st.session_state.processed_video, "rb") as video_file:
+            st.download_button("⬇ Download Processed Video", data=video_file, file_name="processed_video.mp4")
 
     if st.session_state.heatmap_image:
-        with open(st.session_state.heatmap_image, "rb") as file:
-            st.download_button("⬇ Download Heatmap", data=file, file_name="heatmap.jpg")
+        st.download_button("⬇ Download Heatmap", data=asset_bytes(st.session_state.heatmap_image), file_name="heatmap.jpg")
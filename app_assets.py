@@ -0,0 +1,25 @@
+"""Display helpers shared by the Streamlit apps (app.py, combine.py)."""
+import os
+import shutil
+import streamlit as st
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+# Small assets (heatmaps, court plots, reports) are read once per file version and reused by reruns and
+# downloads. Videos never go through here: st.video gets the path and serves the file itself.
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_asset(path, mtime_ns):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def asset_bytes(path):
+    return load_asset(path, os.stat(path).st_mtime_ns)
+
+
+def save_upload(uploaded_file, path):
+    """Copy an st.file_uploader upload to disk in chunks instead of reading it into one bytes object."""
+    uploaded_file.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(uploaded_file, f, UPLOAD_CHUNK_SIZE)
@@ -1,69 +1,171 @@
-import cv2
-import pickle
+import numpy as np
 import pandas as pd
 import os
-from ultralytics import YOLO
+from model_pool import get_model
+from detections import ball_box, extract_boxes, detect_batch, iter_batches, DetectionStore, DetectionStoreBuilder
+from detection_cache import inference_params
+from detector_backends import resolve_backend
+from video_utils import FrameSource
+from adaptive_sampling import StrideDetector
+from roi_tracking import RoiDetector
+from ball_track import KalmanTrack
+from court_transform import CourtTransform, ShotCourtTransforms
+from instrumentation import Instrumentation
 
 class BallTracker:
-    def __init__(self, model_path, video_path, stub_path, output_csv_path):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, video_path, output_csv_path, model=None, cache=None, roi_crop_size=None,
+                 smoothing="interpolate", court_keypoints_csv=None, metrics=None, backend=None,
+                 court_segments_json=None):
+        # Reuse the process-wide model unless a specific instance is handed in
+        self._model = model
+        self.model_path = model_path
+        self.backend = resolve_backend(backend)  # Detector backend, see detector_backends
         self.video_path = video_path
-        self.stub_path = stub_path
+        self.cache = cache  # Optional DetectionCache, skips inference for videos seen before
+        self.roi_crop_size = roi_crop_size  # Detect on a crop around the ball once it's locked on
+        self.smoothing = smoothing  # "interpolate" (batch, pandas) or "kalman" (online, BallKalmanTracker)
         self.output_csv_path = output_csv_path
         self.transformed_csv_path = self.output_csv_path.replace(
             "ball_hits_coordinates.csv", "transformed_ball_hits_coordinates.csv"
         )  # Path for transformed CSV
+        # Video pixels -> plain court image: per camera shot (edge.VideoProcessor's segments JSON), one set of
+        # keypoints for the whole video, or identity scaling when no court keypoints are known
+        if court_segments_json:
+            self.court_transform = ShotCourtTransforms.from_json(court_segments_json)
+        elif court_keypoints_csv:
+            self.court_transform = CourtTransform.from_keypoints_csv(court_keypoints_csv)
+        else:
+            self.court_transform = None
+        self.metrics = metrics if metrics is not None else Instrumentation()
+
+    @property
+    def model(self):
+        # Loaded on first use, hits found from already stored detections never need it
+        if self._model is None:
+            self._model = get_model(self.model_path, backend=self.backend)
+        return self._model
 
     def __str__(self):
         return str(self.model)
 
     def detect_frame(self, frame):
         result = self.model.predict(frame)[0]
-        ball_dict = {}
-        for box in result.boxes:
-            box_result = box.xyxy.tolist()[0]
-            ball_dict[1] = box_result
-        return ball_dict
-
-    def detect_frames(self, frames, read_from_stub=False):
-        ball_detections = []
-        if read_from_stub and self.stub_path:
-            with open(self.stub_path, "rb") as f:
-                ball_detections = pickle.load(f)
-            return ball_detections
-        for frame in frames:
-            ball_detections.append(self.detect_frame(frame))
-        if self.stub_path:
-            with open(self.stub_path, "wb") as f:
-                pickle.dump(ball_detections, f)
-        return ball_detections
+        return self.ball_dict_from_boxes(extract_boxes(result))
+
+    def ball_dict_from_boxes(self, boxes):
+        """Keep the ball box of a frame (see detections.ball_box), matching detect_frame's output."""
+        box = ball_box(boxes)
+        return {1: list(box[:4])} if box is not None else {}
+
+    def positions_to_array(self, ball_positions):
+        """List of {1: [x1, y1, x2, y2]} dicts -> (n, 4) float array with NaN rows for missing frames."""
+        positions = np.full((len(ball_positions), 4), np.nan)
+        for i, ball_dict in enumerate(ball_positions):
+            box = ball_dict.get(1)
+            if box:
+                positions[i] = box
+        return positions
+
+    def kalman_track(self, detections):
+        """
+        KalmanTrack of already stored detections (a DetectionStore or per-frame
+        box lists), e.g. from the cache. MatchPipeline feeds its KalmanTrack
+        frame by frame as it renders instead.
+        """
+        if not isinstance(detections, DetectionStore):
+            detections = DetectionStore.from_frame_boxes(detections)
+        measurements = detections.ball_boxes(columns=("x1", "y1", "x2", "y2", "conf"))
+
+        with self.metrics.stage("kalman_smoothing", frames=len(measurements)):
+            track = KalmanTrack(capacity=max(len(measurements), 1))
+            for measurement in measurements:
+                if np.isnan(measurement[0]):
+                    track.update(None)
+                else:
+                    track.update(measurement[:4], measurement[4])
+        return track
+
+    def save_kalman_hits(self, track, frame_offset=0, frame_stride=1):
+        """Write both hit CSVs from a KalmanTrack, with each hit's positional uncertainty."""
+        self.save_ball_hits(track.positions, frame_offset=frame_offset, frame_stride=frame_stride, interpolate=False,
+                            uncertainty=track.uncertainty)
+
+    def detect_boxes(self, frames, batch_size=1, detect_stride=1):
+        """
+        DetectionStore of the raw boxes of every frame, running batch_size frames per predict call.
+        With detect_stride > 1 only every detect_stride-th frame is detected
+        and the rest are filled by StrideDetector's motion model. With
+        roi_crop_size set, frames are detected on a crop around the ball.
+        """
+        if self.roi_crop_size:
+            roi_detector = RoiDetector(self.model, crop_size=self.roi_crop_size)
+            detect_fn = roi_detector.detect
+            dense_detect_fn = self.metrics.timed("detect", roi_detector.detect_burst, frames_of=len)
+        else:
+            roi_detector = None
+            detect_fn = lambda batch: detect_batch(self.model, batch)
+            dense_detect_fn = None
+        detect_fn = self.metrics.timed("detect", detect_fn, frames_of=len)
+
+        detections = DetectionStoreBuilder()
+        if detect_stride > 1:
+            stride_detector = StrideDetector(detect_fn, stride=detect_stride, batch_size=batch_size,
+                                             dense_detect_fn=dense_detect_fn)
+            for _, _, boxes in stride_detector.detect_stream(enumerate(frames)):
+                detections.append(boxes)
+            print(stride_detector.report())
+        else:
+            for batch in iter_batches(frames, batch_size):
+                # Results come back in the same order as the frames
+                for boxes in detect_fn(batch):
+                    detections.append(boxes)
+
+        if roi_detector is not None:
+            print(roi_detector.report())
+        return detections.build()
+
+    def detect_frames(self, frames, batch_size=1):
+        return [self.ball_dict_from_boxes(boxes) for boxes in self.detect_boxes(frames, batch_size)]
 
     def get_ball_shot_frames(self, ball_positions):
-        ball_positions = [x.get(1, []) for x in ball_positions]
-        df_ball_positions = pd.DataFrame(ball_positions, columns=['x1', 'y1', 'x2', 'y2'])
-        df_ball_positions['ball_hit'] = 0
-        df_ball_positions['mid_x'] = (df_ball_positions['x1'] + df_ball_positions['x2']) / 2
-        df_ball_positions['mid_y'] = (df_ball_positions['y1'] + df_ball_positions['y2']) / 2
-        df_ball_positions['mid_y_rolling_mean'] = df_ball_positions['mid_y'].rolling(window=5, min_periods=1, center=False).mean()
-        df_ball_positions['delta_y'] = df_ball_positions['mid_y_rolling_mean'].diff()
+        """ball_positions is an (n, 4) box array or a list of {1: box} dicts."""
+        if not isinstance(ball_positions, np.ndarray):
+            ball_positions = self.positions_to_array(ball_positions)
+        # Column arrays, only the rolling mean goes through pandas
+        mid_x = (ball_positions[:, 0] + ball_positions[:, 2]) / 2
+        mid_y = (ball_positions[:, 1] + ball_positions[:, 3]) / 2
+        mid_y_rolling_mean = pd.Series(mid_y, copy=False).rolling(window=5, min_periods=1, center=False).mean().to_numpy()
+        delta_y = np.empty_like(mid_y_rolling_mean)
+        delta_y[:1] = np.nan
+        delta_y[1:] = np.diff(mid_y_rolling_mean)
         minimum_change_frames_for_hit = 25
-        for i in range(1, len(df_ball_positions) - int(minimum_change_frames_for_hit * 1.2)):
-            negative_position_change = df_ball_positions['delta_y'].iloc[i] > 0 and df_ball_positions['delta_y'].iloc[i + 1] < 0
-            positive_position_change = df_ball_positions['delta_y'].iloc[i] < 0 and df_ball_positions['delta_y'].iloc[i + 1] > 0
-            if negative_position_change or positive_position_change:
-                change_count = 0
-                for change_frame in range(i + 1, i + int(minimum_change_frames_for_hit * 1.2) + 1):
-                    negative_position_change_following_frame = df_ball_positions['delta_y'].iloc[i] > 0 and df_ball_positions['delta_y'].iloc[change_frame] < 0
-                    positive_position_change_following_frame = df_ball_positions['delta_y'].iloc[i] < 0 and df_ball_positions['delta_y'].iloc[change_frame] > 0
-                    if negative_position_change and negative_position_change_following_frame:
-                        change_count += 1
-                    elif positive_position_change and positive_position_change_following_frame:
-                        change_count += 1
-                if change_count > minimum_change_frames_for_hit - 1:
-                    df_ball_positions.at[i, 'ball_hit'] = 1
-        ball_hit_frames = df_ball_positions[df_ball_positions['ball_hit'] == 1]
-        hit_frame_indices = ball_hit_frames.index.tolist()
-        hit_coordinates = ball_hit_frames[['mid_x', 'mid_y']].values.tolist()
+        lookahead = int(minimum_change_frames_for_hit * 1.2)
+
+        # A hit is a sign change of delta_y at frame i that holds for most of the
+        # following `lookahead` frames. Prefix sums turn each window count into a
+        # subtraction, so the whole scan is O(n). NaN deltas count as neither sign.
+        ball_hit = np.zeros(len(delta_y), dtype=bool)
+        last_start = len(delta_y) - lookahead
+        if last_start > 1:
+            rising = delta_y > 0
+            falling = delta_y < 0
+            i = np.arange(1, last_start)
+
+            negative_position_change = rising[i] & falling[i + 1]
+            positive_position_change = falling[i] & rising[i + 1]
+
+            falling_before = np.concatenate(([0], np.cumsum(falling)))
+            rising_before = np.concatenate(([0], np.cumsum(rising)))
+            falling_following = falling_before[i + lookahead + 1] - falling_before[i + 1]
+            rising_following = rising_before[i + lookahead + 1] - rising_before[i + 1]
+
+            is_hit = (
+                (negative_position_change & (falling_following > minimum_change_frames_for_hit - 1))
+                | (positive_position_change & (rising_following > minimum_change_frames_for_hit - 1))
+            )
+            ball_hit[i[is_hit]] = True
+        hit_frame_indices = np.flatnonzero(ball_hit).tolist()
+        hit_coordinates = np.column_stack([mid_x, mid_y])[ball_hit].tolist()
         return hit_frame_indices, hit_coordinates
 
     def interpolate_missing_ball_positions(self, ball_positions):
@@ -78,55 +180,94 @@ class BallTracker:
         if not isinstance(ball_positions, list) or not all(isinstance(x, dict) for x in ball_positions):
             raise ValueError("❌ ERROR: ball_positions must be a list of dictionaries!")
 
-        position_list = [x.get(1, []) for x in ball_positions]
-
-        # Check if positions are valid
-        if not position_list or all(not pos for pos in position_list):
-            raise ValueError("❌ ERROR: No valid ball positions found for interpolation.")
-
-        # Convert to DataFrame
-        position_df = pd.DataFrame(position_list, columns=['x1', 'y1', 'x2', 'y2'])
-
-        # Ensure the DataFrame is not empty
-        if position_df.empty:
-            raise ValueError("❌ ERROR: DataFrame is empty after extracting ball positions.")
-
-        # Interpolate missing values
-        position_df = position_df.interpolate().bfill()
+        positions = self.interpolate_ball_array(self.positions_to_array(ball_positions))
 
         # Convert back to list of dictionaries
-        ball_positions = [{1: x} for x in position_df.to_numpy().tolist()]
+        ball_positions = [{1: x} for x in positions.tolist()]
 
         # Debugging: Check the first 5 ball positions after interpolation
         print("✅ Debug: Ball positions after interpolation:", ball_positions[:5])
 
         return ball_positions
 
-    def process_ball_hits(self):
-        cap = cv2.VideoCapture(self.video_path)
-        frames = []
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frames.append(frame)
-        cap.release()
+    def interpolate_ball_array(self, positions):
+        """
+        Array version of interpolate_missing_ball_positions, same result as
+        pandas interpolate().bfill(): linear between detections, edges held
+        at the nearest detection.
+        """
+        valid = ~np.isnan(positions).any(axis=1)
+        if not valid.any():
+            raise ValueError("❌ ERROR: No valid ball positions found for interpolation.")
+
+        frames = np.arange(len(positions))
+        filled = np.empty_like(positions)
+        for column in range(positions.shape[1]):
+            filled[:, column] = np.interp(frames, frames[valid], positions[valid, column])
+        return filled
+
+    def process_ball_hits(self, batch_size=1, start_frame=0, end_frame=None, stride=1, detect_stride=1):
+        key = None
+        detections = None
+        if self.cache is not None:
+            params = inference_params(start_frame, end_frame, stride, detect_stride=detect_stride, roi_crop_size=self.roi_crop_size,
+                                      backend=self.backend)
+            key = self.cache.make_key(self.video_path, self.model_path, params)
+            detections = self.cache.load(key)
+            if detections is not None:
+                print(f"✅ Loaded cached detections for {self.video_path}")
 
-        ball_detections = self.detect_frames(frames, read_from_stub=False)
-        ball_detections = self.interpolate_missing_ball_positions(ball_detections)
-        hit_frames, hit_coordinates = self.get_ball_shot_frames(ball_detections)
+        if detections is None:
+            # Frames are streamed into detection, only the small per-frame boxes are kept
+            with FrameSource(self.video_path, start=start_frame, end=end_frame, stride=stride) as source:
+                detections = self.detect_boxes(self.metrics.timed_iter("decode", source), batch_size, detect_stride)
+            if key is not None:
+                self.cache.save(key, detections)
+
+        if self.smoothing == "kalman":
+            self.save_kalman_hits(self.kalman_track(detections), frame_offset=start_frame, frame_stride=stride)
+        else:
+            self.save_ball_hits(detections.ball_boxes(), frame_offset=start_frame, frame_stride=stride)
+
+    def save_ball_hits(self, ball_detections, frame_offset=0, frame_stride=1, interpolate=True, uncertainty=None):
+        """
+        Interpolate raw detections, find the hit frames and write both CSVs.
+        frame_offset / frame_stride map detection positions back to video frame ids.
+        Pass interpolate=False for positions that were already smoothed.
+        ball_detections is an (n, 4) box array or a list of {1: box} dicts.
+        uncertainty (per position, in pixels) adds an uncertainty_px column.
+        """
+        positions = ball_detections
+        if not isinstance(positions, np.ndarray):
+            positions = self.positions_to_array(positions)
+        if interpolate:
+            with self.metrics.stage("interpolation", frames=len(positions)):
+                positions = self.interpolate_ball_array(positions)
+        with self.metrics.stage("hit_detection", frames=len(positions)):
+            hit_positions, hit_coordinates = self.get_ball_shot_frames(positions)
+        hit_frames = [frame_offset + position * frame_stride for position in hit_positions]
 
         # Save ball hit coordinates
         os.makedirs(os.path.dirname(self.output_csv_path), exist_ok=True)
         hit_data = {'frame_id': hit_frames, 'x': [coord[0] for coord in hit_coordinates], 'y': [coord[1] for coord in hit_coordinates]}
+        if uncertainty is not None:
+            # Pixel units in both CSVs, it isn't mapped through the court transform
+            hit_data['uncertainty_px'] = np.asarray(uncertainty, dtype=np.float64)[hit_positions]
         hit_df = pd.DataFrame(hit_data)
         hit_df.to_csv(self.output_csv_path, index=False)
 
         # ✅ Save transformed ball hit coordinates
-        transformed_df = hit_df.copy()
-        transformed_df['x'] = transformed_df['x'] * 1.0  # Modify transformation logic if needed
-        transformed_df['y'] = transformed_df['y'] * 1.0
-        transformed_df.to_csv(self.transformed_csv_path, index=False)
+        with self.metrics.stage("homography"):
+            transformed_df = hit_df.copy()
+            if self.court_transform is not None and len(transformed_df):
+                plain = self.court_transform.to_plain(transformed_df[['x', 'y']].to_numpy(dtype=np.float64),
+                                                      frame_ids=transformed_df['frame_id'].to_numpy())
+                transformed_df['x'] = plain[:, 0]
+                transformed_df['y'] = plain[:, 1]
+            else:
+                transformed_df['x'] = transformed_df['x'] * 1.0  # Modify transformation logic if needed
+                transformed_df['y'] = transformed_df['y'] * 1.0
+            transformed_df.to_csv(self.transformed_csv_path, index=False)
 
         # ✅ Debugging
         print(f"✅ Ball hit CSV saved at: {self.output_csv_path}")
@@ -0,0 +1,148 @@
+import numpy as np
+from detections import ball_box
+
+
+class BallKalmanTracker:
+    """
+    Online ball track: a constant-velocity Kalman filter over the ball centre,
+    updated once per frame in O(1) time and memory.
+
+    Each update takes the frame's detected box (or None) and its confidence.
+    Low-confidence boxes are trusted less (measurement noise scales with
+    1 / conf), and boxes whose Mahalanobis distance to the prediction exceeds
+    `gate` are rejected as outliers. Frames without an accepted box are
+    coasted on the prediction. After max_missing such frames in a row the
+    track is dropped and restarts from the next box.
+    """
+
+    def __init__(self, process_noise=200.0, measurement_noise=4.0, gate=25.0, max_missing=15):
+        self.F = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=float)
+        self.H = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], dtype=float)
+        # Random acceleration between frames
+        G = np.array([[0.5, 0], [0, 0.5], [1, 0], [0, 1]])
+        self.Q = G @ G.T * process_noise
+        self.measurement_noise = measurement_noise
+        self.gate = gate
+        self.max_missing = max_missing
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.P = None
+        self.size = None
+        self.missing = 0
+
+    @property
+    def locked(self):
+        return self.x is not None
+
+    def _start(self, center, size, conf):
+        r = self.measurement_noise / max(conf, 0.05)
+        self.x = np.array([center[0], center[1], 0.0, 0.0])
+        self.P = np.diag([r, r, 1e3, 1e3])
+        self.size = size
+        self.missing = 0
+
+    def update(self, box=None, conf=1.0):
+        """
+        Feed one frame. box is (x1, y1, x2, y2) or None.
+        Returns (center_x, center_y, uncertainty) or None when there is no track,
+        where uncertainty is the RMS positional standard deviation in pixels.
+        """
+        center = size = None
+        if box is not None:
+            center = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+            size = np.array([box[2] - box[0], box[3] - box[1]])
+
+        if self.x is None:
+            if center is None:
+                return None
+            self._start(center, size, conf)
+            return self.estimate()
+
+        # Predict
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+        if center is not None:
+            R = np.eye(2) * self.measurement_noise / max(conf, 0.05)
+            innovation = center - self.H @ self.x
+            S = self.H @ self.P @ self.H.T + R
+            S_inv = np.linalg.inv(S)
+            if innovation @ S_inv @ innovation <= self.gate:
+                K = self.P @ self.H.T @ S_inv
+                self.x = self.x + K @ innovation
+                self.P = (np.eye(4) - K @ self.H) @ self.P
+                self.size = size
+                self.missing = 0
+                return self.estimate()
+
+        # No box, or an outlier: coast on the prediction
+        self.missing += 1
+        if self.missing > self.max_missing:
+            self.reset()
+            if center is not None:
+                self._start(center, size, conf)
+                return self.estimate()
+            return None
+        return self.estimate()
+
+    def estimate(self):
+        if self.x is None:
+            return None
+        uncertainty = float(np.sqrt(np.trace(self.P[:2, :2]) / 2))
+        return float(self.x[0]), float(self.x[1]), uncertainty
+
+    def box(self):
+        """Smoothed box: the filtered centre with the size of the last accepted detection."""
+        if self.x is None:
+            return None
+        half_w, half_h = self.size / 2
+        return [float(self.x[0] - half_w), float(self.x[1] - half_h), float(self.x[0] + half_w), float(self.x[1] + half_h)]
+
+
+class KalmanTrack:
+    """
+    Per-frame output of a BallKalmanTracker fed one frame at a time: the
+    smoothed box and its uncertainty (see BallKalmanTracker.update), NaN while
+    there is no track. Only these five values per frame are kept, in arrays
+    grown like DetectionStoreBuilder's.
+    """
+
+    def __init__(self, capacity=1024, **tracker_kwargs):
+        self.tracker = BallKalmanTracker(**tracker_kwargs)
+        self._positions = np.empty((capacity, 4))
+        self._uncertainty = np.empty(capacity)
+        self.num_frames = 0
+
+    def update(self, box=None, conf=1.0):
+        if self.num_frames == len(self._uncertainty):
+            self._positions = np.concatenate([self._positions, np.empty_like(self._positions)])
+            self._uncertainty = np.concatenate([self._uncertainty, np.empty_like(self._uncertainty)])
+        estimate = self.tracker.update(box, conf)
+        if estimate is None:
+            self._positions[self.num_frames] = np.nan
+            self._uncertainty[self.num_frames] = np.nan
+        else:
+            self._positions[self.num_frames] = self.tracker.box()
+            self._uncertainty[self.num_frames] = estimate[2]
+        self.num_frames += 1
+
+    def update_boxes(self, boxes):
+        """Feed one frame's detected boxes, the ball box rounded to float32 as a DetectionStore holds it."""
+        box = ball_box(boxes)
+        if box is None:
+            self.update(None)
+        else:
+            values = np.asarray(box[:5], dtype=np.float32).astype(np.float64)
+            self.update(values[:4], values[4])
+
+    @property
+    def positions(self):
+        """(num_frames, 4) smoothed boxes."""
+        return self._positions[:self.num_frames]
+
+    @property
+    def uncertainty(self):
+        """(num_frames,) RMS positional standard deviation in pixels."""
+        return self._uncertainty[:self.num_frames]
@@ -0,0 +1,209 @@
+"""
+Headless batch processing of many match videos.
+
+Usage:
+    python batch.py matches/ --model models/yolo5_last.pt --workers 2
+    python batch.py manifest.jsonl --output output/batch --threads-per-worker 4
+
+A manifest has one JSON object per line with a "video" path (relative paths
+are resolved against the manifest's directory), an optional "name" and any
+MatchPipeline keyword arguments (start_frame, end_frame, detect_stride, ...).
+Each video gets <output>/<name>/ with the processed video, both hit CSVs,
+its court segments and the heatmap; <output>/summary.json records per-video
+timings. Entries that set court_segments_json or court_keypoints_csv skip
+the court detection.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def load_entries(input_path):
+    """Videos to process as dicts with at least "video" and "name"."""
+    if os.path.isdir(input_path):
+        entries = [{"video": os.path.join(input_path, name)} for name in sorted(os.listdir(input_path))
+                   if name.lower().endswith(VIDEO_EXTENSIONS)]
+    else:
+        base_dir = os.path.dirname(os.path.abspath(input_path))
+        entries = []
+        with open(input_path) as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "video" not in entry:
+                    raise ValueError(f"Error: manifest line {line_number} has no \"video\"")
+                entry["video"] = os.path.join(base_dir, entry["video"])
+                entries.append(entry)
+
+    names = set()
+    for entry in entries:
+        name = entry.get("name") or os.path.splitext(os.path.basename(entry["video"]))[0]
+        # Same file name in different folders must not share an output directory
+        unique, suffix = name, 1
+        while unique in names:
+            suffix += 1
+            unique = f"{name}_{suffix}"
+        names.add(unique)
+        entry["name"] = unique
+    return entries
+
+
+def limit_threads(threads):
+    """Worker initializer, runs before torch / cv2 are imported so the limits stick."""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def process_video(entry, output_root, model_path, cache_dir=None, pipeline_kwargs=None, court_model_path=None):
+    """Run court detection + pipeline + heatmap for one video, returns its summary row. Never raises."""
+    from edge import COURT_MODEL_PATH, detect_court_segments
+    from pipeline import MatchPipeline
+    from heatmap import TennisHeatmap
+    from detection_cache import DetectionCache
+
+    output_dir = os.path.join(output_root, entry["name"])
+    os.makedirs(output_dir, exist_ok=True)
+    kwargs = dict(pipeline_kwargs or {})
+    kwargs.update({key: value for key, value in entry.items() if key not in ("video", "name")})
+    summary = {"name": entry["name"], "video": entry["video"], "output_dir": output_dir, "status": "ok", "pid": os.getpid()}
+
+    started = time.perf_counter()
+    try:
+        cache = DetectionCache(os.path.join(cache_dir, "detections")) if cache_dir else None
+        if not kwargs.get("court_segments_json") and not kwargs.get("court_keypoints_csv"):
+            court_started = time.perf_counter()
+            kwargs["court_segments_json"] = detect_court_segments(
+                entry["video"], os.path.join(output_dir, "court_segments.json"), court_model_path or COURT_MODEL_PATH,
+                cache_dir=os.path.join(cache_dir, "court") if cache_dir else None)
+            summary["court_seconds"] = time.perf_counter() - court_started
+        summary["court_space"] = bool(kwargs.get("court_segments_json") or kwargs.get("court_keypoints_csv"))
+        ball_hits_csv = os.path.join(output_dir, "ball_hits_coordinates.csv")
+        pipeline_started = time.perf_counter()
+        pipeline = MatchPipeline(model_path, entry["video"], os.path.join(output_dir, "processed_video.mp4"),
+                                 ball_hits_csv, cache=cache, **kwargs)
+        store = pipeline.run()
+        summary["frames"] = store.num_frames
+        summary["pipeline_seconds"] = time.perf_counter() - pipeline_started
+
+        heatmap_started = time.perf_counter()
+        TennisHeatmap(pipeline.ball_tracker.transformed_csv_path, os.path.join(output_dir, "heatmap.jpg"),
+                      metrics=pipeline.metrics).generate_heatmap()
+        summary["heatmap_seconds"] = time.perf_counter() - heatmap_started
+        metrics = pipeline.metrics.as_dict()
+        summary["peak_rss_mb"] = metrics["peak_rss_mb"]
+        summary["stages"] = metrics["stages"]
+    except Exception as e:
+        summary["status"] = "failed"
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["total_seconds"] = time.perf_counter() - started
+    if "frames" in summary:
+        # A video can succeed with no frames in range, its fps is 0 rather than missing
+        summary["fps"] = summary["frames"] / summary["pipeline_seconds"] if summary["frames"] else 0.0
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Process a directory or JSONL manifest of tennis match videos.")
+    parser.add_argument("input", help="Directory of videos or a JSONL manifest")
+    parser.add_argument("--model", default=os.path.join("models", "yolo5_last.pt"))
+    parser.add_argument("--output", default=os.path.join("output", "batch"))
+    parser.add_argument("--cache-dir", default="cache", help="Detection cache directory, '' to disable")
+    parser.add_argument("--workers", type=int, default=1, help="Videos processed in parallel")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch / OpenCV threads per worker (default: cores / workers)")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--threaded", action="store_true", help="Overlap decode, detect, render and encode")
+    parser.add_argument("--detect-stride", type=int, default=1)
+    parser.add_argument("--smoothing", choices=("interpolate", "kalman"), default="interpolate")
+    parser.add_argument("--backend", default=None, help="Detector backend: torch, onnx, onnx-int8, openvino, openvino-int8")
+    parser.add_argument("--codec", default="avc1")
+    parser.add_argument("--court-model", default=None,
+                        help="Court keypoint model (default: SERVESIGHT_COURT_MODEL or models/keypoints_model.pth)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # Imported here, spawned workers re-import this module and numpy must not load before limit_threads
+    from detector_backends import export_model, resolve_backend
+
+    args = parse_args(argv)
+    entries = load_entries(args.input)
+    if not entries:
+        print(f"❌ No videos found in {args.input}")
+        return 1
+
+    workers = max(1, min(args.workers, len(entries)))
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    pipeline_kwargs = {
+        "batch_size": args.batch_size,
+        "threaded": args.threaded,
+        "detect_stride": args.detect_stride,
+        "smoothing": args.smoothing,
+        "codec": args.codec,
+        "backend": resolve_backend(args.backend),
+    }
+    os.makedirs(args.output, exist_ok=True)
+    print(f"📂 {len(entries)} videos, {workers} workers x {threads} threads")
+
+    # Export once here rather than in every worker
+    export_model(args.model, pipeline_kwargs["backend"])
+
+    started = time.perf_counter()
+    results = []
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=limit_threads, initargs=(threads,))
+    with executor:
+        futures = {executor.submit(process_video, entry, args.output, args.model, args.cache_dir or None, pipeline_kwargs,
+                                   args.court_model): entry
+                   for entry in entries}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except BrokenProcessPool as e:
+                # A worker died (OOM kill, segfault in a codec), the video is recorded as failed instead
+                entry = futures[future]
+                summary = {"name": entry["name"], "video": entry["video"], "output_dir": os.path.join(args.output, entry["name"]),
+                           "status": "failed", "error": f"{type(e).__name__}: worker process died"}
+            results.append(summary)
+            if summary["status"] == "ok":
+                print(f"✅ {summary['name']}: {summary['frames']} frames in {summary['total_seconds']:.1f}s ({summary['fps']:.1f} fps)")
+            else:
+                print(f"❌ {summary['name']}: {summary['error']}")
+
+    order = {entry["name"]: i for i, entry in enumerate(entries)}
+    results.sort(key=lambda summary: order[summary["name"]])
+    run_summary = {
+        "input": args.input,
+        "workers": workers,
+        "threads_per_worker": threads,
+        "pipeline": pipeline_kwargs,
+        "wall_seconds": time.perf_counter() - started,
+        "succeeded": sum(summary["status"] == "ok" for summary in results),
+        "failed": sum(summary["status"] != "ok" for summary in results),
+        "videos": results,
+    }
+    summary_path = os.path.join(args.output, "summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(run_summary, f, indent=2)
+    print(f"✅ {run_summary['succeeded']}/{len(results)} videos in {run_summary['wall_seconds']:.1f}s, summary: {summary_path}")
+    return 0 if run_summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
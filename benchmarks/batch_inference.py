@@ -0,0 +1,69 @@
+"""
+Frames per second of YOLO inference against batch size.
+
+Usage:
+    python benchmarks/batch_inference.py --model models/yolo5_last.pt --video match.mp4 --batch-sizes 1,2,4,8,16
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from ultralytics import YOLO
+from detections import detect_batch, iter_batches
+
+
+def load_frames(video_path, max_frames):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_inference(model, frames, batch_size):
+    detections = []
+    for batch in iter_batches(frames, batch_size):
+        detections.extend(detect_batch(model, batch))
+    return detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched YOLO inference.")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--video", required=True)
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--frames", type=int, default=240, help="Number of frames to decode up front")
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    if not frames:
+        sys.exit(f"❌ ERROR: Could not read frames from {args.video}")
+
+    model = YOLO(args.model)
+    # Warm-up so the first measured batch size doesn't pay for lazy initialisation
+    detect_batch(model, frames[:1])
+
+    reference = None
+    print(f"{'batch':>6} {'fps':>10} {'seconds':>10} {'matches batch=1':>16}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        start = time.perf_counter()
+        detections = run_inference(model, frames, batch_size)
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = run_inference(model, frames, 1) if batch_size != 1 else detections
+        # Batching must not change a single box, see tests/test_batch_inference.py
+        matches = detections == reference
+        print(f"{batch_size:>6} {len(frames) / elapsed:>10.2f} {elapsed:>10.2f} {str(matches):>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Timing of BallTracker.get_ball_shot_frames against the original per-frame
+.iloc implementation on a synthetic trajectory. Parity between the two is
+checked by tests/test_ball_hits.py.
+
+Usage:
+    python benchmarks/hit_detection.py --frames 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from ball_hits import BallTracker
+
+
+def synthetic_trajectory(num_frames, seed=0):
+    """Ball bouncing between the baselines with random rally lengths, jitter and dropped detections."""
+    rng = np.random.default_rng(seed)
+    y = np.empty(num_frames)
+    position, frame = 100.0, 0
+    while frame < num_frames:
+        length = int(rng.integers(20, 90))
+        target = 100.0 if position > 500 else 900.0
+        y[frame:frame + length] = np.linspace(position, target, length)[:num_frames - frame]
+        position, frame = target, frame + length
+    y += rng.normal(0, 2.0, num_frames)
+    x = 640 + 200 * np.sin(np.arange(num_frames) / 50)
+
+    positions = [{1: [cx - 5, cy - 5, cx + 5, cy + 5]} for cx, cy in zip(x.tolist(), y.tolist())]
+    for missing in rng.choice(num_frames, size=num_frames // 50, replace=False).tolist():
+        positions[missing] = {}
+    return positions
+
+
+def reference_ball_shot_frames(ball_positions):
+    """The original O(n*30) loop, the timing and parity baseline."""
+    ball_positions = [x.get(1, []) for x in ball_positions]
+    df_ball_positions = pd.DataFrame(ball_positions, columns=['x1', 'y1', 'x2', 'y2'])
+    df_ball_positions['ball_hit'] = 0
+    df_ball_positions['mid_x'] = (df_ball_positions['x1'] + df_ball_positions['x2']) / 2
+    df_ball_positions['mid_y'] = (df_ball_positions['y1'] + df_ball_positions['y2']) / 2
+    df_ball_positions['mid_y_rolling_mean'] = df_ball_positions['mid_y'].rolling(window=5, min_periods=1, center=False).mean()
+    df_ball_positions['delta_y'] = df_ball_positions['mid_y_rolling_mean'].diff()
+    minimum_change_frames_for_hit = 25
+    for i in range(1, len(df_ball_positions) - int(minimum_change_frames_for_hit * 1.2)):
+        negative_position_change = df_ball_positions['delta_y'].iloc[i] > 0 and df_ball_positions['delta_y'].iloc[i + 1] < 0
+        positive_position_change = df_ball_positions['delta_y'].iloc[i] < 0 and df_ball_positions['delta_y'].iloc[i + 1] > 0
+        if negative_position_change or positive_position_change:
+            change_count = 0
+            for change_frame in range(i + 1, i + int(minimum_change_frames_for_hit * 1.2) + 1):
+                negative_position_change_following_frame = df_ball_positions['delta_y'].iloc[i] > 0 and df_ball_positions['delta_y'].iloc[change_frame] < 0
+                positive_position_change_following_frame = df_ball_positions['delta_y'].iloc[i] < 0 and df_ball_positions['delta_y'].iloc[change_frame] > 0
+                if negative_position_change and negative_position_change_following_frame:
+                    change_count += 1
+                elif positive_position_change and positive_position_change_following_frame:
+                    change_count += 1
+            if change_count > minimum_change_frames_for_hit - 1:
+                df_ball_positions.at[i, 'ball_hit'] = 1
+    ball_hit_frames = df_ball_positions[df_ball_positions['ball_hit'] == 1]
+    return ball_hit_frames.index.tolist(), ball_hit_frames[['mid_x', 'mid_y']].values.tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized ball-hit detection.")
+    parser.add_argument("--frames", type=int, default=200_000)
+    parser.add_argument("--skip-reference", action="store_true", help="Only time the vectorized version")
+    args = parser.parse_args()
+
+    positions = synthetic_trajectory(args.frames)
+    # get_ball_shot_frames doesn't touch the model, so skip loading one
+    tracker = BallTracker.__new__(BallTracker)
+
+    start = time.perf_counter()
+    hits = tracker.get_ball_shot_frames(positions)
+    vectorized_seconds = time.perf_counter() - start
+    print(f"vectorized: {len(hits[0])} hits in {vectorized_seconds:.3f}s")
+
+    if args.skip_reference:
+        return
+
+    start = time.perf_counter()
+    reference = reference_ball_shot_frames(positions)
+    reference_seconds = time.perf_counter() - start
+    print(f"reference:  {len(reference[0])} hits in {reference_seconds:.3f}s ({reference_seconds / vectorized_seconds:.0f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
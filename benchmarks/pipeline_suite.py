@@ -0,0 +1,231 @@
+"""
+Per-stage timings of the whole pipeline on synthetic clips, with a
+deterministic stand-in detector, so runs are comparable across machines
+and commits without model weights or match footage.
+
+Usage:
+    python benchmarks/pipeline_suite.py --output benchmarks/results.json
+    python benchmarks/pipeline_suite.py --baseline benchmarks/results.json --max-slowdown 1.25
+
+Each case (resolution x length) renders a clip once into --work-dir (a
+temporary directory removed at the end unless given), then streams it
+through DotLine / BallTracker / CourtTransform / TennisHeatmap timing
+decode, inference, trail render and encode per frame and interpolation,
+hit detection, homography and heatmap as whole passes.
+The best of --repeat runs is kept per stage.
+
+With --baseline, a stage that got more than --max-slowdown times slower (and
+by more than --min-seconds) or a case whose hits changed is a regression;
+they are listed and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+import pandas as pd
+from ball_hits import BallTracker
+from court_transform import CourtTransform, load_court_keypoints
+from detections import DetectionStoreBuilder, detect_batch
+from dotline import DotLine
+from heatmap import TennisHeatmap
+from synthetic_match import StubDetector, render_match
+
+STAGES = ("decode", "inference", "interpolation", "hit_detection", "trail_render", "encode", "homography", "heatmap")
+
+
+def run_case(match, work_dir, codec="mp4v", latency=0.0, trail_blend="region"):
+    """One timed pass over a rendered clip, returns {stage: seconds} and the hit frames."""
+    name = os.path.splitext(os.path.basename(match["video"]))[0]
+    output_dir = os.path.join(work_dir, name)
+    os.makedirs(output_dir, exist_ok=True)
+    model = StubDetector(latency=latency)
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    dotline = DotLine(None, match["video"], os.path.join(output_dir, "processed_video.mp4"), model=model, codec=codec,
+                      trail_blend=trail_blend)
+    detections = DetectionStoreBuilder()
+    frames = dotline.source.indexed_frames()
+    try:
+        while True:
+            started = time.perf_counter()
+            item = next(frames, None)
+            decoded = time.perf_counter()
+            timings["decode"] += decoded - started
+            if item is None:
+                break
+            _, frame = item
+
+            boxes = detect_batch(model, [frame])[0]
+            detections.append(boxes)
+            detected = time.perf_counter()
+            timings["inference"] += detected - decoded
+
+            frame = dotline.draw_trail(frame, boxes)
+            rendered = time.perf_counter()
+            timings["trail_render"] += rendered - detected
+
+            dotline.out.write(frame)
+            timings["encode"] += time.perf_counter() - rendered
+    finally:
+        dotline.source.release()
+        started = time.perf_counter()
+        dotline.out.release()
+        timings["encode"] += time.perf_counter() - started
+
+    tracker = BallTracker(None, match["video"], os.path.join(output_dir, "ball_hits_coordinates.csv"), model=model)
+    store = detections.build()
+
+    started = time.perf_counter()
+    positions = tracker.interpolate_ball_array(store.ball_boxes())
+    timings["interpolation"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    hit_frames, hit_coordinates = tracker.get_ball_shot_frames(positions)
+    timings["hit_detection"] = time.perf_counter() - started
+
+    # Solving the homography is part of the stage, so it is not served from CourtTransform's memo
+    started = time.perf_counter()
+    transform = CourtTransform(load_court_keypoints(match["keypoints_csv"]))
+    transform.to_plain((positions[:, :2] + positions[:, 2:]) / 2)
+    plain_hits = transform.to_plain(np.asarray(hit_coordinates, dtype=np.float64).reshape(-1, 2))
+    timings["homography"] = time.perf_counter() - started
+
+    pd.DataFrame({"frame_id": hit_frames, "x": plain_hits[:, 0], "y": plain_hits[:, 1]}).to_csv(
+        tracker.transformed_csv_path, index=False)
+    started = time.perf_counter()
+    TennisHeatmap(tracker.transformed_csv_path, os.path.join(output_dir, "heatmap.jpg")).generate_heatmap()
+    timings["heatmap"] = time.perf_counter() - started
+    return timings, hit_frames
+
+
+def run_suite(resolutions, lengths, work_dir, repeat=3, codec="mp4v", latency=0.0, seed=0, trail_blend="region"):
+    cases = []
+    for width, height in resolutions:
+        for num_frames in lengths:
+            name = f"{width}x{height}_{num_frames}f"
+            match = render_match(os.path.join(work_dir, f"{name}.mp4"), width, height, num_frames, seed=seed)
+            best, hit_frames = None, None
+            for _ in range(repeat):
+                timings, hit_frames = run_case(match, work_dir, codec=codec, latency=latency, trail_blend=trail_blend)
+                best = timings if best is None else {stage: min(best[stage], timings[stage]) for stage in STAGES}
+
+            stages = {stage: {"seconds": seconds, "fps": num_frames / seconds if seconds else None}
+                      for stage, seconds in best.items()}
+            cases.append({
+                "name": name,
+                "width": width,
+                "height": height,
+                "frames": num_frames,
+                "stages": stages,
+                "total_seconds": sum(best.values()),
+                "hits": len(hit_frames),
+                "hit_frames": hit_frames,
+                "true_hits": len(match["hit_frames"]),
+            })
+            print(f"✅ {name}: {sum(best.values()):.2f}s, {len(hit_frames)} hits ({len(match['hit_frames'])} shots)")
+    return cases
+
+
+def find_regressions(cases, baseline, max_slowdown=1.25, min_seconds=0.05):
+    """Stages slower than max_slowdown x the baseline (and by over min_seconds), and changed hits."""
+    baseline_cases = {case["name"]: case for case in baseline["cases"]}
+    regressions = []
+    for case in cases:
+        reference = baseline_cases.get(case["name"])
+        if reference is None:
+            continue
+        if case["hit_frames"] != reference["hit_frames"]:
+            regressions.append(f"{case['name']}: hits changed ({reference['hits']} -> {case['hits']})")
+        for stage, result in case["stages"].items():
+            if stage not in reference["stages"]:
+                continue
+            seconds, before = result["seconds"], reference["stages"][stage]["seconds"]
+            if seconds > before * max_slowdown and seconds - before > min_seconds:
+                regressions.append(f"{case['name']} {stage}: {before:.3f}s -> {seconds:.3f}s ({seconds / before:.2f}x)")
+    return regressions
+
+
+def print_table(cases):
+    print(f"{'case':>18} " + " ".join(f"{stage:>13}" for stage in STAGES) + f" {'total':>8}")
+    for case in cases:
+        fps = " ".join(
+            f"{case['stages'][stage]['fps']:>9.0f} fps" if case["stages"][stage]["fps"] else f"{'-':>13}"
+            for stage in STAGES
+        )
+        print(f"{case['name']:>18} {fps} {case['total_seconds']:>7.2f}s")
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic matches.")
+    parser.add_argument("--resolutions", default="640x360,1280x720,1920x1080")
+    parser.add_argument("--frames", default="300,1800", help="Clip lengths in frames")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the fastest is kept per stage")
+    parser.add_argument("--work-dir", default=None,
+                        help="Where clips and outputs go and are kept (default: a temp dir, removed afterwards)")
+    parser.add_argument("--output", default=None, help="Write the results as JSON here")
+    parser.add_argument("--baseline", default=None, help="Earlier --output to check for regressions against")
+    parser.add_argument("--max-slowdown", type=float, default=1.25)
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--codec", default="mp4v", help="Output codec, mp4v is available everywhere")
+    parser.add_argument("--latency", type=float, default=0.0, help="Extra stub detector seconds per frame")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trail-blend", choices=("region", "full"), default="region",
+                        help="TrailRenderer blend, full is the original dimmed full-frame overlay")
+    args = parser.parse_args()
+
+    resolutions = [parse_size(size) for size in args.resolutions.split(",")]
+    lengths = [int(frames) for frames in args.frames.split(",")]
+    # Rendered clips and outputs are only kept when --work-dir asks for them
+    with tempfile.TemporaryDirectory(prefix="servesight_bench_") as temp_dir:
+        cases = run_suite(resolutions, lengths, args.work_dir or temp_dir, repeat=args.repeat, codec=args.codec,
+                          latency=args.latency, seed=args.seed, trail_blend=args.trail_blend)
+    print_table(cases)
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+        },
+        "settings": {"repeat": args.repeat, "codec": args.codec, "latency": args.latency, "seed": args.seed,
+                     "trail_blend": args.trail_blend},
+        "created": time.time(),
+        "cases": cases,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results saved at: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(cases, baseline, args.max_slowdown, args.min_seconds)
+        if regressions:
+            print("❌ Regressions against the baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Detection and render seconds of SegmentedPipeline-style processing against
+the number of worker processes, on a synthetic clip with the stub detector.
+
+Usage:
+    python benchmarks/segmented_scaling.py --workers 1,2,4 --latency 0.02
+
+Detection is split into segments (segmented.plan_segments / detect_range) and
+run in a process pool like SegmentedPipeline.detect; --latency is the stub's
+seconds per frame, standing in for YOLO. The trail render is the same single
+MatchPipeline pass over the joined detections SegmentedPipeline.run makes, so
+it doesn't change with the worker count and bounds the speedup (Amdahl):
+detect(1) + render over detect(1) / workers + render.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch import limit_threads
+from detections import DetectionStore, detect_batch
+from pipeline import MatchPipeline
+from segmented import detect_range, plan_segments
+from synthetic_match import StubDetector, render_match
+
+
+def detect_stub_segment(video_path, read_start, start, end, read_end, latency, detect_stride):
+    """Worker: detect_segment with the stub detector instead of the model pool."""
+    detector = StubDetector(latency=latency)
+    return detect_range(lambda frames: detect_batch(detector, frames), video_path, read_start, start, end, read_end,
+                        detect_stride=detect_stride)
+
+
+def time_detection(video_path, num_frames, workers, latency, detect_stride=1, overlap=60):
+    segments = plan_segments(0, num_frames, num_segments=workers, overlap=overlap if detect_stride > 1 else 0,
+                             min_segment_frames=1, detect_stride=detect_stride)
+    started = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=limit_threads, initargs=(1,))
+    with executor:
+        futures = [executor.submit(detect_stub_segment, video_path, *segment, latency, detect_stride)
+                   for segment in segments]
+        stores = [future.result() for future in futures]
+    return DetectionStore.concatenate(stores), time.perf_counter() - started
+
+
+def time_render(video_path, store, work_dir, codec="mp4v"):
+    pipeline = MatchPipeline(None, video_path, os.path.join(work_dir, "processed_video.mp4"),
+                             os.path.join(work_dir, "ball_hits_coordinates.csv"), detections=store,
+                             class_names=StubDetector.names, codec=codec)
+    started = time.perf_counter()
+    pipeline.run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark segmented detection and the sequential render.")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--resolution", default="1280x720")
+    parser.add_argument("--frames", type=int, default=900)
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub detector seconds per frame")
+    parser.add_argument("--detect-stride", type=int, default=1)
+    parser.add_argument("--codec", default="mp4v")
+    parser.add_argument("--work-dir", default=None, help="Where the clip and outputs go (default: a temp dir)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="servesight_segmented_") as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        width, height = (int(size) for size in args.resolution.lower().split("x"))
+        match = render_match(os.path.join(work_dir, "rally.mp4"), width, height, args.frames)
+
+        rows = []
+        for workers in [int(w) for w in args.workers.split(",")]:
+            store, detect_seconds = time_detection(match["video"], args.frames, workers, args.latency,
+                                                   args.detect_stride)
+            render_seconds = time_render(match["video"], store, work_dir, args.codec)
+            rows.append((workers, detect_seconds, render_seconds))
+
+        print(f"{'workers':>8} {'detect':>9} {'render':>9} {'total':>9} {'speedup':>8} {'limit':>8}")
+        base = rows[0][1] + rows[0][2]
+        for workers, detect_seconds, render_seconds in rows:
+            total = detect_seconds + render_seconds
+            limit = (rows[0][1] + render_seconds) / (rows[0][1] / workers + render_seconds)
+            print(f"{workers:>8} {detect_seconds:>8.2f}s {render_seconds:>8.2f}s {total:>8.2f}s "
+                  f"{base / total:>7.2f}x {limit:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Synthetic tennis clips for benchmarking without weights or match footage,
+plus StubDetector, a deterministic stand-in for the YOLO model.
+
+A clip is a court drawn in perspective (the plain court diagram's lines
+mapped onto the frame) and a yellow ball rallying between the baselines,
+arcing up between hits and bouncing once per shot, with short seeded gaps
+where it isn't drawn. render_match() also writes the court keypoints CSV
+in the format CourtLineDetector.save_keypoints_to_csv produces.
+"""
+import os
+import time
+import cv2
+import numpy as np
+import pandas as pd
+from heatmap import TennisHeatmap
+
+COURT_COLOR = (60, 140, 60)
+LINE_COLOR = (255, 255, 255)
+BALL_COLOR = (0, 255, 255)
+# Plain court diagram corners: top left, top right, bottom left, bottom right
+PLAIN_CORNERS = np.float32([(19, 19), (276, 19), (19, 534), (276, 534)])
+
+
+def plain_court_lines():
+    """Court lines of the heatmap's court diagram as ((x, y), (x, y)) pairs."""
+    heatmap = TennisHeatmap(None, None)
+    return [(heatmap.court_points[start], heatmap.court_points[end]) for start, end in heatmap.court_lines]
+
+
+def court_keypoints(width, height):
+    """Frame positions of the court corners, in keypoint order (TL, TR, BL, BR)."""
+    top, bottom = 0.25 * height, 0.9 * height
+    top_half, bottom_half = 0.22 * width, 0.4 * width
+    center = width / 2
+    return np.float32([
+        (center - top_half, top), (center + top_half, top),
+        (center - bottom_half, bottom), (center + bottom_half, bottom),
+    ])
+
+
+def ball_trajectory(num_frames, seed=0, gap_rate=0.01):
+    """
+    Ball ground position on the plain court diagram and height above it per
+    frame, plus the frames the ball was hit. Gaps (NaN) mark frames where
+    the ball is hidden.
+    """
+    rng = np.random.default_rng(seed)
+    ground = np.empty((num_frames, 2))
+    ball_height = np.empty(num_frames)
+    hit_frames = []
+    position = np.array([147.0, 534.0])
+    frame = 0
+    while frame < num_frames:
+        length = int(rng.integers(30, 60))
+        hit_frames.append(frame)
+        target = np.array([rng.uniform(40, 255), 19.0 if position[1] > 276 else 534.0])
+        t = np.linspace(0, 1, length, endpoint=False)
+        # Bounce three quarters of the way, a lower arc after it
+        bounce = 0.75
+        arc = np.where(t < bounce, 60 * np.sin(np.pi * t / bounce), 25 * np.sin(np.pi * (t - bounce) / (1 - bounce)))
+        count = min(length, num_frames - frame)
+        ground[frame:frame + count] = (position + np.outer(t, target - position))[:count]
+        ball_height[frame:frame + count] = arc[:count]
+        position, frame = target, frame + length
+
+    hidden = np.zeros(num_frames, dtype=bool)
+    for start in rng.choice(num_frames, size=max(1, int(num_frames * gap_rate)), replace=False).tolist():
+        hidden[start:start + int(rng.integers(1, 6))] = True
+    ground[hidden] = np.nan
+    return ground, ball_height, hit_frames
+
+
+def render_match(path, width=1280, height=720, num_frames=900, fps=30, seed=0):
+    """
+    Write a synthetic clip to path (mp4v) and its keypoints CSV next to it.
+    Existing clips are reused. Returns a dict with the paths and the ground truth.
+    """
+    keypoints = court_keypoints(width, height)
+    keypoints_csv = os.path.splitext(path)[0] + "_keypoints.csv"
+    ground, ball_height, hit_frames = ball_trajectory(num_frames, seed)
+    plain_to_frame = cv2.getPerspectiveTransform(PLAIN_CORNERS, keypoints)
+    centers = cv2.perspectiveTransform(ground.reshape(-1, 1, 2).astype(np.float32), plain_to_frame).reshape(-1, 2)
+    # Height in diagram units, scaled like the court's vertical extent in the frame
+    centers[:, 1] -= ball_height * (keypoints[2, 1] - keypoints[0, 1]) / 515
+
+    match = {"video": path, "keypoints_csv": keypoints_csv, "width": width, "height": height, "frames": num_frames,
+             "fps": fps, "centers": centers, "hit_frames": hit_frames, "keypoints": keypoints}
+    if os.path.exists(path) and os.path.exists(keypoints_csv):
+        return match
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pd.DataFrame({"X": keypoints[:, 0], "Y": keypoints[:, 1]}).to_csv(keypoints_csv, index=False)
+
+    court = np.full((height, width, 3), COURT_COLOR, dtype=np.uint8)
+    line_width = max(1, height // 360)
+    for start, end in plain_court_lines():
+        line = cv2.perspectiveTransform(np.float32([[start, end]]), plain_to_frame)[0]
+        cv2.line(court, tuple(np.round(line[0]).astype(int).tolist()), tuple(np.round(line[1]).astype(int).tolist()),
+                 LINE_COLOR, line_width, cv2.LINE_AA)
+
+    radius = max(2, height // 120)
+    tmp_path = f"{path}.tmp.mp4"
+    writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    try:
+        for x, y in centers:
+            frame = court.copy()
+            if np.isfinite(x):
+                cv2.circle(frame, (int(round(x)), int(round(y))), radius, BALL_COLOR, -1, cv2.LINE_AA)
+            writer.write(frame)
+    finally:
+        writer.release()
+    os.replace(tmp_path, path)
+    return match
+
+
+class _Values:
+    """Just enough of a torch tensor for extract_boxes: tolist() and indexing."""
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    def tolist(self):
+        return self.values.tolist()
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+
+class _Box:
+    def __init__(self, xyxy, conf, class_id):
+        self.xyxy = _Values([xyxy])
+        self.conf = _Values([conf])
+        self.cls = _Values([class_id])
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubDetector:
+    """
+    Deterministic stand-in for the ultralytics YOLO model: the ball box has
+    the size of the ball-coloured pixels' bounding box and is centred on
+    their centroid, so like a regressed YOLO box it moves in sub-pixel steps
+    rather than whole pixels (1/64 px, exact in the float32 DetectionStore).
+    It has the predict() / model.names interface the pipeline uses. latency adds a fixed per-frame
+    cost, e.g. to emulate a GPU model when timing the stages around it.
+    """
+
+    names = {0: "tennis ball"}
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.frames = 0
+
+    def detect(self, frame, conf):
+        mask = cv2.inRange(frame, (0, 200, 200), (110, 255, 255))
+        moments = cv2.moments(mask, binaryImage=True)
+        ball_conf = 0.9
+        if moments["m00"] == 0 or ball_conf <= conf:
+            return _Result([])
+        _, _, w, h = cv2.boundingRect(mask)
+        cx, cy = (round(moments[m] / moments["m00"] * 64) / 64 for m in ("m10", "m01"))
+        return _Result([_Box([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], ball_conf, 0)])
+
+    def predict(self, source, conf=0.25, verbose=True, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        self.frames += len(frames)
+        if self.latency:
+            time.sleep(self.latency * len(frames))
+        return [self.detect(frame, conf) for frame in frames]
+
+    def __call__(self, *args, **kwargs):
+        return self.predict(*args, **kwargs)
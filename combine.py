@@ -1,12 +1,21 @@
 import streamlit as st
 import os
+import json
+import shutil
 import time
-import tempfile
-import cv2
-from dotline import DotLine
-from ball_hits import BallTracker
+import uuid
+from pipeline import MatchPipeline
 from heatmap import TennisHeatmap
 from image_ploting import ImagePlotter
+from detection_cache import DetectionCache, file_sha256
+from hit_index import HitIndex
+from model_pool import get_model
+from jobs import result_params
+from edge import detect_court_segments
+from result_store import ResultStore, cleanup_stale_dirs
+from instrumentation import Instrumentation, metrics_rows
+from app_assets import asset_bytes, save_upload
+from video_utils import browser_playable
 
 
 # Set up Streamlit page configuration
@@ -23,51 +32,80 @@ st.sidebar.markdown(
     - **Download the Heatmap**  
     """
 )
+# Per-stage breakdown, refreshed while a video is processed
+metrics_panel = st.sidebar.empty()
 
 # Streamlit App Title
 st.title("🎾 Tennis Match Analysis App")
 st.write("Upload a tennis match video to process, track ball movements, and generate a heatmap.")
 
-# Ensure output directory exists
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
+# Finished outputs keyed on upload hash + model + parameters, shared read-only by all sessions
+RESULTS = ResultStore(os.path.join(BASE_DIR, "cache", "results"))
+
+# Each session keeps only its current upload here, abandoned sessions are swept after a day
+UPLOAD_DIR = os.path.join(BASE_DIR, "cache", "uploads")
+UPLOAD_MAX_AGE = 24 * 3600
 
 # Paths for model and processing
 MODEL_PATH = os.path.join(BASE_DIR, "yolo5_last.pt")
-STUB_PATH = os.path.join(BASE_DIR, "ball_tracker.pkl")
+# Court keypoint model, maps the hits onto the plain court (they stay in video pixels without it)
+COURT_MODEL_PATH = os.environ.get("SERVESIGHT_COURT_MODEL", os.path.join(BASE_DIR, "keypoints_model.pth"))
+COURT_CACHE_DIR = os.path.join(BASE_DIR, "cache", "court")
+DETECTION_CACHE = DetectionCache(os.path.join(BASE_DIR, "cache", "detections"))
+# Court-space hits of every processed match, for heatmaps across a tournament
+HIT_INDEX = HitIndex(os.path.join(BASE_DIR, "cache", "hits.sqlite"))
+
+def show_metrics(metrics, title):
+    with metrics_panel.container():
+        st.subheader(title)
+        st.caption(f"⏱️ {metrics['wall_seconds']:.1f}s wall time, peak RSS {metrics['peak_rss_mb']} MB")
+        st.dataframe(metrics_rows(metrics), hide_index=True, use_container_width=True)
+
+
+# Load and warm up the model once per process, every session reuses it
+try:
+    get_model(MODEL_PATH)
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
 
 # Initialize session state
 if "processed_video" not in st.session_state:
     st.session_state.processed_video = None
 if "heatmap_image" not in st.session_state:
     st.session_state.heatmap_image = None
+if "all_matches_heatmap_image" not in st.session_state:
+    st.session_state.all_matches_heatmap_image = None
 if "output_image" not in st.session_state:
     st.session_state.output_image = None
 if "processing_done" not in st.session_state:
     st.session_state.processing_done = False
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "metrics" not in st.session_state:
+    st.session_state.metrics = None
 
 # Upload video file
 uploaded_file = st.file_uploader("📂 Upload a Tennis Match Video", type=["mp4", "avi", "mov", "mkv"])
 
 if uploaded_file:
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
-
-    input_video_path = os.path.join(temp_dir, uploaded_file.name)
-    output_video_path = os.path.join(temp_dir, "processed_video.mp4")
-    converted_video_path = os.path.join(temp_dir, "converted_video.mp4")
-
-    heatmap_image = os.path.join(OUTPUT_DIR, "heatmap.jpg")
-    output_image = os.path.join(OUTPUT_DIR, "court_plot.jpg")
-    ball_hits_csv = os.path.join(OUTPUT_DIR, "ball_hits_coordinates.csv")
-    transformed_csv = os.path.join(OUTPUT_DIR, "transformed_ball_hits_coordinates.csv")
-
-    # Save uploaded file
-    with open(input_video_path, "wb") as f:
-        f.write(uploaded_file.read())
+    # Save each upload once per session, replacing the session's previous one
+    upload_key = f"{uploaded_file.name}:{uploaded_file.size}"
+    session_upload_dir = os.path.join(UPLOAD_DIR, st.session_state.session_id)
+    if st.session_state.get("upload_key") != upload_key:
+        cleanup_stale_dirs(UPLOAD_DIR, UPLOAD_MAX_AGE, keep={st.session_state.session_id})
+        shutil.rmtree(session_upload_dir, ignore_errors=True)
+        os.makedirs(session_upload_dir)
+        st.session_state.input_video_path = os.path.join(session_upload_dir, os.path.basename(uploaded_file.name))
+        save_upload(uploaded_file, st.session_state.input_video_path)
+        st.session_state.upload_key = upload_key
+    input_video_path = st.session_state.input_video_path
+    os.utime(session_upload_dir)  # Still in use
+
+    # Aggregate across matches changes with every upload, so it stays with the session
+    all_matches_heatmap_image = os.path.join(session_upload_dir, "all_matches_heatmap.jpg")
 
     # Display uploaded video
     st.subheader("🎥 Uploaded Video")
@@ -75,44 +113,104 @@ if uploaded_file:
 
     # Processing button
     if st.button("⚡ Process Video & Generate Heatmap"):
-        st.write("⏳ Processing video, please wait...")
-
-        # Step 1: Process the video (from video.py)
-        with st.spinner("🔄 Processing video..."):
-            tracker = DotLine(MODEL_PATH, input_video_path, output_video_path)
-            tracker.process_video()
-
-        # Step 2: Track ball hits and generate coordinates
-        with st.spinner("📌 Tracking ball hits..."):
-            hits = BallTracker(MODEL_PATH, input_video_path, STUB_PATH, ball_hits_csv)
-            hits.process_ball_hits()
-
-        # Step 3: Generate heatmap
-        with st.spinner("🌡️ Generating heatmap..."):
-            heatmap = TennisHeatmap(transformed_csv, heatmap_image)
-            heatmap.generate_heatmap()
+        result_key = RESULTS.make_key(input_video_path, MODEL_PATH, result_params(court_model_path=COURT_MODEL_PATH))
+        result = RESULTS.lookup(result_key)
 
-        # Step 4: Plot ball hits on the court
-        with st.spinner("📍 Plotting ball hits on the court..."):
-            plotter = ImagePlotter(transformed_csv, input_video_path, output_image)
-            plotter.plot_coordinates_on_image()
-
-        # Verify files
-        time.sleep(2)
-
-        if os.path.exists(output_video_path) and os.path.getsize(output_video_path) > 0:
-            st.session_state.processed_video = output_video_path
+        if result:
+            st.success("♻️ Loaded previously processed results for this video.")
+        else:
+            st.write("⏳ Processing video, please wait...")
+
+            # Everything is written to a private staging dir and published in one step
+            work_dir = RESULTS.work_dir()
+            output_video_path = os.path.join(work_dir, "processed_video.mp4")
+            heatmap_image = os.path.join(work_dir, "heatmap.jpg")
+            output_image = os.path.join(work_dir, "court_plot.jpg")
+            ball_hits_csv = os.path.join(work_dir, "ball_hits_coordinates.csv")
+            transformed_csv = os.path.join(work_dir, "transformed_ball_hits_coordinates.csv")
+            segments_json = os.path.join(work_dir, "court_segments.json")
+            metrics = Instrumentation()
+            last_shown = [0.0]
+
+            def show_live_metrics(frame_index, frame, boxes):
+                # Runs on this script thread between frames, so the sidebar can be redrawn once a second
+                if time.time() - last_shown[0] >= 1.0:
+                    last_shown[0] = time.time()
+                    show_metrics(metrics.as_dict(), "📈 Live Stage Breakdown")
+
+            try:
+                # Step 1: Find the court of every camera shot, cached per upload
+                with st.spinner("🎾 Detecting the court..."):
+                    with metrics.stage("court_detection"):
+                        segments_json = detect_court_segments(input_video_path, segments_json, COURT_MODEL_PATH,
+                                                              cache_dir=COURT_CACHE_DIR)
+                if not segments_json:
+                    st.warning("⚠️ Court could not be detected, ball hits are shown in video pixel coordinates.")
+
+                # Step 2: Process the video and track ball hits in a single pass
+                with st.spinner("🔄 Processing video & tracking ball hits..."):
+                    pipeline = MatchPipeline(MODEL_PATH, input_video_path, output_video_path, ball_hits_csv, cache=DETECTION_CACHE,
+                                             metrics=metrics, court_segments_json=segments_json)
+                    pipeline.add_consumer(show_live_metrics)
+                    pipeline.run()
+                    # Only court-space hits belong in the plain-court grid
+                    if segments_json:
+                        with metrics.stage("hit_index"):
+                            HIT_INDEX.add_match(file_sha256(input_video_path), transformed_csv,
+                                                fps=pipeline.dotline.source.fps, video=uploaded_file.name)
+
+                # Step 3: Generate heatmap
+                with st.spinner("🌡️ Generating heatmap..."):
+                    heatmap = TennisHeatmap(transformed_csv, heatmap_image, metrics=metrics)
+                    heatmap.generate_heatmap()
+
+                # Step 4: Plot ball hits on the court
+                with st.spinner("📍 Plotting ball hits on the court..."):
+                    with metrics.stage("court_plot"):
+                        plotter = ImagePlotter(transformed_csv, input_video_path, output_image)
+                        plotter.plot_coordinates_on_image()
+                metrics.save_json(os.path.join(work_dir, "metrics.json"))
+            except Exception:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                raise
+
+            files = {"processed_video": "processed_video.mp4", "heatmap_image": "heatmap.jpg",
+                     "ball_hits_csv": "ball_hits_coordinates.csv", "transformed_csv": "transformed_ball_hits_coordinates.csv",
+                     "metrics_json": "metrics.json"}
+            if os.path.exists(output_image):
+                files["output_image"] = "court_plot.jpg"
+            if segments_json:
+                files["court_segments_json"] = "court_segments.json"
+            result = RESULTS.commit(result_key, work_dir, files) or {}
+
+        # All indexed matches, rendered straight from the pre-binned counts
+        TennisHeatmap(None, all_matches_heatmap_image).generate_from_counts(HIT_INDEX.counts())
+
+        processed_video = result.get("processed_video")
+        heatmap_image = result.get("heatmap_image")
+        output_image = result.get("output_image")
+
+        st.session_state.metrics = None
+        if result.get("metrics_json"):
+            with open(result["metrics_json"]) as f:
+                st.session_state.metrics = json.load(f)
+
+        if processed_video and os.path.getsize(processed_video) > 0:
+            st.session_state.processed_video = processed_video
             st.success("✅ Video processing complete!")
         else:
             st.error("❌ Processed video is missing.")
 
-        if os.path.exists(heatmap_image) and os.path.getsize(heatmap_image) > 0:
+        if heatmap_image and os.path.getsize(heatmap_image) > 0:
             st.session_state.heatmap_image = heatmap_image
             st.success("✅ Heatmap generated successfully!")
         else:
             st.error("❌ Heatmap missing!")
 
-        if os.path.exists(output_image) and os.path.getsize(output_image) > 0:
+        if os.path.exists(all_matches_heatmap_image) and os.path.getsize(all_matches_heatmap_image) > 0:
+            st.session_state.all_matches_heatmap_image = all_matches_heatmap_image
+
+        if output_image and os.path.getsize(output_image) > 0:
             st.session_state.output_image = output_image
             st.success("✅ Court plot generated successfully!")
         else:
@@ -120,62 +218,38 @@ if uploaded_file:
 
         st.session_state.processing_done = True
 
+if st.session_state.processing_done and st.session_state.metrics:
+    show_metrics(st.session_state.metrics, "📈 Stage Breakdown")
+
 # Display outputs only if processing is done
 if st.session_state.processing_done:
     st.subheader("🎬 Processed Video")
 
     if st.session_state.processed_video:
-        # Convert video to a display-compatible format
-        def convert_video(input_path, output_path):
-            cap = cv2.VideoCapture(input_path)
-            fourcc = cv2.VideoWriter_fourcc(*'avc1')
-            fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-            if width == 0 or height == 0:
-                st.error("❌ Error: Processed video has invalid dimensions.")
-                return False
-
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                out.write(frame)
-
-            cap.release()
-            out.release()
-            return True
-
-        success = convert_video(st.session_state.processed_video, converted_video_path)
-
-        if success:
-            with open(converted_video_path, "rb") as video_file:
-                processed_video_bytes = video_file.read()
-                if len(processed_video_bytes) > 0:
-                    st.video(processed_video_bytes)
-                else:
-                    st.error("❌ Converted video is empty.")
+        # The pipeline already wrote a browser-playable file, show it as is
+        if os.path.getsize(st.session_state.processed_video) > 0:
+            if not browser_playable(st.session_state.processed_video):
+                st.warning("⚠️ This server's OpenCV has no H.264 / VP9 encoder, so the video was written as mp4v, "
+                           "which browsers can't play. Download it to watch it in a desktop player.")
+            st.video(st.session_state.processed_video)
         else:
-            st.error("❌ Could not convert processed video.")
+            st.error("❌ Processed video is empty.")
 
     # Display Heatmap
     st.subheader("📊 Heatmap of Ball Hits")
     if st.session_state.heatmap_image:
-        with open(st.session_state.heatmap_image, "rb") as img_file:
-            img_bytes = img_file.read()
-            st.image(img_bytes, use_column_width=True)
+        st.image(asset_bytes(st.session_state.heatmap_image), use_column_width=True)
     else:
         st.error("⚠️ Heatmap image not found.")
 
+    if st.session_state.all_matches_heatmap_image:
+        st.subheader(f"🗂️ Ball Hits Across All Matches ({len(HIT_INDEX.matches())} indexed)")
+        st.image(asset_bytes(st.session_state.all_matches_heatmap_image), use_column_width=True)
+
     # Display Ball Hits on Court
     st.subheader("📌 Ball Hits on the Court")
     if st.session_state.output_image:
-        with open(st.session_state.output_image, "rb") as img_file:
-            img_bytes = img_file.read()
-            st.image(img_bytes, use_column_width=True)
+        st.image(asset_bytes(st.session_state.output_image), use_column_width=True)
     else:
         st.error("⚠️ Court plot image not found.")
 
@@ -183,9 +257,7 @@ if st.session_state.processing_done:
     st.write("📥 Download Processed Files:")
 
     if st.session_state.heatmap_image:
-        with open(st.session_state.heatmap_image, "rb") as file:
-            st.download_button("⬇ Download Heatmap", data=file, file_name="heatmap.jpg")
+        st.download_button("⬇ Download Heatmap", data=asset_bytes(st.session_state.heatmap_image), file_name="heatmap.jpg")
 
     if st.session_state.output_image:
-        with open(st.session_state.output_image, "rb") as file:
-            st.download_button("⬇ Download Court Plot", data=file, file_name="court_plot.jpg")
+        st.download_button("⬇ Download Court Plot", data=asset_bytes(st.session_state.output_image), file_name="court_plot.jpg")
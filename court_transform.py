@@ -0,0 +1,147 @@
+import bisect
+import json
+import os
+import cv2
+import numpy as np
+import pandas as pd
+
+# Coordinates of the court edges in the plain image. These are not changable fixed
+PLAIN_BOTTOM_LEFT = np.array([19, 554])
+PLAIN_BOTTOM_RIGHT = np.array([276, 534])
+PLAIN_TOP_LEFT = np.array([19, 19])
+PLAIN_TOP_RIGHT = np.array([276, 19])
+
+# (path, size, mtime) -> CourtTransform, so each keypoints file is only solved once per process
+_transform_memo = {}
+
+
+def plain_image_dimensions():
+    width = np.linalg.norm(PLAIN_BOTTOM_RIGHT - PLAIN_BOTTOM_LEFT)
+    height = np.linalg.norm(PLAIN_TOP_LEFT - PLAIN_BOTTOM_LEFT)
+    return width, height
+
+
+def load_court_keypoints(coords_csv):
+    coords_df = pd.read_csv(coords_csv)
+    if coords_df.columns[0] not in ("X", "Y"):
+        # Written with its index, rows are looked up by that index as calculate_court_pixels' index_col=0 did
+        coords_df = coords_df.set_index(coords_df.columns[0])
+    # Map coordinates from the CSV file based on index values
+    return coords_df.loc[[0, 1, 2, 3], ["X", "Y"]].values.astype(np.float32)
+
+
+def court_geometry(coords_pts):
+    """Homography from video pixels to the cropped court, plus the court width and height."""
+    # Calculate court width and height based on the original court points
+    court_width = coords_pts[3][0] - coords_pts[2][0]
+    court_height = coords_pts[2][1] - coords_pts[0][1]
+
+    # Top corners keep half their original y, bottom corners sit on the court edges
+    cropped_court_pts = np.array([
+        [0, coords_pts[0][1] / 2],  # Top Left → (0, middle_y_top_left)
+        [court_width, coords_pts[1][1] / 2],  # Top Right → (court_width, middle_y_top_right)
+        [0, court_height],  # Bottom Left → (0, court_height)
+        [court_width, court_height]  # Bottom Right → (court_width, court_height)
+    ], dtype=np.float32)
+
+    H, _ = cv2.findHomography(coords_pts, cropped_court_pts)
+    return H, court_width, court_height
+
+
+def apply_transform(matrix, points):
+    """
+    Map an (n, 2) array of points through a 3x3 projective matrix in one
+    vectorized step. NaN rows (frames without a ball) stay NaN.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    projected = points @ matrix[:, :2].T + matrix[:, 2]
+    return projected[:, :2] / projected[:, 2:3]
+
+
+class CourtTransform:
+    """
+    Video pixel -> court -> plain court image mapping for one set of court
+    keypoints, composed into single 3x3 matrices.
+
+    pixel_to_court is the homography Homography used, pixel_to_plain also
+    applies the court -> plain image scaling CoordinateTransform fitted, so a
+    whole trajectory maps to heatmap space with one matrix product.
+    """
+
+    def __init__(self, coords_pts):
+        self.pixel_to_court, self.court_width, self.court_height = court_geometry(coords_pts)
+        plain_width, plain_height = plain_image_dimensions()
+        self.court_to_plain = np.diag([plain_width / self.court_width, plain_height / self.court_height, 1.0])
+        self.pixel_to_plain = self.court_to_plain @ self.pixel_to_court
+
+    @classmethod
+    def from_keypoints_csv(cls, coords_csv):
+        stat = os.stat(coords_csv)
+        memo_key = (os.path.abspath(coords_csv), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in _transform_memo:
+            _transform_memo[memo_key] = cls(load_court_keypoints(coords_csv))
+        return _transform_memo[memo_key]
+
+    def to_court(self, points):
+        return apply_transform(self.pixel_to_court, points)
+
+    def to_plain(self, points, frame_ids=None):
+        # frame_ids only matters for ShotCourtTransforms, one set of keypoints covers every frame here
+        return apply_transform(self.pixel_to_plain, points)
+
+    def court_to_plain_points(self, points):
+        return apply_transform(self.court_to_plain, points)
+
+
+class ShotCourtTransforms:
+    """
+    One CourtTransform per camera shot, so hits keep mapping to the right court
+    position after a cut. segments are {"start", "end", "keypoints"} dicts as
+    edge.VideoProcessor finds them (frame ids, end exclusive); each point is
+    mapped with the transform of the shot its frame falls in, frames before
+    the first shot use the first one.
+    """
+
+    def __init__(self, segments):
+        if not segments:
+            raise ValueError("Error: No court segments to build transforms from")
+        self.segments = segments
+        self.starts = [segment["start"] for segment in segments]
+        self.transforms = [
+            CourtTransform(np.asarray(segment["keypoints"], dtype=np.float32).reshape(-1, 2)[:4])
+            for segment in segments
+        ]
+
+    @classmethod
+    def from_json(cls, segments_json):
+        stat = os.stat(segments_json)
+        memo_key = (os.path.abspath(segments_json), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in _transform_memo:
+            with open(segments_json) as f:
+                _transform_memo[memo_key] = cls(json.load(f))
+        return _transform_memo[memo_key]
+
+    def save_json(self, segments_json):
+        os.makedirs(os.path.dirname(segments_json) or ".", exist_ok=True)
+        tmp_path = f"{segments_json}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.segments, f)
+        os.replace(tmp_path, segments_json)
+
+    def segment_index(self, frame_index):
+        return max(bisect.bisect_right(self.starts, frame_index) - 1, 0)
+
+    def transform_for_frame(self, frame_index):
+        return self.transforms[self.segment_index(frame_index)]
+
+    def to_plain(self, points, frame_ids=None):
+        """Map (n, 2) pixel points to the plain court image, point i with the homography of frame_ids[i]'s shot."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if frame_ids is None:
+            return self.transforms[0].to_plain(points)
+        segment_ids = np.maximum(np.searchsorted(self.starts, np.asarray(frame_ids), side="right") - 1, 0)
+        plain = np.full_like(points, np.nan)
+        for segment_id in np.unique(segment_ids):
+            rows = segment_ids == segment_id
+            plain[rows] = self.transforms[segment_id].to_plain(points[rows])
+        return plain
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+from detections import DetectionStore
+
+# (path, size, mtime) -> sha256, so the same upload is only hashed once per process
+_file_hash_memo = {}
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hash_memo:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        _file_hash_memo[memo_key] = digest.hexdigest()
+    return _file_hash_memo[memo_key]
+
+
+def remember_sha256(path, digest):
+    """Record a hash computed elsewhere (e.g. while streaming an upload) so file_sha256 doesn't re-read the file."""
+    stat = os.stat(path)
+    _file_hash_memo[(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)] = digest
+
+
+def content_key(video_path, model_path, params=None):
+    """Hex key of a video + weights (by content) + parameters, shared by DetectionCache and ResultStore."""
+    key_data = {
+        "video": file_sha256(video_path),
+        "model": file_sha256(model_path),
+        "params": params or {},
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+
+def inference_params(start_frame=0, end_frame=None, stride=1, conf=None, detect_stride=1, roi_crop_size=None,
+                     backend=None):
+    """Parameters that change what the detector returns and therefore belong in the cache key."""
+    params = {
+        "conf": conf,
+        "start_frame": start_frame,
+        "end_frame": end_frame,
+        "stride": stride,
+        "detect_stride": detect_stride,
+        "roi_crop_size": roi_crop_size,
+    }
+    # Exported / quantized models can return slightly different boxes; torch keeps its existing keys
+    if backend and backend != "torch":
+        params["backend"] = backend
+    return params
+
+
+class DetectionCache:
+    """
+    On-disk cache of raw per-frame detections.
+
+    Entries are keyed on the video content hash, the model weights hash and
+    the inference parameters, and stored as a DetectionStore (a structured
+    .npy array of boxes plus per-frame counts) that is memory-mapped on load.
+    The least recently used entries are evicted once the directory grows
+    past max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, video_path, model_path, params=None):
+        return content_key(video_path, model_path, params)
+
+    def _entry_prefix(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """Return the cached DetectionStore (memory-mapped), or None on a miss."""
+        prefix = self._entry_prefix(key)
+        if not os.path.exists(f"{prefix}.counts.npy"):
+            return None
+        try:
+            store = DetectionStore.load(prefix, mmap=True)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ WARNING: Dropping unreadable detection cache entry {prefix}: {e}")
+            self._remove(key)
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        os.utime(f"{prefix}.counts.npy")
+        return store
+
+    def save(self, key, detections):
+        """Store a DetectionStore, or any iterable of per-frame box lists."""
+        if not isinstance(detections, DetectionStore):
+            detections = DetectionStore.from_frame_boxes(detections)
+
+        # Write to temporary names first, counts last, so readers never see a partial entry
+        prefix = self._entry_prefix(key)
+        tmp_prefix = f"{prefix}.{os.getpid()}.tmp"
+        detections.save(tmp_prefix)
+        os.replace(f"{tmp_prefix}.boxes.npy", f"{prefix}.boxes.npy")
+        os.replace(f"{tmp_prefix}.counts.npy", f"{prefix}.counts.npy")
+
+        self.evict()
+
+    def _remove(self, key):
+        for suffix in (".boxes.npy", ".counts.npy"):
+            try:
+                os.remove(self._entry_prefix(key) + suffix)
+            except FileNotFoundError:
+                pass  # Evicted by another worker
+
+    def evict(self):
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy") or ".tmp" in name:
+                continue
+            key = name.split(".", 1)[0]
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue  # Evicted by another worker
+            last_used, size = entries.get(key, (0, 0))
+            entries[key] = (max(last_used, stat.st_mtime), size + stat.st_size)
+
+        total = sum(size for _, size in entries.values())
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
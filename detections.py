@@ -0,0 +1,173 @@
+import numpy as np
+
+
+def extract_boxes(result):
+    """Flatten one ultralytics result into plain (x1, y1, x2, y2, conf, class_id) tuples."""
+    boxes = []
+    for box in result.boxes:
+        x1, y1, x2, y2 = box.xyxy.tolist()[0]
+        boxes.append((x1, y1, x2, y2, float(box.conf[0]), int(box.cls[0])))
+    return boxes
+
+
+def ball_box(boxes):
+    """The box the ball is taken from when a frame has several: the last one, None for an empty frame."""
+    return boxes[-1] if boxes else None
+
+
+def detect_batch(model, frames, **predict_kwargs):
+    """
+    Run a single predict call over a list of frames.
+    Entry i of the returned list holds the boxes of frames[i].
+    """
+    if not frames:
+        return []
+    results = model.predict(list(frames), verbose=False, **predict_kwargs)
+    return [extract_boxes(result) for result in results]
+
+
+def iter_batches(frames, batch_size):
+    """Group any frame iterable into lists of at most batch_size frames."""
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# One row per detected box, 26 bytes instead of a tuple of Python objects
+DETECTION_DTYPE = np.dtype([
+    ("frame", np.int32),
+    ("x1", np.float32),
+    ("y1", np.float32),
+    ("x2", np.float32),
+    ("y2", np.float32),
+    ("conf", np.float32),
+    ("class_id", np.int16),
+])
+
+
+class DetectionStore:
+    """
+    Every box of every processed frame as one structured NumPy array sorted by
+    frame, plus the box count per frame. `frame` is the position in the
+    processed stream, not the source video frame number.
+
+    Frames are read as zero-copy slices of the record array, and save()/load()
+    use plain .npy files so a stored match can be memory-mapped.
+    """
+
+    def __init__(self, records, counts):
+        self.records = records
+        self.counts = counts
+        self.offsets = np.concatenate(([0], np.cumsum(counts, dtype=np.int64)))
+
+    @classmethod
+    def from_frame_boxes(cls, detections):
+        builder = DetectionStoreBuilder()
+        for boxes in detections:
+            builder.append(boxes)
+        return builder.build()
+
+    @property
+    def num_frames(self):
+        return len(self.counts)
+
+    @property
+    def valid(self):
+        """Mask of frames with at least one detection."""
+        return self.counts > 0
+
+    def __len__(self):
+        return self.num_frames
+
+    def frame(self, index):
+        """Records of one frame, as a view into the store."""
+        return self.records[self.offsets[index]:self.offsets[index + 1]]
+
+    def frame_boxes(self, index):
+        """One frame as (x1, y1, x2, y2, conf, class_id) tuples, the format the renderers take."""
+        return [
+            (x1, y1, x2, y2, conf, class_id)
+            for _, x1, y1, x2, y2, conf, class_id in self.frame(index).tolist()
+        ]
+
+    def __iter__(self):
+        for index in range(self.num_frames):
+            yield self.frame_boxes(index)
+
+    def ball_boxes(self, columns=("x1", "y1", "x2", "y2")):
+        """
+        (num_frames, len(columns)) array of the ball box per frame, NaN where
+        nothing was detected. The last box of a frame wins, as in ball_box().
+        """
+        boxes = np.full((self.num_frames, len(columns)), np.nan)
+        valid = self.valid
+        last = self.records[self.offsets[1:][valid] - 1]
+        for column, name in enumerate(columns):
+            boxes[valid, column] = last[name]
+        return boxes
+
+    @classmethod
+    def concatenate(cls, stores):
+        """Join consecutive stores into one, renumbering frames."""
+        records = []
+        first_frame = 0
+        for store in stores:
+            shifted = np.array(store.records)
+            shifted["frame"] += first_frame
+            records.append(shifted)
+            first_frame += store.num_frames
+        counts = [np.asarray(store.counts, dtype=np.int32) for store in stores]
+        return cls(np.concatenate(records) if records else np.empty(0, dtype=DETECTION_DTYPE),
+                   np.concatenate(counts) if counts else np.empty(0, dtype=np.int32))
+
+    def save(self, prefix):
+        """Write <prefix>.boxes.npy and <prefix>.counts.npy."""
+        np.save(f"{prefix}.boxes.npy", self.records)
+        np.save(f"{prefix}.counts.npy", self.counts)
+
+    @classmethod
+    def load(cls, prefix, mmap=True):
+        mmap_mode = "r" if mmap else None
+        records = np.load(f"{prefix}.boxes.npy", mmap_mode=mmap_mode)
+        counts = np.load(f"{prefix}.counts.npy", mmap_mode=mmap_mode)
+        return cls(records, counts)
+
+
+class DetectionStoreBuilder:
+    """Appends frames one at a time into growing NumPy buffers, then hands out a DetectionStore."""
+
+    def __init__(self, capacity=1024):
+        self.records = np.empty(capacity, dtype=DETECTION_DTYPE)
+        self.counts = np.empty(capacity, dtype=np.int32)
+        self.num_boxes = 0
+        self.num_frames = 0
+
+    @staticmethod
+    def _grow(array, needed):
+        if needed <= len(array):
+            return array
+        grown = np.empty(max(needed, len(array) * 2), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def append(self, boxes):
+        self.counts = self._grow(self.counts, self.num_frames + 1)
+        self.counts[self.num_frames] = len(boxes)
+        if boxes:
+            self.records = self._grow(self.records, self.num_boxes + len(boxes))
+            rows = self.records[self.num_boxes:self.num_boxes + len(boxes)]
+            rows["frame"] = self.num_frames
+            values = np.asarray([box[:5] for box in boxes], dtype=np.float32)
+            for column, name in enumerate(("x1", "y1", "x2", "y2", "conf")):
+                rows[name] = values[:, column]
+            rows["class_id"] = [box[5] for box in boxes]
+            self.num_boxes += len(boxes)
+        self.num_frames += 1
+
+    def build(self):
+        return DetectionStore(self.records[:self.num_boxes].copy(), self.counts[:self.num_frames].copy())
@@ -0,0 +1,260 @@
+"""
+CPU inference backends for the YOLO ball detector.
+
+    torch           the .pt weights through PyTorch (default)
+    onnx            ONNX Runtime
+    onnx-int8       ONNX Runtime, weights dynamically quantized to INT8 (no calibration data needed)
+    openvino        OpenVINO
+    openvino-int8   OpenVINO, INT8 post-training quantization (NNCF, calibrates on int8_data, required)
+
+Every backend is loaded through ultralytics' YOLO, so predict() and the
+results look the same to DotLine / BallTracker whichever one runs. The
+backend comes from the backend argument or the SERVESIGHT_DETECTOR_BACKEND
+environment variable. torch needs only requirements.txt, the others need the
+optional packages in requirements-backends.txt:
+
+    pip install -r requirements-backends.txt
+
+Exports happen once per weights file and backend into
+EXPORT_DIR/<weights sha256[:16]>-<backend>/ and are reused afterwards;
+concurrent workers export into private staging directories and the first
+one to finish wins.
+
+    python detector_backends.py export --model models/yolo5_last.pt --backend onnx
+    python detector_backends.py parity --model models/yolo5_last.pt --backend onnx --video match.mp4
+
+parity runs torch and the backend on the same frames and fails (exit 1)
+when they disagree on whether there is a ball or where it is (mean IoU and
+the largest ball centre offset in pixels). It also times both per frame:
+INT8 is not faster on every CPU (dynamic quantization in particular can be
+slower than plain onnx), so check the speedup before switching.
+
+openvino-int8 calibrates on tennis frames, never on ultralytics' COCO
+default: pass --int8-data or set SERVESIGHT_INT8_DATA to a dataset YAML.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+import numpy as np
+from detection_cache import file_sha256
+
+BACKENDS = {
+    "torch": None,
+    "onnx": {"format": "onnx", "dynamic": True, "simplify": True},
+    "onnx-int8": {"format": "onnx", "dynamic": True, "simplify": True},
+    "openvino": {"format": "openvino", "dynamic": True},
+    "openvino-int8": {"format": "openvino", "int8": True, "dynamic": True},
+}
+DEFAULT_BACKEND = "torch"
+EXPORT_DIR = os.environ.get("SERVESIGHT_EXPORT_DIR", os.path.join("cache", "models"))
+EXPORT_MANIFEST = "export.json"
+
+
+def resolve_backend(backend=None):
+    """Backend name to use: the argument, else SERVESIGHT_DETECTOR_BACKEND, else torch."""
+    backend = backend or os.environ.get("SERVESIGHT_DETECTOR_BACKEND") or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Error: Unknown detector backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def backend_params(backend=None):
+    """Result key params for the backend, torch results keep the keys they had before backends existed."""
+    backend = resolve_backend(backend)
+    return None if backend == DEFAULT_BACKEND else {"backend": backend}
+
+
+def export_path(model_path, backend, export_dir=EXPORT_DIR):
+    return os.path.join(export_dir, f"{file_sha256(model_path)[:16]}-{backend}")
+
+
+def quantize_onnx(onnx_path):
+    """Dynamic INT8 quantization of an ONNX export, keeping the metadata ultralytics reads (names, stride, imgsz)."""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = onnx_path.replace(".onnx", "_int8.onnx")
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QUInt8)
+    original = onnx.load(onnx_path, load_external_data=False)
+    quantized = onnx.load(quantized_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(original.metadata_props)
+    onnx.save(quantized, quantized_path)
+    return quantized_path
+
+
+def export_model(model_path, backend, export_dir=EXPORT_DIR, imgsz=640, int8_data=None):
+    """
+    Path YOLO() loads the backend from, exporting the weights on first use.
+    torch returns model_path itself. int8_data is the calibration dataset
+    YAML for openvino-int8 (default SERVESIGHT_INT8_DATA), required to export it.
+    """
+    backend = resolve_backend(backend)
+    if BACKENDS[backend] is None:
+        return model_path
+
+    target_dir = export_path(model_path, backend, export_dir)
+    manifest_path = os.path.join(target_dir, EXPORT_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return os.path.join(target_dir, json.load(f)["model"])
+
+    int8_data = int8_data or os.environ.get("SERVESIGHT_INT8_DATA")
+    if backend == "openvino-int8" and not int8_data:
+        # Ultralytics would silently calibrate on COCO, which has no tennis balls
+        raise ValueError("Error: openvino-int8 needs calibration data, pass --int8-data or set SERVESIGHT_INT8_DATA "
+                         "to a dataset YAML of match frames")
+
+    from ultralytics import YOLO
+
+    # Ultralytics writes exports next to the weights, so export a private copy of them
+    staging_dir = os.path.join(export_dir, "tmp", uuid.uuid4().hex)
+    os.makedirs(staging_dir)
+    try:
+        weights = os.path.join(staging_dir, "model.pt")
+        shutil.copyfile(model_path, weights)
+        export_args = dict(BACKENDS[backend])
+        if backend == "openvino-int8":
+            export_args["data"] = int8_data
+        print(f"📦 Exporting {model_path} for {backend}...")
+        exported = str(YOLO(weights).export(imgsz=imgsz, **export_args))
+        if backend == "onnx-int8":
+            exported = quantize_onnx(exported)
+        os.remove(weights)
+
+        with open(os.path.join(staging_dir, EXPORT_MANIFEST), "w") as f:
+            json.dump({"model": os.path.relpath(exported, staging_dir), "backend": backend, "imgsz": imgsz,
+                       "weights_sha256": file_sha256(model_path)}, f)
+        try:
+            os.rename(staging_dir, target_dir)
+        except OSError:
+            # Another worker finished the same export first, use theirs
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    print(f"✅ Exported {backend} model to {target_dir}")
+    return export_model(model_path, backend, export_dir, imgsz, int8_data)
+
+
+def load_detector(model_path, backend=None, export_dir=EXPORT_DIR):
+    """An ultralytics YOLO running on the given backend."""
+    from ultralytics import YOLO
+
+    return YOLO(export_model(model_path, backend, export_dir))
+
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(x2 - x1, 0) * max(y2 - y1, 0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def parity_check(model_path, backend, video_path, num_frames=300, sample_every=5, min_agreement=0.97, min_iou=0.9,
+                 export_dir=EXPORT_DIR, max_center_error=3.0):
+    """
+    Run torch and backend on the same sampled frames and compare the ball box
+    the hit detector would use. Returns a report dict with "passed", which
+    also needs every ball centre within max_center_error pixels of torch's,
+    and both models' milliseconds per frame.
+    """
+    from detections import ball_box, detect_batch
+    from video_utils import FrameSource
+
+    reference_model = load_detector(model_path, "torch")
+    candidate_model = load_detector(model_path, backend, export_dir)
+
+    agree, frames = 0, 0
+    ious, center_errors = [], []
+    reference_seconds, candidate_seconds = 0.0, 0.0
+    with FrameSource(video_path, stride=sample_every) as source:
+        for frame in source:
+            if frames >= num_frames:
+                break
+            frames += 1
+            if frames == 1:
+                # Warm both runtimes up so the first frame's setup doesn't count as inference time
+                detect_batch(reference_model, [frame])
+                detect_batch(candidate_model, [frame])
+            started = time.perf_counter()
+            reference = ball_box(detect_batch(reference_model, [frame])[0])
+            detected = time.perf_counter()
+            candidate = ball_box(detect_batch(candidate_model, [frame])[0])
+            reference_seconds += detected - started
+            candidate_seconds += time.perf_counter() - detected
+            if (reference is None) != (candidate is None):
+                continue
+            agree += 1
+            if reference is not None:
+                ious.append(box_iou(reference, candidate))
+                center_errors.append(float(np.hypot((reference[0] + reference[2] - candidate[0] - candidate[2]) / 2,
+                                                    (reference[1] + reference[3] - candidate[1] - candidate[3]) / 2)))
+
+    report = {
+        "backend": backend,
+        "frames": frames,
+        "ball_agreement": agree / frames if frames else None,
+        "mean_ball_iou": float(np.mean(ious)) if ious else None,
+        "max_center_error_px": max(center_errors) if center_errors else None,
+        "torch_ms_per_frame": 1000 * reference_seconds / frames if frames else None,
+        "backend_ms_per_frame": 1000 * candidate_seconds / frames if frames else None,
+        "speedup": reference_seconds / candidate_seconds if candidate_seconds else None,
+    }
+    report["passed"] = bool(
+        frames
+        and report["ball_agreement"] >= min_agreement
+        and (report["mean_ball_iou"] is None or report["mean_ball_iou"] >= min_iou)
+        and (report["max_center_error_px"] is None or report["max_center_error_px"] <= max_center_error)
+    )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the detector for a CPU backend and check it against torch.")
+    parser.add_argument("command", choices=("export", "parity"))
+    parser.add_argument("--model", default=os.path.join("models", "yolo5_last.pt"))
+    parser.add_argument("--backend", default=None, help=f"One of {', '.join(BACKENDS)}")
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8-data", default=None,
+                        help="Calibration dataset YAML for openvino-int8 (default SERVESIGHT_INT8_DATA), required")
+    parser.add_argument("--video", help="Video to compare on (parity)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--sample-every", type=int, default=5)
+    parser.add_argument("--min-agreement", type=float, default=0.97)
+    parser.add_argument("--min-iou", type=float, default=0.9)
+    parser.add_argument("--max-center-error", type=float, default=3.0, help="Pixels the ball centre may move")
+    args = parser.parse_args(argv)
+
+    backend = resolve_backend(args.backend)
+    path = export_model(args.model, backend, args.export_dir, args.imgsz, args.int8_data)
+    if args.command == "export":
+        print(path)
+        return 0
+
+    if not args.video:
+        parser.error("parity needs --video")
+    report = parity_check(args.model, backend, args.video, args.frames, args.sample_every, args.min_agreement,
+                          args.min_iou, args.export_dir, args.max_center_error)
+    if BACKENDS[backend] is not None:
+        with open(os.path.join(export_path(args.model, backend, args.export_dir), "parity.json"), "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    if report["speedup"] is not None and report["speedup"] < 1:
+        print(f"⚠️ {backend} is slower than torch on this machine ({report['speedup']:.2f}x)")
+    if not report["passed"]:
+        print(f"❌ {backend} disagrees with torch beyond the thresholds")
+        return 1
+    print(f"✅ {backend} matches torch")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
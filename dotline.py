@@ -1,71 +1,168 @@
-from ultralytics import YOLO
-import cv2
-import numpy as np
+from model_pool import get_model
+from detections import extract_boxes, detect_batch, iter_batches
+from video_utils import FrameSource, VideoSink
+from threaded_pipeline import ThreadedPipeline
+from roi_tracking import RoiDetector
+from ball_track import BallKalmanTracker
+from trail_renderer import TrailRenderer
+from instrumentation import Instrumentation
 
 class DotLine:
-    def __init__(self, model_path, input_video, output_video, max_trail=50):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, input_video, output_video, max_trail=50, model=None, start_frame=0, end_frame=None, stride=1,
+                 roi_crop_size=None, smooth_trail=False, trail_blend="region", trail_mode="persistent", fade_frames=None,
+                 codec="avc1", max_height=None, metrics=None, backend=None, class_names=None):
+        # Reuse the process-wide model unless a specific instance is handed in
+        self._model = model
+        self.model_path = model_path
+        self.backend = backend
+        # Only the class names are needed to draw already detected boxes
+        self.class_names = class_names
         self.video_path = input_video
         self.output_video_path = output_video
         self.max_trail = max_trail
-
-        # Open video capture
-        self.cap = cv2.VideoCapture(self.video_path)
-        if not self.cap.isOpened():
-            raise ValueError(f"Error: Could not open video {self.video_path}")
-
-        # Get video properties
-        self.fps = int(self.cap.get(cv2.CAP_PROP_FPS))
-        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        # Define the codec and create VideoWriter
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        self.out = cv2.VideoWriter(self.output_video_path, fourcc, self.fps, (self.width, self.height))
-
-        # Create a blank canvas to store persistent dots and lines
-        self.trail_canvas = np.zeros((self.height, self.width, 3), dtype=np.uint8)
-
-        # List to store detected ball positions
-        self.trajectory_points = []
-
-    def process_video(self):
-        while self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-
+        self.conf_threshold = 0.5
+        # Detect on a crop around the ball once it's locked on, full frames otherwise
+        self.roi_detector = RoiDetector(self.model, crop_size=roi_crop_size, conf=self.conf_threshold) if roi_crop_size else None
+
+        # Open a streaming frame source (raises ValueError if the video can't be opened)
+        self.source = FrameSource(self.video_path, start=start_frame, end=end_frame, stride=stride)
+
+        # Get video properties, strided output keeps real-time playback speed
+        self.fps = int(self.source.fps / stride)
+        self.width = self.source.width
+        self.height = self.source.height
+
+        # Encode once, straight to a browser-playable codec
+        self.out = VideoSink(self.output_video_path, self.fps, (self.width, self.height), codec=codec,
+                             max_height=max_height)
+
+        # Trail canvas and the ring buffer of the last max_trail ball positions, drawn incrementally
+        self.trail = TrailRenderer(self.width, self.height, max_trail=max_trail, blend=trail_blend,
+                                   mode=trail_mode, fade_frames=fade_frames)
+
+        # Optional Kalman track so the trail follows a smoothed, outlier-free path
+        self.ball_track = BallKalmanTracker() if smooth_trail else None
+
+        # Per-stage timings, shared with MatchPipeline when it drives this DotLine
+        self.metrics = metrics if metrics is not None else Instrumentation()
+
+    @property
+    def model(self):
+        # Loaded on first use, drawing precomputed detections with class_names never needs it
+        if self._model is None:
+            self._model = get_model(self.model_path, backend=self.backend)
+        return self._model
+
+    @property
+    def names(self):
+        return self.class_names if self.class_names is not None else self.model.names
+
+    def process_video(self, batch_size=1, threaded=False, queue_size=8):
+        if threaded:
+            self.process_video_threaded(batch_size=batch_size, queue_size=queue_size)
+            return
+
+        frames = self.metrics.timed_iter("decode", self.read_frames())
+        write = self.metrics.timed("encode", self.out.write)
+        if batch_size > 1:
+            # Batched mode: one predict call per batch_size frames
+            detect_frames = self.metrics.timed("detect", self.detect_frames, frames_of=len)
+            draw_trail = self.metrics.timed("render", self.draw_trail)
+            for batch in iter_batches(frames, batch_size):
+                for frame, boxes in zip(batch, detect_frames(batch)):
+                    write(draw_trail(frame, boxes))
+            self.release_resources()
+            return
+
+        for frame in frames:
             frame_with_trail = self.detect_and_track(frame)
-            self.out.write(frame_with_trail)
+            write(frame_with_trail)
 
         self.release_resources()
 
-    def detect_and_track(self, frame):
-        results = self.model.predict(frame, conf=0.5, verbose=False)
-
-        for result in results:
-            for box in result.boxes:
-                class_id = int(box.cls[0])
-                class_name = self.model.model.names[class_id]
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-
-                if class_name.lower() == "tennis ball":
-                    if 0 <= center_x < self.width and 0 <= center_y < self.height:
-                        self.trajectory_points.append((center_x, center_y))
-                        if len(self.trajectory_points) > self.max_trail:
-                            self.trajectory_points.pop(0)
+    def process_video_threaded(self, batch_size=1, queue_size=8):
+        """
+        Decode, detect, render and encode on separate threads joined by bounded
+        queues. Frame order is preserved and per-stage throughput is printed.
+        """
+        def detect(frames):
+            return list(zip(frames, self.detect_frames(frames)))
+
+        def render(detected):
+            return [self.draw_trail(frame, boxes) for frame, boxes in detected]
+
+        def encode(frames):
+            for frame in frames:
+                self.out.write(frame)
+
+        pipeline = ThreadedPipeline(
+            iter_batches(self.metrics.timed_iter("decode", self.read_frames()), batch_size),
+            [(name, self.metrics.timed(name, fn, frames_of=len))
+             for name, fn in (("detect", detect), ("render", render), ("encode", encode))],
+            queue_size=queue_size,
+            item_size=len,
+        )
+        try:
+            pipeline.run()
+        finally:
+            self.release_resources()
+        print(pipeline.report())
+        return pipeline.stats
+
+    def read_frames(self):
+        return iter(self.source)
+
+    def detect_frames(self, frames):
+        if self.roi_detector is not None:
+            return self.roi_detector.detect(frames)
+        return detect_batch(self.model, frames, conf=self.conf_threshold)
 
-                        for i in range(1, len(self.trajectory_points)):
-                            cv2.line(self.trail_canvas, self.trajectory_points[i - 1], self.trajectory_points[i], (0, 255, 0), 2)
-
-                        cv2.circle(self.trail_canvas, (center_x, center_y), 5, (0, 0, 255), -1)
-
-        return cv2.addWeighted(frame, 0.8, self.trail_canvas, 0.5, 0)
+    def detect_and_track(self, frame):
+        with self.metrics.stage("detect", frames=1):
+            if self.roi_detector is not None:
+                boxes = self.roi_detector.detect_frame(frame)
+            else:
+                results = self.model.predict(frame, conf=self.conf_threshold, verbose=False)
+                boxes = [box for result in results for box in extract_boxes(result)]
+        with self.metrics.stage("render", frames=1):
+            return self.draw_trail(frame, boxes)
+
+    def draw_trail(self, frame, boxes):
+        """
+        Update the trail with already detected boxes and overlay it on the frame.
+        With trail_blend="region" the frame is drawn on in place.
+        """
+        ball_boxes = []
+        for x1, y1, x2, y2, conf, class_id in boxes:
+            # Boxes from a shared low-threshold pass still have to clear our own threshold
+            if conf <= self.conf_threshold:
+                continue
+            class_name = self.names[class_id]
+            if class_name.lower() != "tennis ball":
+                continue
+
+            if self.ball_track is not None:
+                ball_boxes.append((x1, y1, x2, y2, conf))
+                continue
+
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+            self.add_trail_point((x1 + x2) // 2, (y1 + y2) // 2)
+
+        if self.ball_track is not None:
+            # One smoothed point per frame, coasting through short detection gaps
+            box = ball_boxes[-1] if ball_boxes else None
+            estimate = self.ball_track.update(box[:4], box[4]) if box else self.ball_track.update(None)
+            if estimate is not None:
+                self.add_trail_point(int(estimate[0]), int(estimate[1]))
+
+        return self.trail.render(frame)
+
+    def add_trail_point(self, center_x, center_y):
+        if 0 <= center_x < self.width and 0 <= center_y < self.height:
+            self.trail.add_point(center_x, center_y)
 
     def release_resources(self):
-        self.cap.release()
+        self.source.release()
         self.out.release()
         
         print(f"dotline video saved to: {self.output_video_path}")
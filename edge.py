@@ -1,30 +1,134 @@
-from Court_Detector.video_utils import read_video
-from Court_Detector.court_line_detector import CourtLineDetector
+import hashlib
+import json
+import os
+import numpy as np
+from court_transform import ShotCourtTransforms
+from detection_cache import file_sha256
+from shot_boundaries import ShotBoundaryDetector
+from video_utils import FrameSource
+
+# Court keypoint model (Court_Detector's CourtLineDetector), hits stay in video pixels without it
+COURT_MODEL_PATH = os.environ.get("SERVESIGHT_COURT_MODEL", os.path.join("models", "keypoints_model.pth"))
+
+
+def court_params(court_model_path=COURT_MODEL_PATH):
+    """Result key params for the court mapping, None (keys as before) when there is no court model."""
+    return {"court_model": file_sha256(court_model_path)} if os.path.exists(court_model_path) else None
+
+
+def detect_court_segments(input_video_path, segments_json, court_model_path=COURT_MODEL_PATH, cache_dir=None):
+    """
+    Write the video's per-shot court keypoints to segments_json for
+    MatchPipeline's court_segments_json. Returns segments_json, or None (with
+    a warning) when the court model or Court_Detector is missing or no court
+    was found, in which case hits stay in video pixels.
+    """
+    if not os.path.exists(court_model_path):
+        print(f"⚠️ WARNING: No court model at {court_model_path}, ball hits stay in video pixel coordinates")
+        return None
+    processor = VideoProcessor(input_video_path, court_model_path, cache_dir=cache_dir, segments_json=segments_json)
+    try:
+        processor.run()
+    except ImportError as e:
+        print(f"⚠️ WARNING: Court detection unavailable ({e}), ball hits stay in video pixel coordinates")
+        return None
+    return segments_json if processor.segments else None
+
 
 class VideoProcessor:
-    def __init__(self, input_video_path, court_model_path):
+    """
+    Finds the court keypoints of every camera shot in a video.
+
+    Frames are sampled every sample_every frames (the rest are grabbed:
+    OpenCV still decodes them, but skips the colour conversion and copy), a
+    ShotBoundaryDetector splits the samples into shots and
+    CourtLineDetector only runs on the first sampled frame of each shot.
+    Segments are cached in cache_dir keyed on the video and court model, so a
+    video is only scanned once. court_transform (a ShotCourtTransforms) maps
+    each hit with the homography of its own shot; with segments_json set the
+    segments are also written there for BallTracker / MatchPipeline's
+    court_segments_json.
+    """
+
+    def __init__(self, input_video_path, court_model_path, sample_every=5, cut_threshold=0.4, cache_dir=None,
+                 segments_json=None):
         self.input_video_path = input_video_path
         self.court_model_path = court_model_path
+        self.sample_every = sample_every
+        self.cut_threshold = cut_threshold
+        self.cache_dir = cache_dir
+        self.segments_json = segments_json
         self.video_frames = None
         self.court_line_detector = None
         self.court_keypoints = None
+        self.segments = []  # [{"start": frame, "end": frame, "keypoints": [...]}], end exclusive
+        self.court_transform = None
 
     def read_video(self):
-        self.video_frames = read_video(self.input_video_path)
+        """Decode every frame into video_frames. run() no longer needs this, it only samples the frames it uses."""
+        with FrameSource(self.input_video_path) as source:
+            self.video_frames = list(source)
 
     def load_model(self):
+        from Court_Detector.court_line_detector import CourtLineDetector
+
         self.court_line_detector = CourtLineDetector(self.court_model_path)
 
+    def cache_path(self):
+        key_data = {
+            "video": file_sha256(self.input_video_path),
+            "model": file_sha256(self.court_model_path),
+            "sample_every": self.sample_every,
+            "cut_threshold": self.cut_threshold,
+        }
+        key = hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.court.json")
+
+    def find_segments(self):
+        """Scan the sampled frames (retrieved only every sample_every frames), re-estimating keypoints at every camera cut."""
+        cuts = ShotBoundaryDetector(threshold=self.cut_threshold, min_gap=self.sample_every * 5)
+        segments = []
+        with FrameSource(self.input_video_path, stride=self.sample_every) as source:
+            for frame_index, frame in source.indexed_frames():
+                if not cuts.is_cut(frame_index, frame):
+                    continue
+                keypoints = np.asarray(self.court_line_detector.predict(frame), dtype=np.float32).ravel()
+                if segments:
+                    segments[-1]["end"] = frame_index
+                segments.append({"start": frame_index, "end": None, "keypoints": keypoints.tolist()})
+            if segments:
+                segments[-1]["end"] = source.position
+        return segments
+
+    def set_segments(self, segments):
+        self.segments = segments
+        self.court_transform = ShotCourtTransforms(segments) if segments else None
+        self.court_keypoints = np.asarray(segments[0]["keypoints"], dtype=np.float32) if segments else None
+
     def detect_court_lines(self):
-        if self.video_frames is not None:
-            self.court_keypoints = self.court_line_detector.predict(self.video_frames[0])
-            self.court_line_detector.save_keypoints_to_csv(self.court_keypoints)
+        cache_path = self.cache_path() if self.cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                self.set_segments(json.load(f))
+            print(f"✅ Loaded {len(self.segments)} cached court segments")
         else:
-            print("Video frames not loaded. Please call read_video() first.")
+            self.set_segments(self.find_segments())
+            if cache_path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{cache_path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self.segments, f)
+                os.replace(tmp_path, cache_path)
+
+        if self.court_keypoints is None:
+            print("No frames could be read from the video.")
+            return
+        # First shot's keypoints, as before, for the CSV based Homography / CoordinateTransform
+        self.court_line_detector.save_keypoints_to_csv(self.court_keypoints)
+        if self.segments_json:
+            self.court_transform.save_json(self.segments_json)
 
     def run(self):
-        self.read_video()
         self.load_model()
         self.detect_court_lines()
-        print("Court coordinates are saved into csv.")
-
+        print(f"Court coordinates of {len(self.segments)} camera shots are saved into csv.")
@@ -2,14 +2,75 @@ import pandas as pd
 import numpy as np
 import cv2
 import os
+from functools import lru_cache
+from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
+from instrumentation import Instrumentation
+
+
+@lru_cache(maxsize=8)
+def court_line_mask(width, height, court_points, court_lines):
+    """Boolean mask of the court lines, drawn once per court layout."""
+    layer = np.zeros((height, width), dtype=np.uint8)
+    for start, end in court_lines:
+        cv2.line(layer, court_points[start], court_points[end], 255, 2)
+    return layer > 0
+
+
+@lru_cache(maxsize=16)
+def heatmap_layout(colormap, panel_width, panel_height):
+    """
+    Static parts of the fast heatmap image (title, colorbar, axis label) for
+    one colormap and panel size. Only the panel and tick labels change per render.
+    """
+    top, left, gap, bar_width, labels_width = 70, 20, 40, 30, 110
+    height = top + panel_height + 20
+    width = left + panel_width + gap + bar_width + labels_width
+    layout = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    title = "Ball Hits Intensity"
+    (text_width, _), _ = cv2.getTextSize(title, cv2.FONT_HERSHEY_SIMPLEX, 1.0, 2)
+    cv2.putText(layout, title, (left + (panel_width - text_width) // 2, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2, cv2.LINE_AA)
+
+    # Gradient with the maximum at the top, same colormap as the panel
+    bar_x = left + panel_width + gap
+    ramp = np.linspace(255, 0, panel_height).astype(np.uint8)[:, None].repeat(bar_width, axis=1)
+    layout[top:top + panel_height, bar_x:bar_x + bar_width] = cv2.applyColorMap(ramp, colormap)
+
+    # Vertical axis label, rendered horizontally then rotated into place
+    label = "Intensity (Frequency of Direction Changes)"
+    (label_width, label_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+    text = np.full((label_height + baseline + 4, label_width + 4, 3), 255, dtype=np.uint8)
+    cv2.putText(text, label, (2, label_height + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
+    text = cv2.rotate(text, cv2.ROTATE_90_COUNTERCLOCKWISE)[:panel_height]
+    label_x = width - text.shape[1] - 5
+    label_y = top + (panel_height - text.shape[0]) // 2
+    layout[label_y:label_y + text.shape[0], label_x:label_x + text.shape[1]] = text
+
+    layout.setflags(write=False)
+    return layout, (left, top), bar_x + bar_width
+
 
 class TennisHeatmap:
-    def __init__(self, direction_changes_csv, output_heatmap, heatmap_width=295, heatmap_height=551):
+    """
+    Heatmap of ball-hit positions on the court diagram.
+
+    Points are binned in one vectorized pass and the court lines come from a
+    cached mask. The default renderer="fast" composes the image with OpenCV
+    on a cached layout (title, colorbar, axis label) in milliseconds; the
+    panel is the same colored grid, only the text is plainer OpenCV text.
+    renderer="matplotlib" keeps the original figure, built on a standalone
+    Figure that is released after saving so nothing accumulates in workers.
+    generate_from_counts() skips the CSV and renders pre-binned counts (see HitIndex).
+    """
+
+    def __init__(self, direction_changes_csv, output_heatmap, heatmap_width=295, heatmap_height=551, scale=2, metrics=None):
         self.direction_changes_csv = direction_changes_csv
         self.output_heatmap = output_heatmap
         self.heatmap_width = heatmap_width
         self.heatmap_height = heatmap_height
+        self.scale = scale  # Panel upscaling for the fast renderer
+        self.metrics = metrics if metrics is not None else Instrumentation()
         self.court_points = [
             (19, 19), (19, 534), (276, 19), (276, 534),
             (44, 19), (44, 534), (251, 20), (251, 534),
@@ -29,11 +90,12 @@ class TennisHeatmap:
             "INFERNO": cv2.COLORMAP_INFERNO
         }
 
-    def generate_heatmap(self, selected_colormap="OCEAN"):
+    def load_points(self):
+        """Read x / y columns from the CSV, returns None (after printing why) if unusable."""
         # ✅ Ensure the CSV file exists
         if not os.path.exists(self.direction_changes_csv):
             print(f"❌ ERROR: CSV file not found - {self.direction_changes_csv}")
-            return
+            return None
 
         print(f"📂 Loading CSV file: {self.direction_changes_csv}")
 
@@ -42,55 +104,96 @@ class TennisHeatmap:
             data = pd.read_csv(self.direction_changes_csv)
         except Exception as e:
             print(f"❌ ERROR: Failed to read CSV file. Exception: {e}")
-            return
+            return None
 
         # ✅ Check if CSV has the correct columns
         if 'x' not in data.columns or 'y' not in data.columns:
             print("❌ ERROR: CSV file is missing 'x' or 'y' columns. Cannot generate heatmap.")
-            return
-
-        # ✅ Ensure output directory exists
-        os.makedirs(os.path.dirname(self.output_heatmap), exist_ok=True)
-
-        # Create a blank heatmap array
-        heatmap = np.zeros((self.heatmap_height, self.heatmap_width), dtype=np.float32)
-
-        # Populate heatmap with direction change points
-        for _, row in data.iterrows():
-            try:
-                x, y = int(row['x']), int(row['y'])
-                if 0 <= x < self.heatmap_width and 0 <= y < self.heatmap_height:
-                    heatmap[y, x] += 1  # Increment intensity at this point
-            except ValueError:
-                print(f"⚠️ WARNING: Skipped invalid row with x={row.get('x')} and y={row.get('y')}")
-
+            return None
+
+        xs = pd.to_numeric(data['x'], errors='coerce').to_numpy(dtype=np.float64)
+        ys = pd.to_numeric(data['y'], errors='coerce').to_numpy(dtype=np.float64)
+        valid = np.isfinite(xs) & np.isfinite(ys)
+        if not valid.all():
+            print(f"⚠️ WARNING: Skipped {int((~valid).sum())} invalid rows")
+        return xs[valid], ys[valid]
+
+    def bin_points(self, xs, ys):
+        """Hit counts per heatmap pixel, points outside the court image are dropped."""
+        # Truncate towards zero like int() did for each row
+        xs = np.trunc(xs).astype(np.int64)
+        ys = np.trunc(ys).astype(np.int64)
+        inside = (xs >= 0) & (xs < self.heatmap_width) & (ys >= 0) & (ys < self.heatmap_height)
+        flat = ys[inside] * self.heatmap_width + xs[inside]
+        counts = np.bincount(flat, minlength=self.heatmap_width * self.heatmap_height)
+        return counts.reshape(self.heatmap_height, self.heatmap_width).astype(np.float32)
+
+    def generate_heatmap(self, selected_colormap="OCEAN", renderer="fast"):
+        with self.metrics.stage("heatmap"):
+            points = self.load_points()
+            if points is None:
+                return
+
+            # ✅ Ensure output directory exists
+            os.makedirs(os.path.dirname(self.output_heatmap), exist_ok=True)
+
+            self.render_counts(self.bin_points(*points), selected_colormap, renderer)
+
+    def generate_from_counts(self, counts, selected_colormap="OCEAN", renderer="fast"):
+        """Render pre-binned counts, e.g. HitIndex.counts() aggregated across matches."""
+        os.makedirs(os.path.dirname(self.output_heatmap) or ".", exist_ok=True)
+        with self.metrics.stage("heatmap"):
+            self.render_counts(counts, selected_colormap, renderer)
+
+    def render_counts(self, counts, selected_colormap="OCEAN", renderer="fast"):
+        """Render an already binned (heatmap_height, heatmap_width) count grid to output_heatmap."""
         # Apply Gaussian blur to smooth the heatmap
-        heatmap = cv2.GaussianBlur(heatmap, (31, 31), 0)
+        heatmap = cv2.GaussianBlur(counts.astype(np.float32, copy=False), (31, 31), 0)
 
         # Normalize heatmap for visualization
         heatmap_normalized = cv2.normalize(heatmap, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX).astype(np.uint8)
 
-        # Convert to a color map
-        colormap = self.colormap_dict.get(selected_colormap, cv2.COLORMAP_OCEAN)
-
-        for line in self.court_lines:
-            pt1 = self.court_points[line[0]]
-            pt2 = self.court_points[line[1]]
-            cv2.line(heatmap_normalized, pt1, pt2, (255), 2)  # White lines on grayscale heatmap
+        # White court lines on the grayscale heatmap, before the colormap is applied
+        mask = court_line_mask(self.heatmap_width, self.heatmap_height, tuple(self.court_points), tuple(self.court_lines))
+        heatmap_normalized[mask] = 255
 
-        # Apply the colormap after drawing the court lines
+        colormap = self.colormap_dict.get(selected_colormap, cv2.COLORMAP_OCEAN)
         heatmap_colored = cv2.applyColorMap(heatmap_normalized, colormap)
 
-        # Matplotlib color bar setup
-        fig, ax = plt.subplots(figsize=(18, 10))
-        im = ax.imshow(cv2.cvtColor(heatmap_colored, cv2.COLOR_BGR2RGB))  # Display heatmap
-        plt.title("Ball Hits Intensity")
-
-        # Adjust the color bar to match the height of the court
-        sm = plt.cm.ScalarMappable(cmap=plt.get_cmap(selected_colormap.lower()), norm=plt.Normalize(vmin=0, vmax=np.max(heatmap)))
-        cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.05, pad=0.04)
-        cbar.set_label('Intensity (Frequency of Direction Changes)', fontsize=12)
-
-        # ✅ Save the final image safely
-        plt.savefig(self.output_heatmap, bbox_inches='tight', dpi=200)
+        if renderer == "matplotlib":
+            self.save_figure(heatmap_colored, float(np.max(heatmap)), selected_colormap)
+        else:
+            cv2.imwrite(self.output_heatmap, self.compose(heatmap_colored, float(np.max(heatmap)), colormap))
         print(f"✅ Heatmap saved successfully at: {self.output_heatmap}")
+
+    def compose(self, heatmap_colored, vmax, colormap):
+        """Place the colored panel and colorbar tick labels on the cached layout."""
+        panel = cv2.resize(heatmap_colored, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_NEAREST)
+        panel_height, panel_width = panel.shape[:2]
+        layout, (left, top), bar_right = heatmap_layout(colormap, panel_width, panel_height)
+
+        image = layout.copy()
+        image[top:top + panel_height, left:left + panel_width] = panel
+        for i in range(5):
+            y = top + panel_height - 1 - i * (panel_height - 1) // 4
+            cv2.line(image, (bar_right, y), (bar_right + 6, y), (0, 0, 0), 1)
+            cv2.putText(image, f"{vmax * i / 4:.2f}", (bar_right + 10, y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 1, cv2.LINE_AA)
+        return image
+
+    def save_figure(self, heatmap_colored, vmax, selected_colormap):
+        """Original matplotlib rendering, the figure is not registered with pyplot and is freed after saving."""
+        fig = Figure(figsize=(18, 10))
+        try:
+            ax = fig.subplots()
+            ax.imshow(cv2.cvtColor(heatmap_colored, cv2.COLOR_BGR2RGB))  # Display heatmap
+            ax.set_title("Ball Hits Intensity")
+
+            # Adjust the color bar to match the height of the court
+            sm = plt.cm.ScalarMappable(cmap=plt.get_cmap(selected_colormap.lower()), norm=plt.Normalize(vmin=0, vmax=vmax))
+            cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.05, pad=0.04)
+            cbar.set_label('Intensity (Frequency of Direction Changes)', fontsize=12)
+
+            # ✅ Save the final image safely
+            fig.savefig(self.output_heatmap, bbox_inches='tight', dpi=200)
+        finally:
+            fig.clear()
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id TEXT PRIMARY KEY,
+    video TEXT,
+    fps REAL,
+    added REAL
+);
+CREATE TABLE IF NOT EXISTS hits (
+    match_id TEXT NOT NULL,
+    set_number INTEGER,
+    frame_id INTEGER NOT NULL,
+    seconds REAL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    cell INTEGER
+);
+CREATE INDEX IF NOT EXISTS hits_by_match_time ON hits (match_id, seconds);
+CREATE TABLE IF NOT EXISTS cell_counts (
+    match_id TEXT NOT NULL,
+    set_number INTEGER NOT NULL,
+    cell INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (match_id, set_number, cell)
+);
+"""
+
+
+class HitIndex:
+    """
+    Embedded SQLite store of court-space ball hits across matches.
+
+    Every hit is binned into the same width x height pixel grid TennisHeatmap
+    draws on (cell = y * width + x). Per match and set cell counts are kept up
+    to date on insert, so aggregate heatmaps over any set of matches are a
+    GROUP BY over a few thousand rows instead of re-reading every CSV. Time
+    window queries fall back to the raw hits table (indexed on match and time).
+    """
+
+    def __init__(self, db_path, width=295, height=551):
+        self.db_path = db_path
+        self.width = width
+        self.height = height
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call, safe across Streamlit threads and worker processes
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def cells(self, xs, ys):
+        """Grid cell per point, -1 for points outside the court image."""
+        xs = np.trunc(np.asarray(xs, dtype=np.float64))
+        ys = np.trunc(np.asarray(ys, dtype=np.float64))
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        return np.where(inside, ys * self.width + xs, -1).astype(np.int64)
+
+    def add_hits(self, match_id, frame_ids, xs, ys, set_number=0, fps=None, video=None, replace=True):
+        """
+        Record one match's (or set's) hits. With replace=True hits previously
+        stored for the same match and set are dropped first, so re-processing
+        a video doesn't double count.
+        """
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        valid = np.isfinite(xs) & np.isfinite(ys)
+        frame_ids, xs, ys = frame_ids[valid], xs[valid], ys[valid]
+        cells = self.cells(xs, ys)
+        seconds = frame_ids / fps if fps else np.full(len(frame_ids), np.nan)
+
+        cell_ids, cell_counts = np.unique(cells[cells >= 0], return_counts=True)
+        with self._connect() as conn:
+            if replace:
+                conn.execute("DELETE FROM hits WHERE match_id = ? AND set_number = ?", (match_id, set_number))
+                conn.execute("DELETE FROM cell_counts WHERE match_id = ? AND set_number = ?", (match_id, set_number))
+            conn.execute(
+                "INSERT OR REPLACE INTO matches (match_id, video, fps, added) VALUES (?, ?, ?, ?)",
+                (match_id, video, fps, time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO hits (match_id, set_number, frame_id, seconds, x, y, cell) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip([match_id] * len(xs), [set_number] * len(xs), frame_ids.tolist(),
+                    [None if np.isnan(s) else s for s in seconds.tolist()], xs.tolist(), ys.tolist(), cells.tolist()),
+            )
+            conn.executemany(
+                "INSERT INTO cell_counts (match_id, set_number, cell, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (match_id, set_number, cell) DO UPDATE SET count = count + excluded.count",
+                zip([match_id] * len(cell_ids), [set_number] * len(cell_ids), cell_ids.tolist(), cell_counts.tolist()),
+            )
+        return len(xs)
+
+    def add_match(self, match_id, hits_csv, set_number=0, fps=None, video=None, replace=True):
+        """
+        Record the hits of a transformed ball hits CSV (frame_id, x, y in
+        plain court image coordinates, i.e. written with a court transform;
+        video pixel hits would land in meaningless cells).
+        """
+        data = pd.read_csv(hits_csv)
+        added = self.add_hits(match_id, data['frame_id'], pd.to_numeric(data['x'], errors='coerce'),
+                              pd.to_numeric(data['y'], errors='coerce'), set_number=set_number, fps=fps,
+                              video=video, replace=replace)
+        print(f"✅ Indexed {added} hits for match {video or match_id}")
+        return added
+
+    def remove_match(self, match_id):
+        with self._connect() as conn:
+            for table in ("hits", "cell_counts", "matches"):
+                conn.execute(f"DELETE FROM {table} WHERE match_id = ?", (match_id,))
+
+    def matches(self):
+        """DataFrame of indexed matches with their hit counts."""
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                "SELECT m.match_id, m.video, m.fps, m.added, COUNT(h.frame_id) AS hits "
+                "FROM matches m LEFT JOIN hits h ON h.match_id = m.match_id GROUP BY m.match_id ORDER BY m.added",
+                conn,
+            )
+
+    def counts(self, match_ids=None, set_number=None, start_seconds=None, end_seconds=None):
+        """
+        Aggregate hit counts as a (height, width) float32 grid, ready for
+        TennisHeatmap.render_counts. Without a time window this only reads the
+        pre-binned cell_counts table.
+        """
+        timed = start_seconds is not None or end_seconds is not None
+        table, value = ("hits", "COUNT(*)") if timed else ("cell_counts", "SUM(count)")
+        where, args = ["cell >= 0"], []
+        if match_ids is not None:
+            match_ids = list(match_ids)
+            where.append(f"match_id IN ({', '.join('?' * len(match_ids))})")
+            args += match_ids
+        if set_number is not None:
+            where.append("set_number = ?")
+            args.append(set_number)
+        if start_seconds is not None:
+            where.append("seconds >= ?")
+            args.append(start_seconds)
+        if end_seconds is not None:
+            where.append("seconds < ?")
+            args.append(end_seconds)
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT cell, {value} FROM {table} WHERE {' AND '.join(where)} GROUP BY cell", args
+            ).fetchall()
+
+        grid = np.zeros(self.width * self.height, dtype=np.float32)
+        if rows:
+            cells, totals = np.array(rows, dtype=np.int64).T
+            grid[cells] = totals
+        return grid.reshape(self.height, self.width)
@@ -0,0 +1,170 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """High-water resident set size of this process, None where the platform doesn't report it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.frames = 0
+        self.peak_rss = None
+
+    @property
+    def throughput(self):
+        """Frames per second of time spent in this stage, None for stages that don't count frames."""
+        return self.frames / self.seconds if self.frames and self.seconds > 0 else None
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "calls": self.calls,
+            "seconds": round(self.seconds, 6),
+            "frames": self.frames,
+            "fps": round(self.throughput, 2) if self.throughput else None,
+            "peak_rss_mb": round(self.peak_rss / 1024 ** 2, 1) if self.peak_rss else None,
+        }
+
+
+class Instrumentation:
+    """
+    Per-stage wall time, frame count, throughput and peak RSS of one run.
+
+    Whole passes (interpolation, heatmap, ...) are recorded with
+    `with metrics.stage(name):`, per-frame hot paths by wrapping the stage
+    function with timed() or the frame iterator with timed_iter(). Recording
+    is thread-safe, so ThreadedPipeline stages can share one instance; there
+    the seconds are each stage's busy time, not wall time. Peak RSS is the
+    process high-water mark when the stage last finished.
+
+    With profile=True a cProfile capture runs between start_profile() and
+    stop_profile(), see save_profile().
+    """
+
+    def __init__(self, profile=False):
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.profiler = cProfile.Profile() if profile else None
+
+    def record(self, name, seconds, frames=0):
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = StageMetrics(name)
+            stage.calls += 1
+            stage.seconds += seconds
+            stage.frames += frames
+            stage.peak_rss = peak_rss_bytes()
+
+    @contextmanager
+    def stage(self, name, frames=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, frames)
+
+    def timed(self, name, fn, frames_of=None):
+        """fn wrapped to record each call; frames_of(first argument) counts the frames it handled (default 1)."""
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            self.record(name, time.perf_counter() - started, frames_of(args[0]) if frames_of else 1)
+            return result
+        return wrapper
+
+    def timed_iter(self, name, iterable, frames_of=None):
+        """Yield from iterable, recording the time spent producing each item (e.g. decoding a frame)."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.record(name, time.perf_counter() - started, 0)
+                return
+            self.record(name, time.perf_counter() - started, frames_of(item) if frames_of else 1)
+            yield item
+
+    def start_profile(self):
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def stop_profile(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def save_profile(self, prof_path, text_path=None, limit=40):
+        """Write the cProfile capture (for snakeviz / pstats) and optionally the top functions by cumulative time."""
+        if self.profiler is None:
+            return
+        self.profiler.dump_stats(prof_path)
+        if text_path:
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+            with open(text_path, "w") as f:
+                f.write(stream.getvalue())
+
+    def as_dict(self):
+        with self.lock:
+            stages = [stage.as_dict() for stage in self.stages.values()]
+        peak = peak_rss_bytes()
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            "peak_rss_mb": round(peak / 1024 ** 2, 1) if peak else None,
+            "stages": stages,
+        }
+
+    def save_json(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def report(self):
+        """Per-stage lines, the stage with the most time is marked."""
+        metrics = self.as_dict()
+        lines = [f"⏱️ Finished in {metrics['wall_seconds']:.2f}s, peak RSS {metrics['peak_rss_mb']} MB"]
+        slowest = max(metrics["stages"], key=lambda stage: stage["seconds"], default=None)
+        for stage in metrics["stages"]:
+            fps = f"{stage['fps']:>9.1f} fps" if stage["fps"] else f"{'':>13}"
+            marker = "  ⬅ slowest" if stage is slowest else ""
+            lines.append(f"   {stage['stage']:<16} {stage['frames']:>7} frames  {stage['seconds']:>8.2f}s  {fps}{marker}")
+        return "\n".join(lines)
+
+
+def metrics_rows(metrics):
+    """Table rows of an as_dict() result for display, with each stage's share of the total stage time."""
+    total = sum(stage["seconds"] for stage in metrics.get("stages", [])) or 1.0
+    return [
+        {
+            "Stage": stage["stage"],
+            "Seconds": round(stage["seconds"], 2),
+            "Share": f"{100 * stage['seconds'] / total:.0f}%",
+            "Frames": stage["frames"] or None,
+            "FPS": stage["fps"],
+            "Peak RSS (MB)": stage["peak_rss_mb"],
+        }
+        for stage in metrics.get("stages", [])
+    ]
@@ -0,0 +1,300 @@
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from result_store import ResultStore, cleanup_stale_dirs
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class JobContext:
+    """
+    Handed to a task inside the worker process. progress() records how far
+    the job got and raises JobCancelled once cancel() was requested, so the
+    task stops at its next progress update. When the task sets metrics (an
+    Instrumentation), every progress write also records its per-stage breakdown.
+    """
+
+    def __init__(self, job_dir, status, min_interval=0.5):
+        self.job_dir = job_dir
+        self.status = status
+        self.min_interval = min_interval
+        self.last_write = 0.0
+        self.metrics = None
+
+    @property
+    def cancel_path(self):
+        return os.path.join(self.job_dir, "cancel")
+
+    def update(self, **fields):
+        self.status.update(fields)
+        write_json(os.path.join(self.job_dir, "status.json"), self.status)
+
+    def progress(self, done, total=None, message=None):
+        now = time.time()
+        if now - self.last_write < self.min_interval and (total is None or done < total):
+            return
+        self.last_write = now
+        if os.path.exists(self.cancel_path):
+            raise JobCancelled()
+        fields = {"metrics": self.metrics.as_dict()} if self.metrics is not None else {}
+        self.update(progress=done / total if total else None, done=done, total=total,
+                    message=message or self.status.get("message"), **fields)
+
+
+def run_job(job_dir, task, kwargs):
+    """Worker process entry point, all state goes through status.json in job_dir."""
+    with open(os.path.join(job_dir, "status.json")) as f:
+        status = json.load(f)
+    job = JobContext(job_dir, status)
+    if os.path.exists(job.cancel_path):
+        job.update(state=CANCELLED, finished=time.time())
+        return
+    job.update(state=RUNNING, started=time.time(), worker_pid=os.getpid())
+    try:
+        result = task(job, **kwargs)
+    except JobCancelled:
+        job.update(state=CANCELLED, finished=time.time())
+    except Exception as e:
+        job.update(state=FAILED, error=str(e), traceback=traceback.format_exc(), finished=time.time())
+    else:
+        job.update(state=DONE, progress=1.0, result=result, finished=time.time())
+
+
+class JobQueue:
+    """
+    Background jobs on a fixed-size pool of worker processes, no broker needed.
+
+    submit() returns a job id straight away; status() polls progress and the
+    result, both kept in a status.json per job under jobs_dir so any session
+    (or process) can read them. max_workers bounds how many pipelines (and
+    YOLO instances) run at once, max_pending bounds the backlog and
+    max_per_owner how many unfinished jobs a single session may have.
+    Worker processes are reused, so each loads its model only once. A worker
+    that dies takes the pool with it; the next submit() starts a new one.
+    Directories of finished jobs are removed after keep_seconds.
+    """
+
+    def __init__(self, jobs_dir, max_workers=1, max_pending=8, max_per_owner=2, keep_seconds=24 * 3600):
+        self.jobs_dir = jobs_dir
+        self.keep_seconds = keep_seconds
+        self.max_pending = max_pending
+        self.max_per_owner = max_per_owner
+        self.max_workers = max_workers
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.executor = self.new_executor()
+        self.futures = {}
+        self.owners = {}
+        self.lock = threading.Lock()
+
+    def new_executor(self):
+        # Spawned workers don't inherit the web server's threads or a half-initialised CUDA context
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def restart_executor(self):
+        """
+        Replace a pool broken by a dead worker (OOM, killed). Every job the old
+        pool still held is lost with it and marked failed.
+        """
+        for job_id in list(self.futures):
+            status = self.status(job_id)
+            if status and status["state"] not in FINISHED_STATES:
+                status.update(state=FAILED, finished=time.time(),
+                              error=status.get("error") or "Error: A worker process died (out of memory or killed)")
+                write_json(os.path.join(self.job_dir(job_id), "status.json"), status)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.new_executor()
+        print("⚠️ Job worker pool was broken by a dead worker and has been restarted")
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def unfinished(self, owner=None):
+        return [job_id for job_id, future in self.futures.items()
+                if not future.done() and (owner is None or self.owners.get(job_id) == owner)]
+
+    def prune(self):
+        """Drop directories of jobs that finished more than keep_seconds ago."""
+        removed = cleanup_stale_dirs(self.jobs_dir, self.keep_seconds, keep=set(self.unfinished()))
+        for job_id in [job_id for job_id in self.futures if not os.path.isdir(self.job_dir(job_id))]:
+            self.futures.pop(job_id)
+            self.owners.pop(job_id, None)
+        return removed
+
+    def submit(self, task, owner=None, **kwargs):
+        """Queue task(job, **kwargs) and return its job id. Raises RuntimeError when a limit is hit."""
+        with self.lock:
+            self.prune()
+            if len(self.unfinished()) >= self.max_pending:
+                raise RuntimeError("Error: Too many jobs queued, try again later")
+            if owner is not None and len(self.unfinished(owner)) >= self.max_per_owner:
+                raise RuntimeError(f"Error: At most {self.max_per_owner} jobs per session can run at once")
+
+            job_id = uuid.uuid4().hex
+            job_dir = self.job_dir(job_id)
+            os.makedirs(job_dir)
+            write_json(os.path.join(job_dir, "status.json"), {
+                "id": job_id, "state": QUEUED, "owner": owner, "progress": 0.0, "submitted": time.time(),
+            })
+            try:
+                future = self.executor.submit(run_job, job_dir, task, kwargs)
+            except BrokenProcessPool:
+                # Once a worker dies the pool refuses every new job, start a fresh one
+                self.restart_executor()
+                future = self.executor.submit(run_job, job_dir, task, kwargs)
+            self.futures[job_id] = future
+            self.owners[job_id] = owner
+            return job_id
+
+    def status(self, job_id):
+        """Latest status dict of a job, None for unknown ids."""
+        path = os.path.join(self.job_dir(job_id), "status.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            status = json.load(f)
+
+        # A worker that died (OOM, killed) never writes its final state
+        future = self.futures.get(job_id)
+        if future is not None and future.done() and status["state"] not in FINISHED_STATES:
+            error = future.exception() if not future.cancelled() else None
+            status.update(state=CANCELLED if future.cancelled() else FAILED,
+                          error=str(error) if error else status.get("error"))
+        return status
+
+    def cancel(self, job_id):
+        """Cancel a queued job right away, a running one stops at its next progress update."""
+        job_dir = self.job_dir(job_id)
+        if not os.path.isdir(job_dir):
+            return False
+        open(os.path.join(job_dir, "cancel"), "w").close()
+        future = self.futures.get(job_id)
+        if future is not None and future.cancel():
+            status = self.status(job_id)
+            status.update(state=CANCELLED, finished=time.time())
+            write_json(os.path.join(job_dir, "status.json"), status)
+        return True
+
+    def jobs(self, owner=None):
+        statuses = [self.status(job_id) for job_id in list(self.futures)]
+        return [status for status in statuses if status and (owner is None or status.get("owner") == owner)]
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def result_params(backend=None, court_model_path=None):
+    """ResultStore key params of process_match's outputs: the detector backend and the court model."""
+    from detector_backends import backend_params
+    from edge import COURT_MODEL_PATH, court_params
+
+    params = dict(backend_params(backend) or {})
+    params.update(court_params(court_model_path or COURT_MODEL_PATH) or {})
+    return params or None
+
+
+def process_match(job, model_path, input_video, output_dir=None, cache_dir=None, results_dir=None, result_key=None,
+                  profile=False, court_model_path=None, **pipeline_kwargs):
+    """
+    Job task: run the single-pass pipeline and the heatmap for one upload,
+    writing everything into output_dir (the job's own directory by default).
+    The court keypoints of every camera shot are found first (cached per
+    upload in cache_dir), so the transformed hits are in plain court space;
+    without a court model they stay in video pixels and aren't indexed.
+    With results_dir / result_key the outputs are published to that
+    ResultStore entry instead. Imports happen in the worker.
+    Per-stage metrics are written to metrics.json; profile=True also saves a
+    cProfile capture (profile.prof) and its top functions (profile.txt).
+    """
+    from pipeline import MatchPipeline
+    from heatmap import TennisHeatmap
+    from edge import COURT_MODEL_PATH, detect_court_segments
+    from detection_cache import DetectionCache, file_sha256
+    from hit_index import HitIndex
+    from instrumentation import Instrumentation
+
+    store = ResultStore(results_dir) if results_dir and result_key else None
+    if store:
+        work_dir = store.work_dir()
+        try:
+            outputs = process_match(job, model_path, input_video, output_dir=work_dir, cache_dir=cache_dir,
+                                    profile=profile, court_model_path=court_model_path, **pipeline_kwargs)
+        except BaseException:
+            # Failed or cancelled, don't leave the half-written staging dir behind
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        return store.commit(result_key, work_dir, {name: os.path.basename(path) for name, path in outputs.items()})
+
+    output_dir = output_dir or job.job_dir
+    os.makedirs(output_dir, exist_ok=True)
+    output_video = os.path.join(output_dir, "processed_video.mp4")
+    ball_hits_csv = os.path.join(output_dir, "ball_hits_coordinates.csv")
+    transformed_csv = os.path.join(output_dir, "transformed_ball_hits_coordinates.csv")
+    heatmap_image = os.path.join(output_dir, "heatmap.jpg")
+    metrics_json = os.path.join(output_dir, "metrics.json")
+    segments_json = os.path.join(output_dir, "court_segments.json")
+    cache = DetectionCache(os.path.join(cache_dir, "detections")) if cache_dir else None
+    metrics = Instrumentation(profile=profile)
+    job.metrics = metrics
+
+    metrics.start_profile()
+    try:
+        job.update(message="Detecting the court")
+        with metrics.stage("court_detection"):
+            segments_json = detect_court_segments(input_video, segments_json, court_model_path or COURT_MODEL_PATH,
+                                                  cache_dir=os.path.join(cache_dir, "court") if cache_dir else None)
+
+        job.update(message="Processing video & tracking ball hits")
+        pipeline = MatchPipeline(model_path, input_video, output_video, ball_hits_csv, cache=cache, metrics=metrics,
+                                 court_segments_json=segments_json, **pipeline_kwargs)
+        source = pipeline.dotline.source
+        total = (source.end or source.frame_count) - source.start
+        pipeline.add_consumer(lambda frame_index, frame, boxes: job.progress(frame_index - source.start + 1, total))
+        pipeline.run()
+
+        # Pixel coordinates would land in meaningless cells of the plain-court grid
+        if cache_dir and segments_json:
+            with metrics.stage("hit_index"):
+                HitIndex(os.path.join(cache_dir, "hits.sqlite")).add_match(
+                    file_sha256(input_video), transformed_csv, fps=source.fps, video=os.path.basename(input_video))
+
+        job.update(message="Generating heatmap", metrics=metrics.as_dict())
+        TennisHeatmap(transformed_csv, heatmap_image, metrics=metrics).generate_heatmap()
+    finally:
+        metrics.stop_profile()
+
+    print(metrics.report())
+    metrics.save_json(metrics_json)
+    job.update(metrics=metrics.as_dict())
+    outputs = {
+        "processed_video": output_video,
+        "heatmap_image": heatmap_image,
+        "ball_hits_csv": ball_hits_csv,
+        "transformed_csv": transformed_csv,
+        "metrics_json": metrics_json,
+    }
+    if segments_json:
+        outputs["court_segments_json"] = segments_json
+    if profile:
+        outputs["profile"] = os.path.join(output_dir, "profile.prof")
+        outputs["profile_text"] = os.path.join(output_dir, "profile.txt")
+        metrics.save_profile(outputs["profile"], outputs["profile_text"])
+    return outputs
@@ -1,21 +1,9 @@
-import cv2
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from calculate_court_pixels import calculate_pixels_based_on_coordinates
+from court_transform import CourtTransform, plain_image_dimensions
 
 def calculate_plain_image_dimensions():
-    # Coordinates of the court edges in the plain image. These are not changable fixed
-    bottom_left = np.array([19, 554])
-    bottom_right = np.array([276, 534])
-    top_left = np.array([19, 19])
-    top_right = np.array([276, 19])
-
-    # Calculate width and height
-    width = np.linalg.norm(bottom_right - bottom_left)
-    height = np.linalg.norm(top_left - bottom_left)
-
-    return width, height
+    return plain_image_dimensions()
 
 class CoordinateTransform:
     def __init__(self, input_csv, output_csv, coords_csv):
@@ -24,26 +12,13 @@ class CoordinateTransform:
         self.coords_csv = coords_csv
 
     def change_coordinates(self):
-        court_width, court_height = calculate_pixels_based_on_coordinates(self.coords_csv)
-        plain_width, plain_height = calculate_plain_image_dimensions()
+        # Court -> plain image is a pure scale, taken from the cached composed transform
+        transform = CourtTransform.from_keypoints_csv(self.coords_csv)
 
         data = pd.read_csv(self.input_csv)
-
-        # Linear regression models for x and y coordinates
-        x_model = LinearRegression()
-        y_model = LinearRegression()
-
-        # Create court and plain dimension arrays for fitting
-        court_dimensions = np.array([[0, 0], [court_width, court_height]])
-        plain_dimensions = np.array([[0, 0], [plain_width, plain_height]])
-
-        # Fit the models
-        x_model.fit(court_dimensions[:, 0].reshape(-1, 1), plain_dimensions[:, 0])
-        y_model.fit(court_dimensions[:, 1].reshape(-1, 1), plain_dimensions[:, 1])
-
-        # Apply the scaling factors to the x and y coordinates
-        data['x'] = data['x'] * x_model.coef_[0] + x_model.intercept_
-        data['y'] = data['y'] * y_model.coef_[0] + y_model.intercept_
+        scaled = transform.court_to_plain_points(data[['x', 'y']].to_numpy(dtype=np.float64))
+        data['x'] = scaled[:, 0]
+        data['y'] = scaled[:, 1]
 
         # Create a new DataFrame with frame_id, x, and y
         transformed_data = data[['frame_id', 'x', 'y']]
@@ -0,0 +1,103 @@
+import os
+import threading
+import zipfile
+import numpy as np
+from ultralytics import YOLO
+from detection_cache import file_sha256
+from detector_backends import export_model, resolve_backend
+
+_models = {}
+_pool_lock = threading.Lock()
+
+# sha256 of the published weights by file name; <NAME>_SHA256 in the environment overrides it
+# (e.g. YOLO5_LAST_SHA256 for a retrained release). None: not recorded yet, the first verified
+# file pins its own digest in <weights>.sha256 and every later load has to match it
+PUBLISHED_SHA256 = {
+    "yolo5_last.pt": None,
+}
+
+
+class SharedModel:
+    """
+    Wraps one loaded YOLO model so several pipeline stages and Streamlit
+    sessions can use it. Ultralytics predictors keep per-call state, so
+    predict calls are serialised with a lock. Every other attribute
+    (e.g. model.names) is forwarded to the wrapped model.
+    """
+
+    def __init__(self, model):
+        self._model = model
+        self._lock = threading.Lock()
+
+    def predict(self, *args, **kwargs):
+        with self._lock:
+            return self._model.predict(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        return self.predict(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def __str__(self):
+        return str(self._model)
+
+
+def expected_weights_sha256(model_path):
+    """Pinned sha256 for a weights file: the environment override, else PUBLISHED_SHA256, else its .sha256 file."""
+    name = os.path.basename(model_path)
+    override = os.environ.get(os.path.splitext(name)[0].upper() + "_SHA256")
+    if override or PUBLISHED_SHA256.get(name):
+        return override or PUBLISHED_SHA256[name]
+    if os.path.exists(model_path + ".sha256"):
+        with open(model_path + ".sha256") as f:
+            return f.read().strip()
+    return None
+
+
+def verify_weights(model_path, expected_sha256=None):
+    """
+    Refuse to load a missing, truncated or tampered weights file.
+    PyTorch checkpoints are zip archives, so a cut-off download fails the zip check.
+    The checksum defaults to expected_weights_sha256(); a file with no pin yet records its own.
+    """
+    if not os.path.exists(model_path) or os.path.getsize(model_path) == 0:
+        raise ValueError(f"❌ ERROR: Model weights missing or empty - {model_path}")
+
+    if not zipfile.is_zipfile(model_path):
+        raise ValueError(f"❌ ERROR: Model weights are truncated or corrupt - {model_path}")
+
+    expected_sha256 = expected_sha256 or expected_weights_sha256(model_path)
+    actual = file_sha256(model_path)
+    if expected_sha256 is None:
+        with open(model_path + ".sha256", "w") as f:
+            f.write(actual + "\n")
+        print(f"📌 Pinned {model_path} to sha256 {actual}")
+    elif actual != expected_sha256.lower():
+        raise ValueError(f"❌ ERROR: Checksum mismatch for {model_path}: expected {expected_sha256}, got {actual} "
+                         f"(set {os.path.splitext(os.path.basename(model_path))[0].upper()}_SHA256 for new weights)")
+
+
+def warm_up(model, image_size=640):
+    """Pay the first-inference cost (lazy init, allocations) before a user is waiting."""
+    model.predict(np.zeros((image_size, image_size, 3), dtype=np.uint8), verbose=False)
+
+
+def get_model(model_path, expected_sha256=None, warmup=True, backend=None):
+    """
+    Load each weights file once per process and backend and hand out the same
+    SharedModel afterwards. Non-torch backends load the cached export of the
+    verified weights (see detector_backends).
+    """
+    backend = resolve_backend(backend)
+    key = (os.path.abspath(model_path), backend)
+    with _pool_lock:
+        model = _models.get(key)
+        if model is None:
+            verify_weights(model_path, expected_sha256)
+            model = SharedModel(YOLO(export_model(model_path, backend)))
+            if warmup:
+                warm_up(model)
+            _models[key] = model
+            print(f"✅ Loaded model into pool: {model_path} ({backend})")
+    return model
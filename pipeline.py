@@ -0,0 +1,190 @@
+from model_pool import get_model
+from dotline import DotLine
+from ball_hits import BallTracker
+from detections import detect_batch, iter_batches, DetectionStoreBuilder
+from threaded_pipeline import ThreadedPipeline
+from detection_cache import inference_params
+from detector_backends import resolve_backend
+from adaptive_sampling import StrideDetector
+from roi_tracking import RoiDetector
+from instrumentation import Instrumentation
+from ball_track import KalmanTrack
+
+class MatchPipeline:
+    """
+    Decodes every frame once and runs YOLO once per frame (optionally in
+    batches of batch_size frames per predict call), then hands the
+    detections to the trail renderer (DotLine), the hit detector (BallTracker)
+    and any extra consumers registered with add_consumer().
+
+    With threaded=True decode, detection, rendering and encoding overlap on
+    separate threads (see ThreadedPipeline).
+    With detect_stride > 1 YOLO only runs on every detect_stride-th frame
+    (plus dense bursts around direction changes, see StrideDetector).
+    With roi_crop_size set, frames are detected on a crop around the
+    predicted ball position (see RoiDetector).
+    smoothing="kalman" replaces the batch interpolation with an online
+    BallKalmanTracker for both the trail and the hit detector; the hit
+    track is fed frame by frame as frames are rendered and the hits CSVs
+    get each hit's uncertainty_px.
+    trail_blend / trail_mode are passed to the TrailRenderer ("region", the
+    default, only blends around the trail and leaves the frame undimmed,
+    "full" dims the whole frame as the original overlay did, "fade" makes
+    the trail fade out).
+    codec / max_height configure the single browser-playable encode of the
+    output video (see VideoSink).
+    court_keypoints_csv maps the transformed hits CSV to the plain court
+    image through the composed CourtTransform; court_segments_json (written
+    by edge.VideoProcessor) does so with each camera shot's own homography.
+    Per-stage timings, frame counts and peak RSS go to metrics (an
+    Instrumentation, shared with DotLine and BallTracker).
+    When a DetectionCache is given, a previously processed video is still
+    decoded for the trail overlay but YOLO is not run again. detections
+    hands in an already computed DetectionStore the same way (e.g. from
+    SegmentedPipeline) without loading the model; pass class_names
+    (the model's names dict) so the trail doesn't need it either.
+    backend picks the detector runtime (torch, onnx, openvino, ... see
+    detector_backends); the default comes from SERVESIGHT_DETECTOR_BACKEND.
+    """
+
+    def __init__(self, model_path, input_video, output_video, output_csv_path, cache=None, max_trail=50, batch_size=1,
+                 start_frame=0, end_frame=None, stride=1, threaded=False, queue_size=8, detect_stride=1,
+                 roi_crop_size=None, smoothing="interpolate", trail_blend="region", trail_mode="persistent",
+                 codec="avc1", max_height=None, court_keypoints_csv=None, detections=None, metrics=None, backend=None,
+                 court_segments_json=None, class_names=None):
+        self.metrics = metrics if metrics is not None else Instrumentation()
+        self.backend = resolve_backend(backend)
+        # One model instance shared by every stage and every session in this process,
+        # with precomputed detections it is only loaded if something asks for it
+        self.model = None
+        if detections is None:
+            with self.metrics.stage("load_model"):
+                self.model = get_model(model_path, backend=self.backend)
+        self.dotline = DotLine(model_path, input_video, output_video, max_trail=max_trail, model=self.model,
+                               start_frame=start_frame, end_frame=end_frame, stride=stride,
+                               smooth_trail=smoothing == "kalman", trail_blend=trail_blend, trail_mode=trail_mode,
+                               codec=codec, max_height=max_height, metrics=self.metrics,
+                               backend=self.backend, class_names=class_names)
+        self.ball_tracker = BallTracker(model_path, input_video, output_csv_path, model=self.model, smoothing=smoothing,
+                                        court_keypoints_csv=court_keypoints_csv, metrics=self.metrics,
+                                        backend=self.backend, court_segments_json=court_segments_json)
+        self.model_path = model_path
+        self.input_video = input_video
+        self.cache = cache  # Optional DetectionCache, a hit skips inference entirely
+        self.cached_detections = None
+        self.detections = detections  # Precomputed DetectionStore, skips cache and inference
+        self.consumers = []
+        self.batch_size = batch_size
+        self.threaded = threaded
+        self.queue_size = queue_size
+        self.detect_stride = detect_stride
+        # Crop-based tracking once the ball is locked on, full frames otherwise
+        self.roi_crop_size = roi_crop_size
+        if roi_crop_size and self.model is not None:
+            self.roi_detector = RoiDetector(self.model, crop_size=roi_crop_size)
+        else:
+            self.roi_detector = None
+
+    def add_consumer(self, consumer):
+        """Register a callable invoked as consumer(frame_index, frame, boxes) for every frame."""
+        self.consumers.append(consumer)
+
+    def detect(self, batch):
+        if self.cached_detections is not None:
+            return [(frame_index, frame, next(self.cached_detections)) for frame_index, frame in batch]
+
+        frames = [frame for _, frame in batch]
+        return [(frame_index, frame, boxes) for (frame_index, frame), boxes in zip(batch, self.detect_frames(frames))]
+
+    def detect_frames(self, frames):
+        if self.roi_detector is not None:
+            return self.roi_detector.detect(frames)
+        # Ultralytics' default threshold, DotLine filters its stricter one itself
+        return detect_batch(self.model, frames)
+
+    def run(self):
+        detections = DetectionStoreBuilder()
+        source = self.dotline.source
+        cached = None
+
+        key = None
+        if self.detections is not None:
+            cached = self.detections
+            self.cached_detections = iter(cached)
+        elif self.cache is not None:
+            params = inference_params(source.start, source.end, source.stride, detect_stride=self.detect_stride,
+                                      roi_crop_size=self.roi_crop_size, backend=self.backend)
+            key = self.cache.make_key(self.input_video, self.model_path, params)
+            cached = self.cache.load(key)
+            if cached is not None:
+                print(f"✅ Loaded cached detections for {self.input_video}")
+                self.cached_detections = iter(cached)
+
+        # The hit track is smoothed as frames stream past, not in a pass over the finished store
+        track = KalmanTrack() if self.ball_tracker.smoothing == "kalman" else None
+
+        def render(detected):
+            rendered = []
+            for frame_index, frame, boxes in detected:
+                if cached is None:
+                    detections.append(boxes)
+                if track is not None:
+                    track.update_boxes(boxes)
+                # Consumers see the raw frame, the trail may be drawn onto it in place afterwards
+                for consumer in self.consumers:
+                    consumer(frame_index, frame, boxes)
+                rendered.append(self.dotline.draw_trail(frame, boxes))
+            return rendered
+
+        def encode(frames):
+            for frame in frames:
+                self.dotline.out.write(frame)
+
+        frames = self.metrics.timed_iter("decode", source.indexed_frames())
+        render = self.metrics.timed("render", render, frames_of=len)
+        encode = self.metrics.timed("encode", encode, frames_of=len)
+        stride_detector = None
+        if self.detect_stride > 1 and self.cached_detections is None:
+            # Detection needs look-ahead over the stride window, so it runs inside the frame source
+            dense_detect_fn = None
+            if self.roi_detector is not None:
+                # Bursts come after the keyframe that follows them, outside the ROI lock
+                dense_detect_fn = self.metrics.timed("detect", self.roi_detector.detect_burst, frames_of=len)
+            stride_detector = StrideDetector(self.metrics.timed("detect", self.detect_frames, frames_of=len),
+                                             stride=self.detect_stride, batch_size=self.batch_size,
+                                             dense_detect_fn=dense_detect_fn)
+            batches = iter_batches(stride_detector.detect_stream(frames), self.batch_size)
+            stages = [("render", render), ("encode", encode)]
+            source_name = "detect"
+        else:
+            batches = iter_batches(frames, self.batch_size)
+            stages = [("detect", self.metrics.timed("detect", self.detect, frames_of=len)), ("render", render),
+                      ("encode", encode)]
+            source_name = "decode"
+
+        try:
+            if self.threaded:
+                pipeline = ThreadedPipeline(batches, stages, queue_size=self.queue_size, source_name=source_name, item_size=len)
+                pipeline.run()
+                print(pipeline.report())
+            else:
+                for batch in batches:
+                    for _, stage in stages:
+                        batch = stage(batch)
+        finally:
+            self.dotline.release_resources()
+
+        if stride_detector is not None:
+            print(stride_detector.report())
+        if self.roi_detector is not None and self.cached_detections is None:
+            print(self.roi_detector.report())
+
+        store = cached if cached is not None else detections.build()
+        if key is not None and cached is None:
+            self.cache.save(key, store)
+
+        if track is not None:
+            self.ball_tracker.save_kalman_hits(track, frame_offset=source.start, frame_stride=source.stride)
+        else:
+            self.ball_tracker.save_ball_hits(store.ball_boxes(), frame_offset=source.start, frame_stride=source.stride)
+        return store
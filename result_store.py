@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from detection_cache import content_key
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def cleanup_stale_dirs(root, max_age, keep=(), file_suffix=None):
+    """
+    Remove sub-directories of root untouched for max_age seconds, and files
+    ending in file_suffix (e.g. abandoned ".part" uploads) just the same.
+    Returns how many were removed.
+    """
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name in keep:
+            continue
+        is_dir = os.path.isdir(path)
+        if not is_dir and not (file_suffix and name.endswith(file_suffix)):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                if is_dir:
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class ResultStore:
+    """
+    Finished pipeline outputs (video, heatmap, CSVs), one directory per
+    upload content hash + model hash + parameters, so re-uploading a match
+    returns its results without running anything.
+
+    Outputs are produced in a work_dir() and published with commit(), a
+    single directory rename, so readers never see half-written entries.
+    Entries not read for max_age seconds are dropped, then the least recently
+    used ones until the store fits in max_bytes.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, store_dir, max_bytes=5 * 1024 ** 3, max_age=7 * 24 * 3600):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.tmp_dir = os.path.join(store_dir, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def make_key(self, video_path, model_path, params=None):
+        return content_key(video_path, model_path, params)
+
+    def entry_dir(self, key):
+        return os.path.join(self.store_dir, key)
+
+    def lookup(self, key):
+        """{name: path} of a stored result, None if there is none."""
+        manifest_path = os.path.join(self.entry_dir(key), self.MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        paths = {name: os.path.join(self.entry_dir(key), file_name) for name, file_name in manifest["files"].items()}
+        if not all(os.path.exists(path) for path in paths.values()):
+            return None
+        # Mark as recently used for eviction
+        os.utime(manifest_path)
+        os.utime(self.entry_dir(key))
+        return paths
+
+    def work_dir(self):
+        """Fresh staging directory on the same filesystem as the store."""
+        path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        os.makedirs(path)
+        return path
+
+    def commit(self, key, work_dir, files):
+        """
+        Publish work_dir as the entry for key. files maps result names to file
+        names inside work_dir. Returns the same {name: path} as lookup().
+        """
+        with open(os.path.join(work_dir, self.MANIFEST), "w") as f:
+            json.dump({"files": files, "created": time.time()}, f)
+        try:
+            os.rename(work_dir, self.entry_dir(key))
+        except OSError:
+            # Another job published the same result first, keep theirs
+            shutil.rmtree(work_dir, ignore_errors=True)
+        self.evict(keep=key)
+        return self.lookup(key)
+
+    def entries(self):
+        """(last_used, size, key) of every committed entry."""
+        entries = []
+        for name in os.listdir(self.store_dir):
+            manifest_path = os.path.join(self.store_dir, name, self.MANIFEST)
+            if name == "tmp" or not os.path.exists(manifest_path):
+                continue
+            entries.append((os.path.getmtime(manifest_path), dir_size(os.path.join(self.store_dir, name)), name))
+        return entries
+
+    def evict(self, keep=None):
+        """Apply the age and size limits, never removing the entry keep (e.g. the one just committed)."""
+        # Staging dirs of jobs that died before committing
+        cleanup_stale_dirs(self.tmp_dir, max_age=24 * 3600)
+
+        cutoff = time.time() - self.max_age
+        entries = []
+        for last_used, size, key in self.entries():
+            if key == keep:
+                continue
+            if last_used < cutoff:
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            else:
+                entries.append((last_used, size, key))
+
+        total = sum(size for _, size, _ in entries) + (dir_size(self.entry_dir(keep)) if keep else 0)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            total -= size
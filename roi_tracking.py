@@ -0,0 +1,90 @@
+import numpy as np
+from detections import ball_box, extract_boxes
+
+
+class RoiDetector:
+    """
+    Detects the ball on a small crop around its predicted position once it is
+    locked on, instead of sending the whole frame to YOLO.
+
+    The crop is centred on last position + last velocity and predicted at
+    crop_size resolution, so a 1080p frame costs about as much as a
+    crop_size x crop_size image. Boxes are shifted back to full-frame
+    coordinates. When the ball is not found in the crop, or its confidence
+    drops below min_conf, the same frame is re-detected at full resolution.
+
+    Frames must be passed to detect() in order since each prediction depends
+    on the last one. Frames from before the last detected one (StrideDetector's
+    back-fill between keyframes) go through detect_burst() instead.
+    """
+
+    def __init__(self, model, crop_size=320, min_conf=0.4, **predict_kwargs):
+        self.model = model
+        self.crop_size = crop_size
+        self.min_conf = min_conf
+        self.predict_kwargs = predict_kwargs
+        self.center = None
+        self.velocity = np.zeros(2)
+        self.full_frame_detections = 0
+        self.crop_detections = 0
+
+    def _predict(self, image, **kwargs):
+        results = self.model.predict(image, verbose=False, **self.predict_kwargs, **kwargs)
+        return [box for result in results for box in extract_boxes(result)]
+
+    def _crop_origin(self, frame):
+        height, width = frame.shape[:2]
+        predicted = self.center + self.velocity
+        x0 = int(np.clip(predicted[0] - self.crop_size / 2, 0, width - self.crop_size))
+        y0 = int(np.clip(predicted[1] - self.crop_size / 2, 0, height - self.crop_size))
+        return x0, y0
+
+    def _update(self, box):
+        if box is None:
+            self.center = None
+            self.velocity = np.zeros(2)
+            return
+        center = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+        self.velocity = center - self.center if self.center is not None else np.zeros(2)
+        self.center = center
+
+    def detect_frame(self, frame):
+        height, width = frame.shape[:2]
+        if self.center is not None and width > self.crop_size and height > self.crop_size:
+            x0, y0 = self._crop_origin(frame)
+            crop = frame[y0:y0 + self.crop_size, x0:x0 + self.crop_size]
+            boxes = [
+                (x1 + x0, y1 + y0, x2 + x0, y2 + y0, conf, class_id)
+                for x1, y1, x2, y2, conf, class_id in self._predict(crop, imgsz=self.crop_size)
+            ]
+            ball = ball_box(boxes)
+            if ball is not None and ball[4] >= self.min_conf:
+                self.crop_detections += 1
+                self._update(ball)
+                return boxes
+
+        # Not locked on yet, or lost the ball in the crop: search the whole frame
+        self.full_frame_detections += 1
+        boxes = self._predict(frame)
+        self._update(ball_box(boxes))
+        return boxes
+
+    def detect(self, frames):
+        """Same contract as detections.detect_batch: one box list per frame, in order."""
+        return [self.detect_frame(frame) for frame in frames]
+
+    def detect_burst(self, frames):
+        """
+        Detect in-order frames that lie before the last detected one. The burst
+        starts with a full-frame search and the lock on the latest frame is
+        restored afterwards.
+        """
+        center, velocity = self.center, self.velocity
+        self.center, self.velocity = None, np.zeros(2)
+        try:
+            return self.detect(frames)
+        finally:
+            self.center, self.velocity = center, velocity
+
+    def report(self):
+        return f"🎯 ROI detection: {self.crop_detections} cropped, {self.full_frame_detections} full-frame"
@@ -0,0 +1,291 @@
+"""
+Time-segmented parallel processing of one long match video.
+
+Usage:
+    python segmented.py match.mp4 --workers 8 --output output/long_match
+
+The frame range is split into one contiguous segment per worker process.
+Each worker seeks to its segment and decodes and detects only those frames;
+the per-segment DetectionStores are joined in order into the same store a
+sequential run produces. Smoothing and get_ball_shot_frames then run once on
+the joined trajectory (both are O(n) array passes), so the 30-frame
+lookahead and the interpolation see across segment boundaries and the hits
+are exactly those of a sequential run, with no duplicates to merge.
+
+Plain YOLO detection has no state between frames. Stride detection
+(detect_stride > 1) and ROI tracking (roi_crop_size) do, so with either of
+them each worker also detects `overlap` frames on both sides of its segment
+(the warm-up before, StrideDetector's look-ahead after) and drops those
+frames' boxes. Segment boundaries and read starts are rounded to multiples
+of detect_stride, so every worker's keyframes fall on the same grid as the
+sequential run's.
+
+Rendering the trail needs every earlier point, so it stays one sequential
+decode/render/encode pass over the joined detections (no YOLO, see
+MatchPipeline's detections argument). That pass bounds the speedup
+(Amdahl): with D the sequential detection time and R the render time,
+N workers take at best D / N + R, so no worker count gets below R. Run
+benchmarks/segmented_scaling.py to measure both; e.g. 900 frames of 720p
+with a 20 ms/frame stand-in detector on one core took 25.6s + 7.0s with 1
+worker and 13.8s + 8.7s with 4 (1.45x, bound 2.3x), and the render share
+grows as detection gets faster.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from batch import limit_threads
+from detections import DetectionStore, DetectionStoreBuilder, detect_batch, iter_batches
+from detection_cache import inference_params
+from video_utils import FrameSource
+
+
+def plan_segments(start, end, stride=1, num_segments=1, overlap=0, min_segment_frames=500, detect_stride=1):
+    """
+    (read_start, start, end, read_end) frame ranges covering start..end. A
+    worker reads read_start..read_end and keeps start..end; overlap is
+    counted in processed (strided) frames. Segment lengths and overlap are
+    rounded up to multiples of detect_stride, so both start and read_start
+    sit on the keyframe grid of a sequential run from start.
+    """
+    processed = math.ceil((end - start) / stride)
+    num_segments = max(1, min(num_segments, processed // min_segment_frames))
+    per_segment = math.ceil(math.ceil(processed / num_segments) / detect_stride) * detect_stride
+    overlap = math.ceil(overlap / detect_stride) * detect_stride
+    segments = []
+    for i in range(num_segments):
+        segment_start = start + i * per_segment * stride
+        segment_end = min(start + (i + 1) * per_segment * stride, end)
+        if segment_start >= segment_end:
+            break
+        read_start = max(segment_start - overlap * stride, start)
+        read_end = min(segment_end + overlap * stride, end)
+        segments.append((read_start, segment_start, segment_end, read_end))
+    return segments
+
+
+def detect_segment(model_path, video_path, read_start, start, end, read_end, stride=1, batch_size=1, detect_stride=1,
+                   roi_crop_size=None, backend=None):
+    """
+    Worker: DetectionStore of the frames start..end, detected as part of
+    read_start..read_end (None reads to the end), the model's class names and
+    the seconds it took.
+    """
+    from model_pool import get_model
+    from roi_tracking import RoiDetector
+
+    model = get_model(model_path, backend=backend)
+    dense_detect_fn = None
+    if roi_crop_size:
+        roi_detector = RoiDetector(model, crop_size=roi_crop_size)
+        detect_fn, dense_detect_fn = roi_detector.detect, roi_detector.detect_burst
+    else:
+        # Same threshold as MatchPipeline.detect_frames
+        detect_fn = lambda frames: detect_batch(model, frames)
+
+    started = time.perf_counter()
+    store = detect_range(detect_fn, video_path, read_start, start, end, read_end, stride, batch_size, detect_stride,
+                         dense_detect_fn)
+    return store, dict(model.names), time.perf_counter() - started
+
+
+def detect_range(detect_fn, video_path, read_start, start, end, read_end, stride=1, batch_size=1, detect_stride=1,
+                 dense_detect_fn=None):
+    """
+    DetectionStore of the frames start..end, running detect_fn over
+    read_start..read_end (dense_detect_fn: see StrideDetector).
+    """
+    from adaptive_sampling import StrideDetector
+
+    detections = DetectionStoreBuilder()
+    with FrameSource(video_path, start=read_start, end=read_end, stride=stride) as source:
+        frames = source.indexed_frames()
+        if detect_stride > 1:
+            detected = StrideDetector(detect_fn, stride=detect_stride, batch_size=batch_size,
+                                      dense_detect_fn=dense_detect_fn).detect_stream(frames)
+        else:
+            detected = (
+                (frame_index, frame, boxes)
+                for batch in iter_batches(frames, batch_size)
+                for (frame_index, frame), boxes in zip(batch, detect_fn([frame for _, frame in batch]))
+            )
+        for frame_index, _, boxes in detected:
+            if frame_index >= start and (end is None or frame_index < end):
+                detections.append(boxes)
+    return detections.build()
+
+
+class SegmentedPipeline:
+    """
+    Detects a video's frames in parallel segments (see the module docstring)
+    and writes the same hit CSVs as MatchPipeline. run(output_video=...)
+    also renders the trail video from the joined detections.
+
+    workers defaults to the core count; each worker gets
+    threads_per_worker torch / OpenCV threads (default: cores / workers).
+    A DetectionCache shares entries with MatchPipeline runs of the same range.
+    The backend is exported once up front so the workers only load it.
+    """
+
+    def __init__(self, model_path, input_video, output_csv_path, workers=None, threads_per_worker=None, overlap=60,
+                 min_segment_frames=500, cache=None, batch_size=1, start_frame=0, end_frame=None, stride=1,
+                 detect_stride=1, roi_crop_size=None, smoothing="interpolate", court_keypoints_csv=None,
+                 backend=None, court_segments_json=None):
+        from ball_hits import BallTracker
+        from detector_backends import resolve_backend
+
+        self.model_path = model_path
+        self.input_video = input_video
+        self.workers = workers or os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.min_segment_frames = min_segment_frames
+        self.cache = cache
+        self.batch_size = batch_size
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.stride = stride
+        self.detect_stride = detect_stride
+        self.roi_crop_size = roi_crop_size
+        self.smoothing = smoothing
+        self.court_keypoints_csv = court_keypoints_csv
+        self.court_segments_json = court_segments_json
+        self.backend = resolve_backend(backend)
+        # Warm-up only matters for detectors that carry state from frame to frame
+        self.overlap = overlap if detect_stride > 1 or roi_crop_size else 0
+        # Model is only loaded if something asks for it, the workers load their own
+        self.ball_tracker = BallTracker(model_path, input_video, output_csv_path, smoothing=smoothing,
+                                        court_keypoints_csv=court_keypoints_csv, backend=self.backend,
+                                        court_segments_json=court_segments_json)
+        self.timings = {}
+        # Reported by the workers, so rendering the trail needn't load the model here
+        self.class_names = None
+
+    def segments(self):
+        with FrameSource(self.input_video) as source:
+            end = min(self.end_frame, source.frame_count) if self.end_frame else source.frame_count
+        segments = plan_segments(self.start_frame, end, self.stride, self.workers, self.overlap,
+                                 self.min_segment_frames, self.detect_stride)
+        # Frame counts in the container header can be short, the last segment reads to the real end
+        if segments and self.end_frame is None:
+            segments[-1] = segments[-1][:2] + (None, None)
+        return segments
+
+    def detect(self):
+        """Joined DetectionStore of the whole range, from the cache or the worker processes."""
+        key = None
+        if self.cache is not None:
+            params = inference_params(self.start_frame, self.end_frame, self.stride, detect_stride=self.detect_stride,
+                                      roi_crop_size=self.roi_crop_size, backend=self.backend)
+            key = self.cache.make_key(self.input_video, self.model_path, params)
+            cached = self.cache.load(key)
+            if cached is not None:
+                print(f"✅ Loaded cached detections for {self.input_video}")
+                return cached
+
+        from detector_backends import export_model
+        # Export before forking so the workers don't all race to do it
+        export_model(self.model_path, self.backend)
+
+        segments = self.segments()
+        workers = min(self.workers, len(segments))
+        print(f"📂 {len(segments)} segments on {workers} workers x {self.threads_per_worker} threads")
+        started = time.perf_counter()
+        results = [None] * len(segments)
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=limit_threads, initargs=(self.threads_per_worker,))
+        with executor:
+            futures = {
+                executor.submit(detect_segment, self.model_path, self.input_video, *segment,
+                                self.stride, self.batch_size, self.detect_stride, self.roi_crop_size, self.backend): i
+                for i, segment in enumerate(segments)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                store, self.class_names, seconds = future.result()
+                results[i] = store
+                print(f"✅ Segment {i + 1}/{len(segments)}: {store.num_frames} frames in {seconds:.1f}s")
+
+        store = DetectionStore.concatenate(results)
+        self.timings["detect_seconds"] = time.perf_counter() - started
+        if key is not None:
+            self.cache.save(key, store)
+        return store
+
+    def save_hits(self, store):
+        if self.smoothing == "kalman":
+            self.ball_tracker.save_kalman_hits(self.ball_tracker.kalman_track(store), frame_offset=self.start_frame,
+                                               frame_stride=self.stride)
+        else:
+            self.ball_tracker.save_ball_hits(store.ball_boxes(), frame_offset=self.start_frame, frame_stride=self.stride)
+
+    def run(self, output_video=None, **render_kwargs):
+        """Detect, write the hit CSVs and, with output_video, render the trail video. Returns the DetectionStore."""
+        store = self.detect()
+        if output_video is None:
+            self.save_hits(store)
+            return store
+
+        from pipeline import MatchPipeline
+        started = time.perf_counter()
+        pipeline = MatchPipeline(self.model_path, self.input_video, output_video, self.ball_tracker.output_csv_path,
+                                 start_frame=self.start_frame, end_frame=self.end_frame, stride=self.stride,
+                                 smoothing=self.smoothing, court_keypoints_csv=self.court_keypoints_csv,
+                                 court_segments_json=self.court_segments_json,
+                                 detections=store, class_names=self.class_names, backend=self.backend,
+                                 **render_kwargs)
+        pipeline.run()
+        self.timings["render_seconds"] = time.perf_counter() - started
+        return store
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Process one long tennis match video in parallel time segments.")
+    parser.add_argument("video")
+    parser.add_argument("--model", default=os.path.join("models", "yolo5_last.pt"))
+    parser.add_argument("--output", default=os.path.join("output", "segmented"))
+    parser.add_argument("--cache-dir", default="cache", help="Detection cache directory, '' to disable")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Segments detected in parallel")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch / OpenCV threads per worker (default: cores / workers)")
+    parser.add_argument("--overlap", type=int, default=60, help="Warm-up frames for stride / ROI detection")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--detect-stride", type=int, default=1)
+    parser.add_argument("--smoothing", choices=("interpolate", "kalman"), default="interpolate")
+    parser.add_argument("--backend", default=None, help="Detector backend: torch, onnx, onnx-int8, openvino, openvino-int8")
+    parser.add_argument("--codec", default="avc1")
+    parser.add_argument("--no-video", action="store_true", help="Only write the hit CSVs and heatmap")
+    parser.add_argument("--court-model", default=None,
+                        help="Court keypoint model (default: SERVESIGHT_COURT_MODEL or models/keypoints_model.pth)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from detection_cache import DetectionCache
+    from edge import COURT_MODEL_PATH, detect_court_segments
+    from heatmap import TennisHeatmap
+
+    args = parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    cache = DetectionCache(os.path.join(args.cache_dir, "detections")) if args.cache_dir else None
+    segments_json = detect_court_segments(args.video, os.path.join(args.output, "court_segments.json"),
+                                          args.court_model or COURT_MODEL_PATH,
+                                          cache_dir=os.path.join(args.cache_dir, "court") if args.cache_dir else None)
+    segmented = SegmentedPipeline(args.model, args.video, os.path.join(args.output, "ball_hits_coordinates.csv"),
+                                  workers=args.workers, threads_per_worker=args.threads_per_worker,
+                                  overlap=args.overlap, cache=cache, batch_size=args.batch_size,
+                                  detect_stride=args.detect_stride, smoothing=args.smoothing,
+                                  backend=args.backend, court_segments_json=segments_json)
+
+    started = time.perf_counter()
+    output_video = None if args.no_video else os.path.join(args.output, "processed_video.mp4")
+    store = segmented.run(output_video, codec=args.codec)
+    TennisHeatmap(segmented.ball_tracker.transformed_csv_path, os.path.join(args.output, "heatmap.jpg")).generate_heatmap()
+    print(f"✅ {store.num_frames} frames in {time.perf_counter() - started:.1f}s {segmented.timings}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import cv2
+
+
+class ShotBoundaryDetector:
+    """
+    Cheap camera-cut detector.
+
+    Each frame is shrunk to a thumbnail and summarised by a coarse hue /
+    saturation histogram. A cut is reported when the Bhattacharyya distance to
+    the previous frame's histogram exceeds threshold. Cuts closer than
+    min_gap frames to the last one are ignored, so flashes and fast pans
+    don't split a rally into several shots.
+    """
+
+    def __init__(self, threshold=0.4, min_gap=25, thumb_width=160):
+        self.threshold = threshold
+        self.min_gap = min_gap
+        self.thumb_width = thumb_width
+        self.previous = None
+        self.last_cut = None
+
+    def histogram(self, frame):
+        height, width = frame.shape[:2]
+        thumb = cv2.resize(frame, (self.thumb_width, max(1, height * self.thumb_width // width)), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+        return cv2.normalize(hist, hist)
+
+    def is_cut(self, frame_index, frame):
+        """True if frame_index starts a new shot. The first frame always does."""
+        hist = self.histogram(frame)
+        previous, self.previous = self.previous, hist
+        if previous is None:
+            self.last_cut = frame_index
+            return True
+        if self.last_cut is not None and frame_index - self.last_cut < self.min_gap:
+            return False
+        if cv2.compareHist(previous, hist, cv2.HISTCMP_BHATTACHARYYA) > self.threshold:
+            self.last_cut = frame_index
+            return True
+        return False
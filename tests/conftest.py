@@ -0,0 +1,23 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import pytest
+from synthetic_match import render_match
+
+
+@pytest.fixture(scope="session")
+def synthetic_match(tmp_path_factory):
+    """A short rendered rally (see benchmarks/synthetic_match.py) shared by every test."""
+    return render_match(str(tmp_path_factory.mktemp("match") / "rally.mp4"), width=640, height=360, num_frames=240)
+
+
+@pytest.fixture(scope="session")
+def match_frames(synthetic_match):
+    from video_utils import FrameSource
+
+    with FrameSource(synthetic_match["video"]) as source:
+        return list(source)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from ball_hits import BallTracker
+from synthetic_match import StubDetector, render_match
+from video_utils import FrameSource
+
+
+class CountingDetector(StubDetector):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def predict(self, source, **kwargs):
+        self.calls += 1
+        return super().predict(source, **kwargs)
+
+
+@pytest.fixture(scope="module", params=[0, 1, 2])
+def rally_frames(request, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("stride") / f"rally_{request.param}.mp4")
+    match = render_match(path, width=640, height=360, num_frames=600, seed=request.param)
+    with FrameSource(match["video"]) as source:
+        return list(source)
+
+
+def hits(tracker, store):
+    return tracker.get_ball_shot_frames(tracker.interpolate_ball_array(store.ball_boxes()))
+
+
+def test_stride_hits_within_tolerance_of_dense(tmp_path, rally_frames):
+    detector = CountingDetector()
+    tracker = BallTracker(None, "", str(tmp_path / "ball_hits_coordinates.csv"), model=detector)
+    dense_frames, dense_coordinates = hits(tracker, tracker.detect_boxes(rally_frames))
+
+    detector.frames = 0
+    stride_frames, stride_coordinates = hits(tracker, tracker.detect_boxes(rally_frames, detect_stride=4))
+
+    assert dense_frames
+    assert len(stride_frames) == len(dense_frames)
+    assert np.abs(np.array(stride_frames) - np.array(dense_frames)).max() <= 1
+    assert np.abs(np.array(stride_coordinates) - np.array(dense_coordinates)).max() <= 3
+    assert detector.frames < 0.45 * len(rally_frames)
+
+
+def test_stride_detection_is_batched(tmp_path, rally_frames):
+    detector = CountingDetector()
+    tracker = BallTracker(None, "", str(tmp_path / "ball_hits_coordinates.csv"), model=detector)
+    single = tracker.detect_boxes(rally_frames, batch_size=1, detect_stride=4)
+    single_calls = detector.calls
+
+    detector.calls = 0
+    batched = tracker.detect_boxes(rally_frames, batch_size=8, detect_stride=4)
+
+    np.testing.assert_array_equal(batched.records, single.records)
+    np.testing.assert_array_equal(batched.counts, single.counts)
+    assert detector.calls < single_calls / 3
@@ -0,0 +1,56 @@
+import io
+import json
+import os
+import time
+import api
+from result_store import ResultStore
+
+
+class FakeJobQueue:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, **kwargs):
+        self.submitted.append(kwargs)
+        return "0" * 32
+
+
+def call(environ):
+    response = {}
+
+    def start_response(status, headers):
+        response["status"] = status
+
+    body = b"".join(api.app(environ, start_response))
+    return response["status"], json.loads(body)
+
+
+def test_upload_filename_is_url_decoded_and_stale_parts_removed(tmp_path, monkeypatch):
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    stale = upload_dir / ".dead.part"
+    fresh = upload_dir / ".live.part"
+    stale.write_bytes(b"partial")
+    fresh.write_bytes(b"partial")
+    old = time.time() - api.UPLOAD_MAX_AGE - 60
+    os.utime(stale, (old, old))
+
+    model_path = tmp_path / "weights.pt"
+    model_path.write_bytes(b"weights")
+    queue = FakeJobQueue()
+    monkeypatch.setattr(api, "UPLOAD_DIR", str(upload_dir))
+    monkeypatch.setattr(api, "MODEL_PATH", str(model_path))
+    monkeypatch.setattr(api, "RESULTS", ResultStore(str(tmp_path / "results")))
+    monkeypatch.setattr(api, "job_queue", lambda: queue)
+
+    video = b"not really a video"
+    status, payload = call({
+        "REQUEST_METHOD": "POST", "PATH_INFO": "/matches", "QUERY_STRING": "filename=final%20set%26tiebreak.mp4",
+        "CONTENT_LENGTH": str(len(video)), "wsgi.input": io.BytesIO(video),
+    })
+
+    assert status == "202 Accepted"
+    assert payload["job_id"] == "0" * 32
+    assert os.path.basename(queue.submitted[0]["input_video"]) == "final set&tiebreak.mp4"
+    assert not stale.exists()
+    assert fresh.exists()
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from ball_hits import BallTracker
+from hit_detection import reference_ball_shot_frames
+
+
+def ball(cx, cy):
+    return {1: [cx - 5, cy - 5, cx + 5, cy + 5]}
+
+
+def rally_positions():
+    """
+    Fixed ball series: direction changes right after the first frame and
+    inside the last 30 frames (which the hit search never reaches), gaps at
+    both ends, in the middle of a rally and right at a turn.
+    """
+    y = np.concatenate([
+        np.linspace(400, 100, 40),
+        np.linspace(100, 700, 60),
+        np.linspace(700, 200, 35),
+        np.linspace(200, 650, 50),
+        np.linspace(650, 640, 3),
+        np.linspace(640, 300, 45),
+        np.linspace(300, 600, 20),
+    ])
+    y[1] = 420  # Turn between the first two frames
+    positions = [ball(640 + i % 7, cy) for i, cy in enumerate(y.tolist())]
+    for gap in [0, 1, 2, 70, 71, 72, 73, 134, 135, 200, len(y) - 2, len(y) - 1]:
+        positions[gap] = {}
+    return positions
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return BallTracker(None, "", str(tmp_path / "ball_hits_coordinates.csv"), model=object())
+
+
+def assert_same_hits(hits, reference):
+    assert hits[0] == reference[0]
+    # Gaps give NaN coordinates, which only compare equal with equal_nan
+    assert np.array_equal(np.array(hits[1]), np.array(reference[1]), equal_nan=True)
+
+
+def test_vectorized_hits_match_reference_loop(tracker):
+    positions = rally_positions()
+    reference = reference_ball_shot_frames(positions)
+    assert reference[0], "the series should contain hits"
+    assert_same_hits(tracker.get_ball_shot_frames(positions), reference)
+    assert_same_hits(tracker.get_ball_shot_frames(tracker.positions_to_array(positions)), reference)
+
+
+@pytest.mark.parametrize("length", [0, 5, 30, 31, 36])
+def test_series_shorter_than_the_hit_window(tracker, length):
+    positions = rally_positions()[:length]
+    assert_same_hits(tracker.get_ball_shot_frames(positions), reference_ball_shot_frames(positions))
+
+
+def test_matches_reference_on_random_rallies(tracker):
+    from hit_detection import synthetic_trajectory
+
+    positions = synthetic_trajectory(5000, seed=7)
+    assert_same_hits(tracker.get_ball_shot_frames(positions), reference_ball_shot_frames(positions))
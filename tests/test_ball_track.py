@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pipeline
+from ball_track import KalmanTrack
+from detections import DetectionStore
+from pipeline import MatchPipeline
+from synthetic_match import StubDetector
+
+
+def frame_boxes(num_frames=200, seed=0):
+    """A ball moving diagonally, with gaps and a few outlier boxes."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(num_frames):
+        if i < 3 or 80 <= i < 90 or rng.random() < 0.05:
+            frames.append([])
+            continue
+        cx, cy = 100 + 3.3 * i, 500 - 1.7 * i
+        if rng.random() < 0.03:
+            cx += 300  # Outlier, gated by the filter
+        frames.append([(cx - 5, cy - 5, cx + 5, cy + 5, float(rng.uniform(0.3, 0.9)), 0)])
+    return frames
+
+
+def test_streamed_track_matches_the_store_pass(tmp_path):
+    from ball_hits import BallTracker
+
+    frames = frame_boxes()
+    track = KalmanTrack(capacity=16)  # Grows while streaming
+    for boxes in frames:
+        track.update_boxes(boxes)
+
+    tracker = BallTracker(None, "", str(tmp_path / "ball_hits_coordinates.csv"), model=object())
+    stored = tracker.kalman_track(DetectionStore.from_frame_boxes(frames))
+    assert track.num_frames == stored.num_frames == len(frames)
+    np.testing.assert_array_equal(track.positions, stored.positions)
+    np.testing.assert_array_equal(track.uncertainty, stored.uncertainty)
+
+
+def test_uncertainty_grows_while_coasting():
+    track = KalmanTrack()
+    for boxes in frame_boxes():
+        track.update_boxes(boxes)
+
+    assert np.isnan(track.uncertainty[:3]).all() and np.isnan(track.positions[:3]).all()
+    # The gap at frames 80-89 is coasted on the prediction, the next box pulls it back in
+    assert np.all(np.diff(track.uncertainty[80:90]) > 0)
+    assert track.uncertainty[91] < track.uncertainty[89]
+
+
+def test_kalman_pipeline_writes_hit_uncertainty(tmp_path, monkeypatch, synthetic_match):
+    monkeypatch.setattr(pipeline, "get_model", lambda *args, **kwargs: StubDetector())
+    output_csv = str(tmp_path / "ball_hits_coordinates.csv")
+    match = MatchPipeline(None, synthetic_match["video"], str(tmp_path / "processed_video.mp4"), output_csv,
+                          smoothing="kalman", codec="mp4v")
+    store = match.run()
+
+    hits = pd.read_csv(output_csv)
+    transformed = pd.read_csv(match.ball_tracker.transformed_csv_path)
+    assert len(hits)
+    expected = match.ball_tracker.kalman_track(store)
+    np.testing.assert_allclose(hits["uncertainty_px"], expected.uncertainty[hits["frame_id"]])
+    assert (hits["uncertainty_px"] > 0).all()
+    np.testing.assert_array_equal(transformed["uncertainty_px"], hits["uncertainty_px"])
@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+import batch
+import edge
+import heatmap
+import pipeline
+from instrumentation import Instrumentation
+
+
+class BrokenExecutor:
+    """Stands in for a pool whose worker was killed: every future fails with BrokenProcessPool."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+        return future
+
+
+class InlineExecutor(BrokenExecutor):
+    """Runs every submitted call right away in this process."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class EmptyPipeline:
+    """A MatchPipeline whose range holds no frames."""
+
+    def __init__(self, model_path, input_video, output_video, output_csv_path, **kwargs):
+        self.ball_tracker = SimpleNamespace(transformed_csv_path=output_csv_path)
+        self.metrics = Instrumentation()
+
+    def run(self):
+        return SimpleNamespace(num_frames=0)
+
+
+def test_import_does_not_load_numpy():
+    # Spawned workers re-import batch.py before limit_threads runs
+    code = "import sys, batch; print('numpy' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(batch.__file__)).stdout
+    assert output.strip() == "False"
+
+
+def test_summary_is_written_when_a_worker_dies(tmp_path, monkeypatch):
+    videos = tmp_path / "videos"
+    videos.mkdir()
+    for name in ("a.mp4", "b.mp4"):
+        (videos / name).write_bytes(b"")
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", BrokenExecutor)
+
+    output = tmp_path / "out"
+    assert batch.main([str(videos), "--output", str(output), "--model", "weights.pt", "--backend", "torch"]) == 1
+
+    with open(output / "summary.json") as f:
+        summary = json.load(f)
+    assert summary["failed"] == 2
+    assert [video["name"] for video in summary["videos"]] == ["a", "b"]
+    assert all(video["status"] == "failed" for video in summary["videos"])
+
+
+def test_video_without_frames_is_reported_with_zero_fps(tmp_path, monkeypatch):
+    videos = tmp_path / "videos"
+    videos.mkdir()
+    (videos / "empty.mp4").write_bytes(b"")
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(pipeline, "MatchPipeline", EmptyPipeline)
+    monkeypatch.setattr(edge, "detect_court_segments", lambda *args, **kwargs: None)
+    monkeypatch.setattr(heatmap.TennisHeatmap, "generate_heatmap", lambda self: None)
+
+    output = tmp_path / "out"
+    assert batch.main([str(videos), "--output", str(output), "--model", "weights.pt", "--backend", "torch",
+                       "--cache-dir", ""]) == 0
+
+    with open(output / "summary.json") as f:
+        summary = json.load(f)
+    assert summary["videos"][0]["status"] == "ok"
+    assert summary["videos"][0]["frames"] == 0 and summary["videos"][0]["fps"] == 0.0
@@ -0,0 +1,33 @@
+import os
+import numpy as np
+import pytest
+from ball_hits import BallTracker
+from detections import detect_batch, iter_batches
+from synthetic_match import StubDetector
+
+MODEL_PATH = os.environ.get("SERVESIGHT_MODEL", os.path.join("models", "yolo5_last.pt"))
+
+
+def per_frame_and_batched(model, frames, batch_size):
+    per_frame = [detect_batch(model, [frame])[0] for frame in frames]
+    batched = [boxes for batch in iter_batches(frames, batch_size) for boxes in detect_batch(model, batch)]
+    return per_frame, batched
+
+
+@pytest.mark.parametrize("batch_size", [2, 7, 16])
+def test_batched_detection_store_matches_per_frame(tmp_path, match_frames, batch_size):
+    tracker = BallTracker(None, "", str(tmp_path / "ball_hits_coordinates.csv"), model=StubDetector())
+    per_frame = tracker.detect_boxes(match_frames, batch_size=1)
+    batched = tracker.detect_boxes(match_frames, batch_size=batch_size)
+
+    np.testing.assert_array_equal(batched.counts, per_frame.counts)
+    np.testing.assert_array_equal(batched.records, per_frame.records)
+    assert tracker.get_ball_shot_frames(batched.ball_boxes()) == tracker.get_ball_shot_frames(per_frame.ball_boxes())
+
+
+@pytest.mark.skipif(not os.path.exists(MODEL_PATH), reason="needs the YOLO weights")
+def test_yolo_batched_boxes_are_identical(match_frames):
+    from model_pool import get_model
+
+    per_frame, batched = per_frame_and_batched(get_model(MODEL_PATH), match_frames[:32], batch_size=8)
+    assert batched == per_frame
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import types
+import numpy as np
+import pandas as pd
+import pytest
+import pipeline
+from court_transform import ShotCourtTransforms
+from edge import detect_court_segments
+from hit_index import HitIndex
+from jobs import JobContext, process_match
+from synthetic_match import StubDetector
+
+
+class FakeCourtLineDetector:
+    """Court_Detector isn't vendored here: returns the synthetic clip's corners, counting predict calls."""
+
+    keypoints = None
+    calls = 0
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+    def predict(self, frame):
+        FakeCourtLineDetector.calls += 1
+        return np.ravel(self.keypoints).tolist()
+
+    def save_keypoints_to_csv(self, keypoints):
+        pass
+
+
+@pytest.fixture
+def court_detector(monkeypatch, tmp_path, synthetic_match):
+    package = types.ModuleType("Court_Detector")
+    module = types.ModuleType("Court_Detector.court_line_detector")
+    module.CourtLineDetector = FakeCourtLineDetector
+    monkeypatch.setitem(sys.modules, "Court_Detector", package)
+    monkeypatch.setitem(sys.modules, "Court_Detector.court_line_detector", module)
+    monkeypatch.setattr(FakeCourtLineDetector, "keypoints", synthetic_match["keypoints"])
+    monkeypatch.setattr(FakeCourtLineDetector, "calls", 0)
+    court_model = tmp_path / "keypoints_model.pth"
+    court_model.write_bytes(b"court weights")
+    return str(court_model)
+
+
+def test_court_segments_are_cached_per_upload(tmp_path, synthetic_match, court_detector):
+    cache_dir = str(tmp_path / "court")
+    first = detect_court_segments(synthetic_match["video"], str(tmp_path / "a.json"), court_detector, cache_dir=cache_dir)
+    calls = FakeCourtLineDetector.calls
+    second = detect_court_segments(synthetic_match["video"], str(tmp_path / "b.json"), court_detector, cache_dir=cache_dir)
+
+    assert calls >= 1 and FakeCourtLineDetector.calls == calls
+    with open(first) as f, open(second) as g:
+        segments = json.load(f)
+        assert json.load(g) == segments
+    np.testing.assert_allclose(np.reshape(segments[0]["keypoints"], (-1, 2)), synthetic_match["keypoints"])
+
+
+def test_missing_court_model_keeps_pixels(tmp_path, synthetic_match):
+    assert detect_court_segments(synthetic_match["video"], str(tmp_path / "a.json"), str(tmp_path / "missing.pth")) is None
+
+
+def run_match(tmp_path, video, court_model_path):
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    # The detector is stubbed, the weights file only feeds the detection cache key
+    model_path = tmp_path / "yolo5_last.pt"
+    model_path.write_bytes(b"weights")
+    return process_match(JobContext(str(job_dir), {}), str(model_path), video, cache_dir=str(tmp_path / "cache"),
+                         court_model_path=court_model_path, codec="mp4v")
+
+
+def test_process_match_writes_court_space_hits(tmp_path, monkeypatch, synthetic_match, court_detector):
+    monkeypatch.setattr(pipeline, "get_model", lambda *args, **kwargs: StubDetector())
+    outputs = run_match(tmp_path, synthetic_match["video"], court_detector)
+
+    hits = pd.read_csv(outputs["ball_hits_csv"])
+    transformed = pd.read_csv(outputs["transformed_csv"])
+    assert len(hits)
+    expected = ShotCourtTransforms.from_json(outputs["court_segments_json"]).to_plain(
+        hits[["x", "y"]].to_numpy(), frame_ids=hits["frame_id"])
+    np.testing.assert_allclose(transformed[["x", "y"]].to_numpy(), expected)
+    # Hits of the synthetic rally land on the plain court diagram, so all of them are indexed
+    assert HitIndex(str(tmp_path / "cache" / "hits.sqlite")).counts().sum() == len(hits)
+
+
+def test_process_match_without_court_model_skips_the_index(tmp_path, monkeypatch, synthetic_match):
+    monkeypatch.setattr(pipeline, "get_model", lambda *args, **kwargs: StubDetector())
+    outputs = run_match(tmp_path, synthetic_match["video"], str(tmp_path / "missing.pth"))
+
+    assert "court_segments_json" not in outputs
+    assert not os.path.exists(tmp_path / "cache" / "hits.sqlite")
@@ -0,0 +1,82 @@
+import json
+import numpy as np
+import pandas as pd
+from ball_hits import BallTracker
+from court_transform import CourtTransform, ShotCourtTransforms, load_court_keypoints
+from homography import Homography
+from linear_regression_points_change import CoordinateTransform
+
+WIDE = [(300, 200), (980, 200), (100, 650), (1180, 650)]
+CLOSE = [(200, 100), (1080, 100), (0, 700), (1280, 700)]
+SEGMENTS = [
+    {"start": 0, "end": 100, "keypoints": np.ravel(WIDE).tolist()},
+    {"start": 100, "end": 250, "keypoints": np.ravel(CLOSE).tolist()},
+]
+
+
+def test_each_frame_uses_its_own_shot():
+    shots = ShotCourtTransforms(SEGMENTS)
+    wide, close = CourtTransform(np.float32(WIDE)), CourtTransform(np.float32(CLOSE))
+    points = np.array([[640.0, 400.0]] * 4)
+    plain = shots.to_plain(points, frame_ids=[0, 99, 100, 240])
+
+    np.testing.assert_allclose(plain[:2], wide.to_plain(points[:2]))
+    np.testing.assert_allclose(plain[2:], close.to_plain(points[2:]))
+    assert not np.allclose(plain[1], plain[2])
+    assert shots.transform_for_frame(150) is shots.transforms[1]
+
+
+def test_save_ball_hits_maps_hits_per_shot(tmp_path):
+    segments_json = str(tmp_path / "court_segments.json")
+    with open(segments_json, "w") as f:
+        json.dump(SEGMENTS, f)
+    tracker = BallTracker(None, "", str(tmp_path / "ball_hits_coordinates.csv"), model=object(),
+                          court_segments_json=segments_json)
+
+    # A rally on each side of the cut at frame 100, in processed positions with stride 2
+    y = np.concatenate([np.linspace(600, 250, 30), np.linspace(250, 600, 40), np.linspace(600, 250, 40),
+                        np.linspace(250, 600, 40)])
+    positions = np.column_stack([np.full_like(y, 635), y - 5, np.full_like(y, 645), y + 5])
+    tracker.save_ball_hits(positions, frame_stride=2)
+
+    hits = pd.read_csv(tracker.output_csv_path)
+    transformed = pd.read_csv(tracker.transformed_csv_path)
+    assert (hits["frame_id"] < 100).any() and (hits["frame_id"] >= 100).any()
+    expected = ShotCourtTransforms(SEGMENTS).to_plain(hits[["x", "y"]].to_numpy(), frame_ids=hits["frame_id"])
+    np.testing.assert_allclose(transformed[["x", "y"]].to_numpy(), expected)
+
+
+def test_save_ball_hits_maps_hits_through_the_keypoints_transform(tmp_path, synthetic_match):
+    tracker = BallTracker(None, "", str(tmp_path / "ball_hits_coordinates.csv"), model=object(),
+                          court_keypoints_csv=synthetic_match["keypoints_csv"])
+    centers = synthetic_match["centers"]
+    positions = np.column_stack([centers - 3, centers + 3])
+    tracker.save_ball_hits(positions)
+
+    hits = pd.read_csv(tracker.output_csv_path)
+    transformed = pd.read_csv(tracker.transformed_csv_path)
+    assert len(hits)
+    transform = CourtTransform.from_keypoints_csv(synthetic_match["keypoints_csv"])
+    assert tracker.court_transform is transform
+    np.testing.assert_allclose(transformed[["x", "y"]].to_numpy(), transform.to_plain(hits[["x", "y"]].to_numpy()))
+
+    # The composed matrix matches the separate Homography + CoordinateTransform steps
+    pixel_hits = str(tmp_path / "pixel_hits.csv")
+    court_hits = str(tmp_path / "court_hits.csv")
+    plain_hits = str(tmp_path / "plain_hits.csv")
+    hits.to_csv(pixel_hits, index=False)
+    Homography(pixel_hits, court_hits, synthetic_match["keypoints_csv"]).transform_coordinates()
+    CoordinateTransform(court_hits, plain_hits, synthetic_match["keypoints_csv"]).change_coordinates()
+    np.testing.assert_allclose(transformed[["x", "y"]].to_numpy(), pd.read_csv(plain_hits)[["x", "y"]].to_numpy(),
+                               rtol=1e-4)
+
+
+def test_keypoints_csv_with_and_without_index_column(tmp_path):
+    keypoints = pd.DataFrame({"X": [300.0, 980.0, 100.0, 1180.0, 640.0], "Y": [200.0, 200.0, 650.0, 650.0, 400.0]})
+    plain_csv, indexed_csv = str(tmp_path / "plain.csv"), str(tmp_path / "indexed.csv")
+    keypoints.to_csv(plain_csv, index=False)
+    # Index labels out of row order, looked up by label as index_col=0 did
+    keypoints.iloc[[4, 0, 1, 2, 3]].to_csv(indexed_csv)
+
+    np.testing.assert_array_equal(load_court_keypoints(plain_csv), np.float32(WIDE))
+    np.testing.assert_array_equal(load_court_keypoints(indexed_csv), np.float32(WIDE))
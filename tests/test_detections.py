@@ -0,0 +1,79 @@
+import numpy as np
+from detections import DetectionStore, DetectionStoreBuilder, ball_box
+
+FRAMES = [
+    [],
+    [(10.5, 20.0, 30.0, 40.25, 0.9, 0)],
+    [(1.0, 2.0, 3.0, 4.0, 0.3, 1), (100.0, 200.0, 110.0, 210.0, 0.8, 0)],
+    [],
+    [(5.0, 6.0, 7.0, 8.0, 0.55, 0)],
+]
+
+
+def build_store(frames=FRAMES, capacity=1024):
+    builder = DetectionStoreBuilder(capacity=capacity)
+    for boxes in frames:
+        builder.append(boxes)
+    return builder.build()
+
+
+def assert_frames_equal(store, frames):
+    assert store.num_frames == len(frames)
+    for index, boxes in enumerate(frames):
+        # Coordinates and confidences are stored as float32
+        assert store.frame_boxes(index) == [
+            tuple(float(np.float32(value)) for value in box[:5]) + (box[5],) for box in boxes
+        ]
+
+
+def test_builder_keeps_every_box_in_order():
+    store = build_store(capacity=1)  # Forces the buffers to grow
+    assert_frames_equal(store, FRAMES)
+    np.testing.assert_array_equal(store.valid, [False, True, True, False, True])
+    assert list(store) == [store.frame_boxes(index) for index in range(len(FRAMES))]
+
+
+def test_ball_boxes_take_the_last_box_of_each_frame():
+    boxes = build_store().ball_boxes()
+    for index, frame in enumerate(FRAMES):
+        expected = ball_box(frame)
+        if expected is None:
+            assert np.isnan(boxes[index]).all()
+        else:
+            np.testing.assert_array_equal(boxes[index], expected[:4])
+
+
+def test_save_load_round_trip(tmp_path):
+    store = build_store()
+    prefix = str(tmp_path / "match")
+    store.save(prefix)
+
+    for mmap in (True, False):
+        loaded = DetectionStore.load(prefix, mmap=mmap)
+        assert isinstance(loaded.records, np.memmap) == mmap
+        assert loaded.records.dtype == store.records.dtype
+        np.testing.assert_array_equal(loaded.records, store.records)
+        np.testing.assert_array_equal(loaded.counts, store.counts)
+        assert_frames_equal(loaded, FRAMES)
+        np.testing.assert_array_equal(loaded.ball_boxes(), store.ball_boxes())
+
+
+def test_mmapped_frames_are_views(tmp_path):
+    prefix = str(tmp_path / "match")
+    build_store().save(prefix)
+    loaded = DetectionStore.load(prefix)
+    assert np.shares_memory(loaded.frame(2), loaded.records)
+
+
+def test_empty_store_round_trip(tmp_path):
+    prefix = str(tmp_path / "empty")
+    build_store([]).save(prefix)
+    loaded = DetectionStore.load(prefix)
+    assert loaded.num_frames == 0
+    assert loaded.ball_boxes().shape == (0, 4)
+
+
+def test_concatenate_renumbers_frames():
+    joined = DetectionStore.concatenate([build_store(FRAMES[:2]), build_store(FRAMES[2:])])
+    assert_frames_equal(joined, FRAMES)
+    np.testing.assert_array_equal(joined.records["frame"], build_store().records["frame"])
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import detector_backends
+from synthetic_match import StubDetector
+
+
+class ShiftedDetector(StubDetector):
+    """A backend whose boxes land shift pixels to the right of torch's."""
+
+    def __init__(self, shift):
+        super().__init__()
+        self.shift = shift
+
+    def detect(self, frame, conf):
+        return super().detect(np.roll(frame, self.shift, axis=1), conf)
+
+
+@pytest.mark.parametrize("shift, passed", [(0, True), (2, True), (6, False)])
+def test_parity_check_limits_the_center_error(monkeypatch, synthetic_match, shift, passed):
+    detectors = {"torch": StubDetector(), "onnx": ShiftedDetector(shift)}
+    monkeypatch.setattr(detector_backends, "load_detector", lambda model_path, backend, *args: detectors[backend])
+
+    # IoU alone lets a small ball drift, the centre error must catch it
+    report = detector_backends.parity_check(None, "onnx", synthetic_match["video"], num_frames=40, min_iou=0.0,
+                                            max_center_error=3.0)
+
+    assert report["ball_agreement"] == 1.0
+    assert report["max_center_error_px"] == pytest.approx(shift)
+    assert report["passed"] is passed
+    assert report["torch_ms_per_frame"] > 0 and report["backend_ms_per_frame"] > 0 and report["speedup"] > 0
+
+
+def test_every_export_has_dynamic_input_shapes():
+    # A fixed 640x640 export would letterbox differently from torch on non-square frames
+    assert all(args["dynamic"] for args in detector_backends.BACKENDS.values() if args is not None)
+
+
+def test_openvino_int8_export_needs_calibration_data(monkeypatch, tmp_path):
+    monkeypatch.delenv("SERVESIGHT_INT8_DATA", raising=False)
+    weights = tmp_path / "yolo5_last.pt"
+    weights.write_bytes(b"weights")
+
+    # Without tennis frames ultralytics would calibrate on COCO
+    with pytest.raises(ValueError, match="calibration data"):
+        detector_backends.export_model(str(weights), "openvino-int8", export_dir=str(tmp_path / "exports"))
+    assert not (tmp_path / "exports").exists()
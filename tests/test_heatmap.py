@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+from heatmap import TennisHeatmap, heatmap_layout
+
+WIDTH, HEIGHT = 295, 551
+
+
+def original_grid(data, heatmap):
+    """The original per-row loop: histogram, blur, normalize, court lines and colormap."""
+    grid = np.zeros((HEIGHT, WIDTH), dtype=np.float32)
+    for _, row in data.iterrows():
+        x, y = int(row['x']), int(row['y'])
+        if 0 <= x < WIDTH and 0 <= y < HEIGHT:
+            grid[y, x] += 1
+    blurred = cv2.GaussianBlur(grid, (31, 31), 0)
+    normalized = cv2.normalize(blurred, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX).astype(np.uint8)
+    for start, end in heatmap.court_lines:
+        cv2.line(normalized, heatmap.court_points[start], heatmap.court_points[end], (255), 2)
+    return grid, cv2.applyColorMap(normalized, cv2.COLORMAP_OCEAN)
+
+
+@pytest.fixture
+def hits(tmp_path):
+    rng = np.random.default_rng(0)
+    # Mostly on court, some off the diagram and some negative fractions that int() truncates to 0
+    xs = np.concatenate([rng.uniform(19, 276, 300), rng.uniform(-50, 350, 40), [-0.5, 0.9]])
+    ys = np.concatenate([rng.uniform(19, 534, 300), rng.uniform(-50, 600, 40), [10.2, -0.7]])
+    data = pd.DataFrame({"x": xs, "y": ys})
+    csv_path = str(tmp_path / "hits.csv")
+    data.to_csv(csv_path, index=False)
+    return csv_path, data
+
+
+def test_bin_points_matches_the_per_row_histogram(hits):
+    csv_path, data = hits
+    heatmap = TennisHeatmap(csv_path, None)
+    expected, _ = original_grid(data, heatmap)
+    counts = heatmap.bin_points(*heatmap.load_points())
+
+    assert counts.shape == (HEIGHT, WIDTH) and counts.dtype == np.float32
+    np.testing.assert_array_equal(counts, expected)
+
+
+def test_load_points_skips_invalid_rows(tmp_path):
+    csv_path = str(tmp_path / "hits.csv")
+    pd.DataFrame({"x": [10, "bad", 30, None], "y": [20, 40, float("nan"), 5]}).to_csv(csv_path, index=False)
+    xs, ys = TennisHeatmap(csv_path, None).load_points()
+    np.testing.assert_array_equal(xs, [10.0])
+    np.testing.assert_array_equal(ys, [20.0])
+
+
+def test_fast_renderer_panel_matches_the_original_heatmap(tmp_path, hits):
+    csv_path, data = hits
+    output = str(tmp_path / "out" / "heatmap.png")
+    heatmap = TennisHeatmap(csv_path, output)
+    _, expected = original_grid(data, heatmap)
+    heatmap.generate_heatmap()
+
+    image = cv2.imread(output)
+    layout, (left, top), _ = heatmap_layout(cv2.COLORMAP_OCEAN, WIDTH * heatmap.scale, HEIGHT * heatmap.scale)
+    assert image.shape == layout.shape
+    panel = image[top:top + HEIGHT * heatmap.scale, left:left + WIDTH * heatmap.scale]
+    np.testing.assert_array_equal(panel[::heatmap.scale, ::heatmap.scale], expected)
+    # The title above the panel is drawn, unlike a blank layout
+    assert (image[:top] < 128).any()
+
+
+def test_matplotlib_renderer_writes_the_figure(tmp_path, hits):
+    csv_path, _ = hits
+    output = str(tmp_path / "heatmap.png")
+    TennisHeatmap(csv_path, output).generate_heatmap(renderer="matplotlib")
+    image = cv2.imread(output)
+    assert image is not None and image.shape[1] > WIDTH
+
+
+def test_generate_from_counts_matches_the_csv_path(tmp_path, hits):
+    csv_path, _ = hits
+    from_csv, from_counts = str(tmp_path / "csv.png"), str(tmp_path / "counts.png")
+    heatmap = TennisHeatmap(csv_path, from_csv)
+    heatmap.generate_heatmap()
+    TennisHeatmap(None, from_counts).generate_from_counts(heatmap.bin_points(*heatmap.load_points()))
+    np.testing.assert_array_equal(cv2.imread(from_counts), cv2.imread(from_csv))
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hit_index import HitIndex
+
+
+def write_hits(path, rows):
+    pd.DataFrame(rows, columns=["frame_id", "x", "y"]).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return HitIndex(str(tmp_path / "hits.sqlite"), width=10, height=20)
+
+
+def test_add_match_bins_hits_into_the_court_grid(tmp_path, index):
+    hits_csv = write_hits(tmp_path / "a.csv", [(0, 1.5, 2.2), (30, 1.9, 2.9), (60, 9.0, 19.0), (90, 12.0, 5.0),
+                                               (120, np.nan, 3.0)])
+    # The NaN row is dropped, the hit off the court image is kept but not binned
+    assert index.add_match("a", hits_csv, fps=30, video="a.mp4") == 4
+
+    counts = index.counts()
+    assert counts.shape == (20, 10)
+    assert counts[2, 1] == 2 and counts[19, 9] == 1
+    assert counts.sum() == 3
+    matches = index.matches()
+    assert matches["match_id"].tolist() == ["a"] and matches["hits"].tolist() == [4]
+
+
+def test_reindexing_a_match_replaces_its_hits(tmp_path, index):
+    index.add_match("a", write_hits(tmp_path / "a.csv", [(0, 1, 1), (30, 2, 2)]), fps=30)
+    index.add_match("b", write_hits(tmp_path / "b.csv", [(0, 5, 5)]), fps=30)
+    index.add_match("a", write_hits(tmp_path / "a2.csv", [(0, 3, 3)]), fps=30)
+
+    assert index.counts(match_ids=["a"]).sum() == 1
+    assert index.counts(match_ids=["a"])[3, 3] == 1
+    assert index.counts().sum() == 2
+    assert dict(zip(index.matches()["match_id"], index.matches()["hits"])) == {"a": 1, "b": 1}
+
+    index.remove_match("b")
+    assert index.counts().sum() == 1
+
+
+def test_counts_by_set_and_time_window(tmp_path, index):
+    index.add_match("a", write_hits(tmp_path / "s1.csv", [(0, 1, 1), (300, 2, 2), (600, 3, 3)]), set_number=1, fps=30)
+    index.add_match("a", write_hits(tmp_path / "s2.csv", [(900, 4, 4)]), set_number=2, fps=30)
+
+    assert index.counts(set_number=1).sum() == 3
+    assert index.counts(set_number=2)[4, 4] == 1
+    # Seconds 10 (inclusive) to 30 (exclusive)
+    window = index.counts(start_seconds=10, end_seconds=30)
+    assert window.sum() == 2 and window[2, 2] == 1 and window[4, 4] == 0
+    assert index.counts(start_seconds=10, end_seconds=30, set_number=2).sum() == 0
+    # A windowed query over everything agrees with the pre-binned counts
+    np.testing.assert_array_equal(index.counts(start_seconds=0), index.counts())
@@ -0,0 +1,37 @@
+import os
+import time
+from jobs import DONE, FAILED, FINISHED_STATES, JobQueue
+
+
+def killed_task(job):
+    # What the OOM killer does to a worker: no exception, no final status
+    os._exit(9)
+
+
+def echo_task(job, value):
+    return value
+
+
+def wait_until_finished(queue, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = queue.status(job_id)
+        if status["state"] in FINISHED_STATES:
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_queue_recovers_after_a_worker_dies(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs"), max_workers=1)
+    try:
+        killed = queue.submit(killed_task)
+        assert wait_until_finished(queue, killed)["state"] == FAILED
+
+        job_id = queue.submit(echo_task, value=42)
+        status = wait_until_finished(queue, job_id)
+        assert status["state"] == DONE
+        assert status["result"] == 42
+        assert queue.status(killed)["state"] == FAILED
+    finally:
+        queue.shutdown()
@@ -0,0 +1,34 @@
+import zipfile
+import pytest
+from model_pool import verify_weights
+
+
+def write_weights(path, payload=b"weights"):
+    # PyTorch checkpoints are zip archives
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("data.pkl", payload)
+    return str(path)
+
+
+def test_first_verified_weights_pin_their_checksum(tmp_path, monkeypatch):
+    monkeypatch.delenv("YOLO5_LAST_SHA256", raising=False)
+    model_path = write_weights(tmp_path / "yolo5_last.pt")
+    verify_weights(model_path)
+    assert (tmp_path / "yolo5_last.pt.sha256").exists()
+    verify_weights(model_path)
+
+    # A swapped file is refused until the new release is pinned explicitly
+    write_weights(model_path, b"other weights")
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        verify_weights(model_path)
+    monkeypatch.setenv("YOLO5_LAST_SHA256", "0" * 64)
+    with pytest.raises(ValueError, match="0" * 64):
+        verify_weights(model_path)
+
+
+def test_truncated_weights_are_not_pinned(tmp_path):
+    model_path = tmp_path / "yolo5_last.pt"
+    model_path.write_bytes(b"PK\x03\x04 cut off")
+    with pytest.raises(ValueError, match="truncated"):
+        verify_weights(str(model_path))
+    assert not (tmp_path / "yolo5_last.pt.sha256").exists()
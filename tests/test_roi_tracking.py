@@ -0,0 +1,69 @@
+import numpy as np
+from adaptive_sampling import StrideDetector
+from ball_hits import BallTracker
+from roi_tracking import RoiDetector
+from synthetic_match import StubDetector
+
+
+class RecordingRoiDetector(RoiDetector):
+    """Records (call, frame index, locked on) for every frame it detects."""
+
+    def __init__(self, model, frame_indices, **kwargs):
+        super().__init__(model, **kwargs)
+        self.frame_indices = frame_indices
+        self.calls = []
+        self.call = "detect"
+
+    def detect_frame(self, frame):
+        self.calls.append((self.call, self.frame_indices[id(frame)], self.center is not None))
+        return super().detect_frame(frame)
+
+    def detect_burst(self, frames):
+        self.call = "burst"
+        try:
+            return super().detect_burst(frames)
+        finally:
+            self.call = "detect"
+
+
+def test_stride_detection_feeds_roi_frames_in_order(match_frames):
+    frame_indices = {id(frame): i for i, frame in enumerate(match_frames)}
+    roi = RecordingRoiDetector(StubDetector(), frame_indices, crop_size=160)
+    stride_detector = StrideDetector(roi.detect, stride=4, dense_detect_fn=roi.detect_burst)
+    list(stride_detector.detect_stream(enumerate(match_frames)))
+
+    keyframes = [index for call, index, _ in roi.calls if call == "detect"]
+    assert keyframes == sorted(set(keyframes))
+    bursts = [index for call, index, _ in roi.calls if call == "burst"]
+    assert bursts, "the synthetic rally changes direction, so some frames are detected densely"
+
+    # Each burst starts with a full-frame search and runs forward in time
+    starts = [i for i, (call, _, _) in enumerate(roi.calls)
+              if call == "burst" and (i == 0 or roi.calls[i - 1][0] != "burst")]
+    for start in starts:
+        assert not roi.calls[start][2]
+        end = start
+        while end + 1 < len(roi.calls) and roi.calls[end + 1][0] == "burst":
+            end += 1
+        burst = [index for _, index, _ in roi.calls[start:end + 1]]
+        assert burst == sorted(set(burst))
+    assert roi.crop_detections > 0
+
+
+def test_detect_burst_keeps_the_lock_on_the_latest_frame(match_frames):
+    roi = RoiDetector(StubDetector(), crop_size=160)
+    roi.detect(match_frames[40:42])
+    center, velocity = roi.center.copy(), roi.velocity.copy()
+
+    roi.detect_burst(match_frames[30:38])
+    np.testing.assert_array_equal(roi.center, center)
+    np.testing.assert_array_equal(roi.velocity, velocity)
+
+
+def test_roi_stride_boxes_match_full_frame_stride(tmp_path, match_frames):
+    tracker = BallTracker(None, "", str(tmp_path / "ball_hits_coordinates.csv"), model=StubDetector())
+    full = tracker.detect_boxes(match_frames, detect_stride=4)
+
+    tracker.roi_crop_size = 160
+    cropped = tracker.detect_boxes(match_frames, detect_stride=4)
+    np.testing.assert_allclose(cropped.ball_boxes(), full.ball_boxes())
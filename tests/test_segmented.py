@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pytest
+import ball_hits
+import dotline
+import pipeline
+from ball_hits import BallTracker
+from detections import DetectionStore, detect_batch
+from pipeline import MatchPipeline
+from segmented import detect_range, plan_segments
+from synthetic_match import StubDetector, render_match
+
+
+@pytest.fixture(scope="module")
+def odd_length_match(tmp_path_factory):
+    # 1001 frames: splits into neither 3 equal segments nor whole stride windows
+    return render_match(str(tmp_path_factory.mktemp("segmented") / "rally.mp4"), width=640, height=360, num_frames=1001,
+                        seed=3)
+
+
+def test_segments_start_on_the_keyframe_grid():
+    segments = plan_segments(10, 1011, num_segments=3, overlap=58, min_segment_frames=100, detect_stride=4)
+    assert len(segments) == 3
+    assert segments[0][1] == 10 and segments[-1][2] == 1011
+    for (read_start, start, end, read_end), next_segment in zip(segments, segments[1:] + [None]):
+        assert (start - 10) % 4 == 0 and (read_start - 10) % 4 == 0
+        assert start - read_start in (0, 60)
+        if next_segment is not None:
+            assert end == next_segment[1]
+
+
+def test_segmented_stride_hits_match_sequential(tmp_path, odd_length_match):
+    detector = StubDetector()
+    detect_fn = lambda frames: detect_batch(detector, frames)
+    video = odd_length_match["video"]
+    num_frames = 1001
+
+    sequential = detect_range(detect_fn, video, 0, 0, num_frames, num_frames, detect_stride=4)
+    segments = plan_segments(0, num_frames, num_segments=3, overlap=60, min_segment_frames=100, detect_stride=4)
+    assert len(segments) == 3
+    segmented = DetectionStore.concatenate([detect_range(detect_fn, video, *segment, detect_stride=4)
+                                            for segment in segments])
+
+    # Same keyframes as the sequential run, so the very same boxes
+    np.testing.assert_array_equal(segmented.records, sequential.records)
+    np.testing.assert_array_equal(segmented.counts, sequential.counts)
+    tracker = BallTracker(None, video, str(tmp_path / "ball_hits_coordinates.csv"), model=detector)
+    sequential_hits = tracker.get_ball_shot_frames(tracker.interpolate_ball_array(sequential.ball_boxes()))
+    segmented_hits = tracker.get_ball_shot_frames(tracker.interpolate_ball_array(segmented.ball_boxes()))
+    assert sequential_hits[0]
+    assert segmented_hits[0] == sequential_hits[0]
+    np.testing.assert_array_equal(segmented_hits[1], sequential_hits[1])
+
+
+def test_precomputed_detections_do_not_load_the_model(tmp_path, monkeypatch, synthetic_match, match_frames):
+    tracker = BallTracker(None, "", str(tmp_path / "reference.csv"), model=StubDetector())
+    store = tracker.detect_boxes(match_frames)
+
+    def no_model(*args, **kwargs):
+        raise AssertionError("model loaded for precomputed detections")
+
+    for module in (pipeline, dotline, ball_hits):
+        monkeypatch.setattr(module, "get_model", no_model)
+    output_csv = str(tmp_path / "ball_hits_coordinates.csv")
+    MatchPipeline(str(tmp_path / "missing.pt"), synthetic_match["video"], str(tmp_path / "processed_video.mp4"),
+                  output_csv, detections=store, class_names=StubDetector.names, codec="mp4v").run()
+
+    assert os.path.getsize(tmp_path / "processed_video.mp4") > 0
+    assert os.path.exists(output_csv)
@@ -0,0 +1,45 @@
+import itertools
+import threading
+import time
+import pytest
+from threaded_pipeline import ThreadedPipeline
+
+
+def test_items_arrive_in_order_and_are_counted():
+    results = []
+    pipeline = ThreadedPipeline(([i, i + 1] for i in range(0, 100, 2)),
+                                [("double", lambda batch: [2 * i for i in batch]), ("collect", results.extend)],
+                                queue_size=2, item_size=len)
+    stats = pipeline.run()
+
+    assert results == [2 * i for i in range(100)]
+    assert [s.name for s in stats] == ["decode", "double", "collect"]
+    assert all(s.items == 100 for s in stats)
+    assert "bottleneck" in pipeline.report()
+
+
+def fail_on(value):
+    def stage(item):
+        if item == value:
+            raise RuntimeError(f"stage failed on {item}")
+        return item
+    return stage
+
+
+def failing_source():
+    yield from range(5)
+    raise RuntimeError("decode failed")
+
+
+@pytest.mark.parametrize("source, stages", [
+    # Endless source blocked on a full queue, downstream stage waiting on an empty one
+    (itertools.count(), [("detect", fail_on(5)), ("render", lambda item: time.sleep(0.001))]),
+    (failing_source(), [("detect", lambda item: item), ("render", lambda item: item)]),
+], ids=["stage", "source"])
+def test_failure_is_raised_and_every_thread_stops(source, stages):
+    before = set(threading.enumerate())
+    pipeline = ThreadedPipeline(source, stages, queue_size=1)
+
+    with pytest.raises(RuntimeError, match="failed"):
+        pipeline.run()
+    assert set(threading.enumerate()) - before == set()
@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+import pytest
+from trail_renderer import TrailRenderer
+
+WIDTH, HEIGHT = 320, 180
+
+
+class FullRedraw:
+    """The original DotLine overlay: redraw the whole trail on every point, dim and blend the whole frame."""
+
+    def __init__(self, max_trail):
+        self.max_trail = max_trail
+        self.canvas = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        self.points = []
+
+    def add_point(self, x, y):
+        self.points.append((x, y))
+        if len(self.points) > self.max_trail:
+            self.points.pop(0)
+        for i in range(1, len(self.points)):
+            cv2.line(self.canvas, self.points[i - 1], self.points[i], (0, 255, 0), 2)
+        cv2.circle(self.canvas, (x, y), 5, (0, 0, 255), -1)
+
+    def render(self, frame):
+        return cv2.addWeighted(frame, 0.8, self.canvas, 0.5, 0)
+
+
+def ball_path(num_points, seed=0):
+    """A wandering ball that doubles back over itself and touches the frame edges."""
+    rng = np.random.default_rng(seed)
+    steps = rng.integers(-25, 26, size=(num_points, 2))
+    points = np.cumsum(steps, axis=0) + (WIDTH // 2, HEIGHT // 2)
+    points[:, 0] = np.clip(points[:, 0], 0, WIDTH - 1)
+    points[:, 1] = np.clip(points[:, 1], 0, HEIGHT - 1)
+    return [tuple(point) for point in points.tolist()]
+
+
+def frames(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, size=(HEIGHT, WIDTH, 3), dtype=np.uint8) for _ in range(count)]
+
+
+@pytest.mark.parametrize("max_trail", [1, 5, 50])
+def test_incremental_canvas_matches_full_redraw(max_trail):
+    path = ball_path(200)
+    reference = FullRedraw(max_trail)
+    renderer = TrailRenderer(WIDTH, HEIGHT, max_trail=max_trail, blend="full")
+    for frame, (x, y) in zip(frames(len(path)), path):
+        reference.add_point(x, y)
+        renderer.add_point(x, y)
+        np.testing.assert_array_equal(renderer.canvas, reference.canvas)
+        np.testing.assert_array_equal(renderer.render(frame), reference.render(frame))
+
+
+def test_default_region_blend_only_changes_trail_pixels():
+    path = ball_path(120, seed=1)
+    reference = FullRedraw(50)
+    renderer = TrailRenderer(WIDTH, HEIGHT, max_trail=50)
+    for frame, (x, y) in zip(frames(len(path), seed=1), path):
+        reference.add_point(x, y)
+        renderer.add_point(x, y)
+        expected = reference.render(frame)
+        covered = reference.canvas.any(axis=2)
+        rendered = renderer.render(frame.copy())
+        np.testing.assert_array_equal(rendered[covered], expected[covered])
+        np.testing.assert_array_equal(rendered[~covered], frame[~covered])
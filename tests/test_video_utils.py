@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from video_utils import VideoSink, browser_playable
+
+
+def write_clip(path, codec):
+    with VideoSink(str(path), 30, (64, 48), codec=codec) as sink:
+        for _ in range(5):
+            sink.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    return sink
+
+
+def test_mp4v_fallback_is_not_browser_playable(tmp_path):
+    sink = write_clip(tmp_path / "mp4v.mp4", "mp4v")
+    assert sink.codec == "mp4v"
+    assert not browser_playable(str(tmp_path / "mp4v.mp4"))
+
+
+def test_web_codecs_are_browser_playable(tmp_path):
+    sink = write_clip(tmp_path / "web.mp4", "avc1")
+    if sink.codec == "mp4v":
+        pytest.skip("OpenCV build has neither an H.264 nor a VP9 encoder")
+    assert browser_playable(str(tmp_path / "web.mp4"))
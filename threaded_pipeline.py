@@ -0,0 +1,124 @@
+import queue
+import threading
+import time
+
+# Marks the end of the stream on every queue
+_END = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def throughput(self):
+        """Items per second of time spent doing work, i.e. what the stage could sustain alone."""
+        return self.items / self.busy_seconds if self.busy_seconds > 0 else float("inf")
+
+
+class ThreadedPipeline:
+    """
+    Runs a source iterable and a chain of stages on their own threads,
+    connected by bounded queues.
+
+    Every stage is a single thread consuming its input queue in FIFO order, so
+    item order is preserved. A full queue blocks the upstream stage
+    (backpressure). The first exception in any stage stops all threads and is
+    re-raised from run().
+    """
+
+    def __init__(self, source, stages, queue_size=8, source_name="decode", item_size=None):
+        self.source = source
+        self.stages = stages  # list of (name, fn) pairs, fn(item) -> item passed downstream
+        self.queue_size = queue_size
+        # Counts the units (e.g. frames) in an item when items are batches
+        self.item_size = item_size or (lambda item: 1)
+        self.stats = [StageStats(source_name)] + [StageStats(name) for name, _ in stages]
+        self.wall_seconds = 0.0
+        self._stop = threading.Event()
+        self._error = None
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, exc):
+        if self._error is None:
+            self._error = exc
+        self._stop.set()
+
+    def _run_source(self, out_q, stats):
+        try:
+            iterator = iter(self.source)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stats.busy_seconds += time.perf_counter() - start
+                stats.items += self.item_size(item)
+                if not self._put(out_q, item):
+                    return
+            self._put(out_q, _END)
+        except Exception as exc:
+            self._fail(exc)
+
+    def _run_stage(self, fn, in_q, out_q, stats):
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _END:
+                    break
+                start = time.perf_counter()
+                result = fn(item)
+                stats.busy_seconds += time.perf_counter() - start
+                stats.items += self.item_size(item)
+                if out_q is not None and not self._put(out_q, result):
+                    return
+            if out_q is not None:
+                self._put(out_q, _END)
+        except Exception as exc:
+            self._fail(exc)
+
+    def run(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(target=self._run_source, args=(queues[0], self.stats[0]), daemon=True)]
+        for i, (_, fn) in enumerate(self.stages):
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(threading.Thread(target=self._run_stage, args=(fn, queues[i], out_q, self.stats[i + 1]), daemon=True))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.wall_seconds = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def report(self):
+        """Per-stage throughput, the stage with the lowest items/s is the bottleneck."""
+        lines = [f"⏱️ Pipeline finished in {self.wall_seconds:.2f}s"]
+        bottleneck = min(self.stats, key=lambda s: s.throughput)
+        for stats in self.stats:
+            marker = "  ⬅ bottleneck" if stats is bottleneck else ""
+            lines.append(f"   {stats.name:<8} {stats.items:>7} items  {stats.busy_seconds:>8.2f}s busy  {stats.throughput:>9.1f} items/s{marker}")
+        return "\n".join(lines)
@@ -0,0 +1,125 @@
+from collections import deque
+import cv2
+import numpy as np
+
+TRAIL_COLOR = (0, 255, 0)
+DOT_COLOR = (0, 0, 255)
+LINE_THICKNESS = 2
+DOT_RADIUS = 5
+
+
+class TrailRenderer:
+    """
+    Incremental ball-trail overlay.
+
+    The last max_trail points live in a fixed-size ring buffer. Adding a
+    point draws only the new segment and dot. The full redraw this replaces
+    only ever changed pixels under the previous dot, so segments crossing that
+    dot are redrawn as well and the canvas stays pixel-identical to it.
+
+    blend="region" (default) only blends inside the dirty bounding box and
+    only replaces pixels the trail covers, so the cost follows the area the
+    ball covered, not the frame size. Trail pixels are identical to the
+    original full-frame cv2.addWeighted; the rest of the frame is left
+    undimmed. blend="full" keeps the original dimmed full-frame look.
+
+    mode="fade" makes the trail fade out linearly over fade_frames frames
+    instead of persisting for the whole video.
+    """
+
+    def __init__(self, width, height, max_trail=50, blend="region", mode="persistent", fade_frames=None):
+        self.width = width
+        self.height = height
+        self.max_trail = max_trail
+        self.blend = blend
+        self.mode = mode
+        self.fade_frames = fade_frames or max_trail
+        self.fade_step = int(np.ceil(255 / self.fade_frames))
+
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self.points = np.zeros((max_trail, 2), dtype=np.int32)
+        self.count = 0
+        self.head = 0  # Index the next point is written to
+
+        self.dirty = None  # (x0, y0, x1, y1) bounding box of everything drawn
+        self.recent = deque()  # (frame_number, box) of fading drawings
+        self.frame_number = 0
+
+    def __len__(self):
+        return self.count
+
+    def trail_points(self):
+        """Points currently in the trail, oldest first."""
+        if self.count < self.max_trail:
+            return self.points[:self.count]
+        return np.roll(self.points, -self.head, axis=0)
+
+    def _mark_dirty(self, x0, y0, x1, y1):
+        pad = DOT_RADIUS + LINE_THICKNESS
+        box = (max(x0 - pad, 0), max(y0 - pad, 0), min(x1 + pad + 1, self.width), min(y1 + pad + 1, self.height))
+        if self.mode == "fade":
+            self.recent.append((self.frame_number, box))
+        if self.dirty is None:
+            self.dirty = box
+        else:
+            self.dirty = (min(self.dirty[0], box[0]), min(self.dirty[1], box[1]), max(self.dirty[2], box[2]), max(self.dirty[3], box[3]))
+
+    def add_point(self, x, y):
+        previous = tuple(self.points[self.head - 1].tolist()) if self.count else None
+
+        self.points[self.head] = (x, y)
+        self.head = (self.head + 1) % self.max_trail
+        self.count = min(self.count + 1, self.max_trail)
+
+        if previous is not None and self.max_trail > 1:
+            # Window segments that cross the previous dot, as a full redraw would repaint them
+            trail = self.trail_points()
+            starts, ends = trail[:-2], trail[1:-1]
+            reach = DOT_RADIUS + LINE_THICKNESS
+            crosses = (
+                (np.minimum(starts[:, 0], ends[:, 0]) <= previous[0] + reach)
+                & (np.maximum(starts[:, 0], ends[:, 0]) >= previous[0] - reach)
+                & (np.minimum(starts[:, 1], ends[:, 1]) <= previous[1] + reach)
+                & (np.maximum(starts[:, 1], ends[:, 1]) >= previous[1] - reach)
+            )
+            for start, end in zip(starts[crosses].tolist(), ends[crosses].tolist()):
+                cv2.line(self.canvas, tuple(start), tuple(end), TRAIL_COLOR, LINE_THICKNESS)
+            cv2.line(self.canvas, previous, (x, y), TRAIL_COLOR, LINE_THICKNESS)
+            self._mark_dirty(min(previous[0], x), min(previous[1], y), max(previous[0], x), max(previous[1], y))
+        else:
+            self._mark_dirty(x, y, x, y)
+
+        cv2.circle(self.canvas, (x, y), DOT_RADIUS, DOT_COLOR, -1)
+
+    def _fade(self):
+        # Drop drawings that have fully faded out and shrink the dirty box to what's left
+        while self.recent and self.frame_number - self.recent[0][0] > self.fade_frames:
+            self.recent.popleft()
+        if not self.recent:
+            self.dirty = None
+            return
+        boxes = np.array([box for _, box in self.recent])
+        self.dirty = (boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+        x0, y0, x1, y1 = self.dirty
+        region = self.canvas[y0:y1, x0:x1]
+        cv2.subtract(region, (self.fade_step, self.fade_step, self.fade_step, 0), dst=region)
+
+    def render(self, frame):
+        """Overlay the trail onto a frame. With blend="region" the frame is modified in place."""
+        self.frame_number += 1
+        if self.mode == "fade" and self.dirty is not None:
+            self._fade()
+
+        if self.blend == "full":
+            return cv2.addWeighted(frame, 0.8, self.canvas, 0.5, 0)
+
+        if self.dirty is None:
+            return frame
+        x0, y0, x1, y1 = self.dirty
+        region = frame[y0:y1, x0:x1]
+        trail = self.canvas[y0:y1, x0:x1]
+        blended = cv2.addWeighted(region, 0.8, trail, 0.5, 0)
+        # Only pixels the trail actually covers are replaced, writing into the frame view
+        covered = cv2.bitwise_not(cv2.inRange(trail, (0, 0, 0), (0, 0, 0)))
+        cv2.copyTo(blended, covered, region)
+        return frame
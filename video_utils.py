@@ -1,6 +1,7 @@
 import cv2
 
 def read_video(video_path):
+    # Loads the whole video into memory, prefer FrameSource for long matches
     cap = cv2.VideoCapture(video_path)
     frames = []
     while True:
@@ -10,3 +11,156 @@ def read_video(video_path):
         frames.append(frame)
     cap.release()
     return frames
+
+
+class FrameSource:
+    """
+    Streams frames from a video one at a time, so memory stays bounded by a
+    single frame no matter how long the match is.
+
+    start / end limit the frame range (end is exclusive), stride keeps every
+    stride-th frame. Skipped frames are grabbed but never converted to BGR.
+    """
+
+    def __init__(self, video_path, start=0, end=None, stride=1):
+        if stride < 1:
+            raise ValueError(f"Error: stride must be >= 1, got {stride}")
+
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Error: Could not open video {video_path}")
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        self.start = start
+        self.end = end
+        self.stride = stride
+        self.position = 0
+        if start:
+            self.seek(start)
+
+    def seek(self, frame_index):
+        """Move the read position so the next frame returned is frame_index."""
+        if self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index):
+            self.position = frame_index
+            return
+
+        # Backend can't seek, fall back to grabbing forward
+        if frame_index < self.position:
+            self.cap.release()
+            self.cap = cv2.VideoCapture(self.video_path)
+            self.position = 0
+        while self.position < frame_index and self.cap.grab():
+            self.position += 1
+
+    def indexed_frames(self):
+        """Yield (frame_index, frame) pairs from the current position onwards."""
+        while self.end is None or self.position < self.end:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            frame_index = self.position
+            self.position += 1
+            yield frame_index, frame
+
+            for _ in range(self.stride - 1):
+                if self.end is not None and self.position >= self.end:
+                    break
+                if not self.cap.grab():
+                    return
+                self.position += 1
+
+    def __iter__(self):
+        for _, frame in self.indexed_frames():
+            yield frame
+
+    def release(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+# Tried in order after the requested codec, H.264 first since every browser plays it
+WEB_CODECS = ("avc1", "vp09", "mp4v")
+# Stream FourCCs browsers play in an mp4, as OpenCV reads them back (avc1 may come back as H264, vp09 as VP90)
+BROWSER_FOURCCS = ("avc1", "h264", "x264", "vp09", "vp90", "av01")
+
+
+def video_fourcc(path):
+    """FourCC of the video stream in path, e.g. "FMP4" for an mp4v encode ("" if it can't be read)."""
+    cap = cv2.VideoCapture(path)
+    try:
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC)) if cap.isOpened() else 0
+    finally:
+        cap.release()
+    return fourcc.to_bytes(4, "little").decode("latin-1").strip("\x00 ")
+
+
+def browser_playable(path):
+    """Whether a browser can play the video, an mp4v fallback encode plays in desktop players only."""
+    return video_fourcc(path).lower() in BROWSER_FOURCCS
+
+
+class VideoSink:
+    """
+    Writes the processed video in a single encode, ready to be shown in the
+    browser without a second transcode.
+
+    codec is tried first, then the rest of WEB_CODECS (opencv builds without
+    openh264 can't write avc1). The last resort, mp4v, is not
+    browser-playable; a warning is printed and the app shows one (see
+    browser_playable). max_height downscales frames on write, keeping the
+    aspect ratio.
+    """
+
+    def __init__(self, path, fps, frame_size, codec="avc1", max_height=None):
+        self.path = path
+        self.fps = fps
+        self.input_size = frame_size
+
+        width, height = frame_size
+        if max_height and height > max_height:
+            # Even dimensions, most H.264 encoders refuse odd ones
+            width, height = int(width * max_height / height) // 2 * 2, max_height // 2 * 2
+        self.frame_size = (width, height)
+
+        self.codec = None
+        self.writer = None
+        for candidate in dict.fromkeys((codec,) + WEB_CODECS):
+            self.writer = self._open(candidate)
+            if self.writer is not None:
+                self.codec = candidate
+                break
+        if self.writer is None:
+            raise ValueError(f"Error: Could not open video writer for {path}")
+        if self.codec != codec:
+            print(f"⚠️ Codec {codec} unavailable, writing {path} with {self.codec}")
+        if self.codec.lower() not in BROWSER_FOURCCS:
+            print(f"⚠️ {path} is encoded with {self.codec}, browsers won't play it (OpenCV has no H.264 / VP9 encoder)")
+
+    def _open(self, codec):
+        fourcc = cv2.VideoWriter_fourcc(*codec)
+        writer = cv2.VideoWriter(self.path, fourcc, self.fps, self.frame_size)
+        return writer if writer.isOpened() else None
+
+    def write(self, frame):
+        if self.frame_size != self.input_size:
+            frame = cv2.resize(frame, self.frame_size, interpolation=cv2.INTER_AREA)
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()